@@ -0,0 +1,135 @@
+# =================================================================================================
+# Purpose:                  Steps many headless games at once for bot leagues and AI training
+# Misc:                     Needs numpy. Follows exactly the same rules as PongSimulation in physics.py
+# =================================================================================================
+
+import numpy as np
+
+from assets.code.physics import (PADDLE_WIDTH, PADDLE_HEIGHT, PADDLE_SPEED, BALL_SIZE, BALL_START_XVEL,
+    MAX_XVEL, WALL_HEIGHT, WINNING_SCORE, MOVE_UP, MOVE_DOWN, EVENT_BOUNCE, EVENT_POINT)
+
+
+# Purpose:  To hold N games as parallel arrays and step every one of them in a single vectorized call
+# Game i's state is ballX[i], ballY[i], xVel[i], yVel[i], leftY[i], rightY[i], lScore[i] and rScore[i]
+class BatchSimulation():
+    # Default constructor
+    # count         Number of games
+    # serveDelay    Ticks the ball waits before it starts moving in each game
+    def __init__(self, count: int, screenWidth: int = 640, screenHeight: int = 480, serveDelay: int = 0) -> None:
+        self.count = count
+        self.screenWidth = screenWidth
+        self.screenHeight = screenHeight
+        self.serveDelay = serveDelay
+
+        # Fixed geometry, the same for every game
+        self.leftX = 10
+        self.rightX = screenWidth - 20
+        self.ballStartX = int(screenWidth / 2)
+        self.ballStartY = int(screenHeight / 2)
+        self.paddleStartY = int((screenHeight / 2) - (PADDLE_HEIGHT / 2))
+
+        self.ballX = np.empty(count, dtype=np.int64)
+        self.ballY = np.empty(count, dtype=np.int64)
+        self.xVel = np.empty(count, dtype=np.int64)
+        self.yVel = np.empty(count, dtype=np.int64)
+        self.leftY = np.empty(count, dtype=np.int64)
+        self.rightY = np.empty(count, dtype=np.int64)
+        self.lScore = np.empty(count, dtype=np.int64)
+        self.rScore = np.empty(count, dtype=np.int64)
+        self.tick = np.empty(count, dtype=np.int64)
+        self.leftMoving = np.zeros(count, dtype=np.int64)
+        self.rightMoving = np.zeros(count, dtype=np.int64)
+        self.reset()
+
+    # Start the selected games (all of them by default) over from the opening serve
+    def reset(self, mask=None) -> None:
+        if mask is None:
+            mask = np.ones(self.count, dtype=bool)
+        self.ballX[mask] = self.ballStartX
+        self.ballY[mask] = self.ballStartY
+        self.xVel[mask] = BALL_START_XVEL
+        self.yVel[mask] = 0
+        self.leftY[mask] = self.paddleStartY
+        self.rightY[mask] = self.paddleStartY
+        self.lScore[mask] = 0
+        self.rScore[mask] = 0
+        self.tick[mask] = 0
+
+    # Set every game's paddle input at once, each argument is an array (or scalar) of MOVE_* values
+    def setInputs(self, leftMoving, rightMoving) -> None:
+        self.leftMoving[:] = np.sign(leftMoving)
+        self.rightMoving[:] = np.sign(rightMoving)
+
+    @property # Game over mask getter
+    def over(self) -> np.ndarray:
+        return (self.lScore >= WINNING_SCORE) | (self.rScore >= WINNING_SCORE)
+
+    @property # Winner getter, -1 left, 1 right, 0 while a game is still going
+    def winner(self) -> np.ndarray:
+        return np.where(self.lScore >= WINNING_SCORE, -1, np.where(self.rScore >= WINNING_SCORE, 1, 0))
+
+    # Move every paddle in a column one tick, staying inside the walls
+    def _movePaddles(self, y: np.ndarray, moving: np.ndarray) -> None:
+        down = (moving == MOVE_DOWN) & (y + PADDLE_HEIGHT < self.screenHeight - WALL_HEIGHT)
+        up = (moving == MOVE_UP) & (y > WALL_HEIGHT)
+        y += PADDLE_SPEED * down - PADDLE_SPEED * up
+
+    # Mask of games whose ball overlaps a rectangle, touching edges don't count (like pygame.Rect)
+    def _ballCollides(self, x, y, width: int, height: int) -> np.ndarray:
+        return ((self.ballX < x + width) & (x < self.ballX + BALL_SIZE)
+            & (self.ballY < y + height) & (y < self.ballY + BALL_SIZE))
+
+    # Advance every game by one tick, returns each game's EVENT_* bits
+    def step(self) -> np.ndarray:
+        self.tick += 1
+        self._movePaddles(self.leftY, self.leftMoving)
+        self._movePaddles(self.rightY, self.rightMoving)
+
+        events = np.zeros(self.count, dtype=np.uint8)
+        active = ~self.over & (self.tick > self.serveDelay)
+
+        # Clamp velocity to 6 and move the ball
+        np.clip(self.xVel, -MAX_XVEL, MAX_XVEL, out=self.xVel, where=active)
+        previousX = self.ballX.copy() if MAX_XVEL >= PADDLE_WIDTH + BALL_SIZE else None
+        self.ballX += self.xVel * active
+        self.ballY += self.yVel * active
+
+        # A ball fast enough to jump clean over a paddle goes just inside the face it passed, as in PongSimulation
+        # Only possible if MAX_XVEL is raised, so at the default speed this costs nothing
+        if previousX is not None:
+            for paddleX, paddleY in ((self.leftX, self.leftY), (self.rightX, self.rightY)):
+                inRow = active & (self.ballY < paddleY + PADDLE_HEIGHT) & (paddleY < self.ballY + BALL_SIZE)
+                self.ballX[inRow & (self.xVel < 0) & (previousX >= paddleX + PADDLE_WIDTH)
+                    & (self.ballX + BALL_SIZE <= paddleX)] = paddleX + PADDLE_WIDTH - 1
+                self.ballX[inRow & (self.xVel > 0) & (previousX + BALL_SIZE <= paddleX)
+                    & (self.ballX >= paddleX + PADDLE_WIDTH)] = paddleX - BALL_SIZE + 1
+
+        # If the ball makes it past the edge of the screen, update score, etc.
+        leftPoint = active & (self.ballX > self.screenWidth)
+        rightPoint = active & ~leftPoint & (self.ballX < 0)
+        scored = leftPoint | rightPoint
+        self.lScore += leftPoint
+        self.rScore += rightPoint
+        events[scored] |= EVENT_POINT
+        self.ballX[scored] = self.ballStartX
+        self.ballY[scored] = self.ballStartY
+        self.xVel[leftPoint] = -5   # Now going left
+        self.xVel[rightPoint] = 5   # Now going right
+        self.yVel[scored] = 0
+
+        # If the ball hits a paddle
+        hitLeft = active & self._ballCollides(self.leftX, self.leftY, PADDLE_WIDTH, PADDLE_HEIGHT)
+        hitRight = active & ~hitLeft & self._ballCollides(self.rightX, self.rightY, PADDLE_WIDTH, PADDLE_HEIGHT)
+        hit = hitLeft | hitRight
+        paddleCenter = np.where(hitLeft, self.leftY, self.rightY) + PADDLE_HEIGHT // 2
+        events[hit] |= EVENT_BOUNCE
+        self.xVel[hit] *= -1
+        self.yVel[hit] = (self.ballY[hit] + BALL_SIZE // 2 - paddleCenter[hit]) // 2
+
+        # If the ball hits a wall
+        hitWall = active & (self._ballCollides(-10, 0, self.screenWidth + 20, WALL_HEIGHT)
+            | self._ballCollides(-10, self.screenHeight - WALL_HEIGHT, self.screenWidth + 20, WALL_HEIGHT))
+        events[hitWall] |= EVENT_BOUNCE
+        self.yVel[hitWall] *= -1
+
+        return events
@@ -0,0 +1,64 @@
+# =================================================================================================
+# Purpose:                  Clocks that games and clients keep time with, real or virtual
+# Misc:                     A virtual clock never waits, sleeping just moves it forward, so a game paced by
+#                           its players' inputs instead runs as fast as the CPU allows
+# =================================================================================================
+
+import time
+
+
+# Purpose:  To keep time by the wall clock, the way the game always has
+class RealClock():
+    # Default constructor
+    def __init__(self) -> None:
+        self._lastTick = time.perf_counter()
+
+    @property # Virtual getter
+    def virtual(self) -> bool:
+        return False
+
+    # Seconds since some fixed point, only differences between readings mean anything
+    def now(self) -> float:
+        return time.perf_counter()
+
+    def sleep(self, seconds: float) -> None:
+        if seconds > 0:
+            time.sleep(seconds)
+
+    # Wait out the rest of a frame at fps frames per second, like pygame.time.Clock.tick()
+    # Returns the seconds since the last call
+    def tick(self, fps: float) -> float:
+        now = time.perf_counter()
+        delay = self._lastTick + 1 / fps - now
+        if delay > 0:
+            time.sleep(delay)
+            now = time.perf_counter()
+        elapsed = now - self._lastTick
+        self._lastTick = now
+        return elapsed
+
+
+# Purpose:  To keep time that only passes when its owner says so
+# Pre:  Only one thread moves the clock forward, any thread may read it
+# Post: Readings depend only on the calls made, never on how long anything really took
+class VirtualClock():
+    # Default constructor
+    def __init__(self, start: float = 0.0) -> None:
+        self._now = start
+
+    @property # Virtual getter
+    def virtual(self) -> bool:
+        return True
+
+    def now(self) -> float:
+        return self._now
+
+    # Move the clock forward without waiting
+    def sleep(self, seconds: float) -> None:
+        if seconds > 0:
+            self._now += seconds
+
+    # Move the clock forward exactly one frame, returns its length
+    def tick(self, fps: float) -> float:
+        self._now += 1 / fps
+        return 1 / fps
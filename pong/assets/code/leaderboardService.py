@@ -0,0 +1,171 @@
+# =================================================================================================
+# Purpose:                  Serves the leaderboard page and its JSON API from memory on a threaded HTTP server
+# Misc:                     GET /api/leaderboard?offset=&limit= for a page, /api/leaderboard/events for live updates,
+#                           /metrics for the server's metrics
+# =================================================================================================
+
+import http.server
+import json
+import logging
+import os
+import threading
+import time
+from typing import Optional, Tuple
+from urllib.parse import urlsplit, parse_qs
+
+from assets.code.leaderboardStore import LeaderboardStore
+from assets.code.metrics import MetricsRegistry
+
+DEFAULT_LIMIT = 100     # Players per page when the request doesn't say
+MAX_LIMIT = 1000        # Largest page anyone can ask for
+MAX_CACHED_PAGES = 64   # Serialized pages kept between leaderboard changes
+EVENT_KEEPALIVE = 15    # Seconds between comments on an idle event stream, so dead browsers are noticed
+
+log = logging.getLogger("pong.leaderboard")
+
+
+# Purpose:  To keep ready-to-send leaderboard responses in memory and rebuild them only when results change
+# Pre:  publish() is called after new results are stored
+# Post: Every response for a version of the leaderboard is serialized once, however many browsers ask for it
+class LeaderboardCache():
+    # Default constructor
+    def __init__(self, store: LeaderboardStore) -> None:
+        self._store = store
+        self._epoch = format(int(time.time()), 'x')   # Keeps ETags from an earlier run from matching
+        self._version = 0
+        self._pages = {}    # (offset, limit) -> (ETag, body) for the current version
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+
+    @property # Version getter, goes up by one every time results change
+    def version(self) -> int:
+        return self._version
+
+    # Drop every cached response and wake anyone waiting for a change
+    def publish(self) -> None:
+        with self._lock:
+            self._version += 1
+            self._pages.clear()
+            self._changed.notify_all()
+
+    # Block until the version is past seen or the timeout runs out, returns the current version
+    def wait(self, seen: int, timeout: float) -> int:
+        with self._lock:
+            self._changed.wait_for(lambda: self._version != seen, timeout)
+            return self._version
+
+    # ETag and serialized JSON body for one page of the ranking
+    def page(self, offset: int = 0, limit: int = DEFAULT_LIMIT) -> Tuple[str, bytes]:
+        key = (offset, limit)
+        with self._lock:
+            cached = self._pages.get(key)
+            version = self._version
+        if cached is not None:
+            return cached
+
+        # Built outside the lock so a slow query never holds up other pages
+        players = [{'rank': offset + index + 1, 'name': name, 'wins': wins}
+            for index, (name, wins) in enumerate(self._store.top(limit, offset))]
+        body = json.dumps({'version': version, 'total': self._store.count, 'offset': offset,
+            'limit': limit, 'players': players}).encode()
+        etag = '"' + self._epoch + '-' + str(version) + '-' + str(offset) + '-' + str(limit) + '"'
+
+        with self._lock:
+            if version == self._version:    # Don't cache a page that went stale while it was built
+                if len(self._pages) >= MAX_CACHED_PAGES:
+                    self._pages.clear()
+                self._pages[key] = (etag, body)
+        return etag, body
+
+
+# Purpose:  To answer one browser's requests for the leaderboard page, API and event stream
+class LeaderboardHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"   # Keep-alive, so a polling page reuses its connection
+    cache: Optional[LeaderboardCache] = None    # Set by startLeaderboardServer
+    metrics: Optional[MetricsRegistry] = None
+    indexPage: bytes = b""
+
+    def do_GET(self) -> None:
+        url = urlsplit(self.path)
+        if url.path in ("/", "/index.html"):
+            self.sendBody(200, self.indexPage, "text/html; charset=utf-8")
+        elif url.path == "/api/leaderboard":
+            self.sendPage(parse_qs(url.query))
+        elif url.path == "/api/leaderboard/events":
+            self.sendEvents()
+        elif url.path == "/metrics" and self.metrics is not None:
+            self.sendBody(200, self.metrics.render(), "text/plain; version=0.0.4; charset=utf-8")
+        else:
+            self.sendBody(404, b'{"error": "not found"}', "application/json")
+
+    # One page of the ranking, or 304 if the browser's copy is still current
+    def sendPage(self, query: dict) -> None:
+        try:
+            offset = max(0, int(query.get('offset', ['0'])[0]))
+            limit = min(MAX_LIMIT, max(1, int(query.get('limit', [str(DEFAULT_LIMIT)])[0])))
+        except ValueError:
+            self.sendBody(400, b'{"error": "offset and limit must be integers"}', "application/json")
+            return
+
+        etag, body = self.cache.page(offset, limit)
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.sendBody(200, body, "application/json", {"ETag": etag, "Cache-Control": "no-cache"})
+
+    # Server-sent events, the first page every time results change until the browser goes away
+    def sendEvents(self) -> None:
+        self.close_connection = True
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+
+        seen = None
+        try:
+            while True:
+                version = self.cache.version if seen is None else self.cache.wait(seen, EVENT_KEEPALIVE)
+                if version == seen:
+                    self.wfile.write(b": keepalive\n\n")
+                else:
+                    _, body = self.cache.page()
+                    self.wfile.write(b"data: " + body + b"\n\n")
+                    seen = version
+                self.wfile.flush()
+        except OSError:
+            pass    # Browser went away
+
+    def sendBody(self, status: int, body: bytes, contentType: str, headers: Optional[dict] = None) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", contentType)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    # Keep the per-request lines out of the server's console
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+
+# Purpose:  To serve the leaderboard with a thread per connection so one slow browser can't hold up the rest
+# Pre:  cache wraps the server's open LeaderboardStore
+# Post: Serves until the process exits
+def startLeaderboardServer(cache: LeaderboardCache, host: str, port: int = 80, metrics: Optional[MetricsRegistry] = None) -> None:
+    indexPath = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "index.html")
+    with open(indexPath, 'rb') as indexFile:
+        handler = type("BoundLeaderboardHandler", (LeaderboardHandler,), {'cache': cache, 'metrics': metrics, 'indexPage': indexFile.read()})
+
+    try:
+        httpd = http.server.ThreadingHTTPServer((host, port), handler)
+    except OSError as error:    # Port 80 needs root, or something else has it, the games go on without a page
+        log.error("Couldn't serve the leaderboard on port " + str(port) + ": " + str(error))
+        return
+    httpd.daemon_threads = True
+    log.info("serving at port " + str(port))
+    httpd.serve_forever()
@@ -0,0 +1,94 @@
+# =================================================================================================
+# Purpose:                  Crash-safe leaderboard storage updated one result at a time
+# Misc:                     Backed by SQLite, so a crash mid-update leaves the last committed leaderboard intact
+# =================================================================================================
+
+import json
+import logging
+import sqlite3
+import threading
+from typing import List, Tuple
+
+TOP_SIZE = 100  # Players in a ranking query that doesn't give a limit
+
+log = logging.getLogger("pong.leaderboard")
+
+
+# Purpose:  To keep every player's win count on disk and answer ranking queries without sorting everyone
+# Pre:  Names are the alphanumeric player names accepted by establishServer
+# Post: Each update is its own transaction, and the ranking index is kept up to date by SQLite as rows change
+class LeaderboardStore():
+    # Default constructor
+    # path      SQLite database file, created if it doesn't exist yet
+    def __init__(self, path: str = "leaderboard.db") -> None:
+        self._lock = threading.Lock()   # One connection shared by the game threads
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")  # Readers never wait on the writer
+        with self._db:
+            self._db.execute("CREATE TABLE IF NOT EXISTS scores (name TEXT PRIMARY KEY, wins INTEGER NOT NULL DEFAULT 0)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS scoresByWins ON scores (wins DESC, name)")  # The top-N index
+            self._db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+
+    # Make sure a player is on the leaderboard, starting them at zero wins
+    def addPlayer(self, name: str) -> None:
+        with self._lock, self._db:
+            self._db.execute("INSERT OR IGNORE INTO scores (name) VALUES (?)", (name,))
+
+    # Credit a player with one win, returns their new total
+    def recordWin(self, name: str) -> int:
+        with self._lock, self._db:
+            self._db.execute("INSERT INTO scores (name, wins) VALUES (?, 1) "
+                "ON CONFLICT (name) DO UPDATE SET wins = wins + 1", (name,))
+            return self._db.execute("SELECT wins FROM scores WHERE name = ?", (name,)).fetchone()[0]
+
+    # A player's win count, 0 if they've never played
+    def get(self, name: str) -> int:
+        with self._lock:
+            row = self._db.execute("SELECT wins FROM scores WHERE name = ?", (name,)).fetchone()
+        return row[0] if row is not None else 0
+
+    # Players ranked by wins (ties by name), walked straight off the index
+    def top(self, limit: int = TOP_SIZE, offset: int = 0) -> List[Tuple[str, int]]:
+        with self._lock:
+            return self._db.execute("SELECT name, wins FROM scores ORDER BY wins DESC, name LIMIT ? OFFSET ?",
+                (limit, offset)).fetchall()
+
+    @property # Player count getter
+    def count(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM scores").fetchone()[0]
+
+    # Bring in the scores from an old leaderboard.json, once per database
+    # Returns the number of players imported, 0 if it was already done or there is no file
+    def importJson(self, path: str) -> int:
+        with self._lock:
+            if self._db.execute("SELECT 1 FROM meta WHERE key = 'importedJson'").fetchone() is not None:
+                return 0
+        try:
+            with open(path, 'r') as leaderboardFile:
+                entries = json.load(leaderboardFile)
+        except (OSError, ValueError):
+            entries = []
+        if not isinstance(entries, list):
+            log.warning("Not importing " + path + ", it isn't a list of players")
+            entries = []
+
+        # The old format is a list whose first item is an empty placeholder, then {"name", "score"} per player
+        rows = []
+        for item in entries:
+            if not (isinstance(item, dict) and 'name' in item and 'score' in item):
+                continue
+            try:
+                rows.append((str(item['name']), int(item['score'])))
+            except (TypeError, ValueError, OverflowError):  # One hand-edited score shouldn't lose everyone else's
+                log.warning("Skipping " + str(item['name']) + " from " + path + ", their score "
+                    + repr(item['score']) + " isn't a number")
+        with self._lock, self._db:
+            self._db.executemany("INSERT INTO scores (name, wins) VALUES (?, ?) "
+                "ON CONFLICT (name) DO UPDATE SET wins = MAX(wins, excluded.wins)", rows)
+            self._db.execute("INSERT INTO meta (key, value) VALUES ('importedJson', ?)", (path,))
+        return len(rows)
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,139 @@
+# =================================================================================================
+# Purpose:                  Measures each player's link and picks how often and how precisely to send them snapshots
+# Misc:                     Round trips come from the snapshot ticks players acknowledge in their inputs
+# =================================================================================================
+
+import socket
+import sys
+import threading
+from collections import deque
+from typing import Optional
+
+try:
+    import fcntl
+    import termios
+except ImportError:     # Windows, where a socket's unsent bytes aren't measured
+    fcntl = termios = None
+
+# (ticks between snapshots, pixels positions are rounded to in deltas), from the best link to the worst
+SEND_LEVELS = ((1, 1), (2, 1), (3, 1), (4, 2), (6, 4))
+ADAPT_INTERVAL = 0.5    # Seconds between decisions about a player's level
+QUEUE_DELAY_HIGH = 0.08 # Seconds of round trip above the fastest seen, past which the link is queueing
+JITTER_HIGH = 0.03      # Seconds of round trip variation past which the link is struggling
+BACKLOG_HIGH = 2048     # Bytes sitting unsent in a player's socket past which they can't keep up
+CALM_DECISIONS = 2      # Decisions in a row with a healthy link before stepping back up a level
+SENT_HISTORY = 128      # Send times kept to match acknowledgements against
+
+
+# Purpose:  To measure the bytes a TCP socket has been given but not yet sent
+# Post: Returns 0 where that can't be measured
+def unsentBytes(sock: socket.socket) -> int:
+    if fcntl is None or not hasattr(termios, "TIOCOUTQ"):
+        return 0
+    try:
+        return int.from_bytes(fcntl.ioctl(sock.fileno(), termios.TIOCOUTQ, bytes(4)), sys.byteorder)
+    except (OSError, ValueError):
+        return 0
+
+
+# Purpose:  To track one player's round trip, jitter and send backlog and choose their level in SEND_LEVELS
+# Pre:  The game thread calls due(), sent() and adapt() and sets backlog, the player's input thread calls acked()
+# Post: A player whose link queues, jitters or backs up is sent fewer and coarser snapshots, and more again once it recovers
+class LinkMonitor():
+    # Default constructor
+    # maxLevel  Worst level a player may be moved to, len(levels) - 1 by default
+    def __init__(self, levels: tuple = SEND_LEVELS, maxLevel: Optional[int] = None, adaptInterval: float = ADAPT_INTERVAL) -> None:
+        self._levels = levels
+        self._maxLevel = len(levels) - 1 if maxLevel is None else min(maxLevel, len(levels) - 1)
+        self._adaptInterval = adaptInterval
+        self._level = 0
+        self._skipped = 0       # Passes since the last snapshot was sent
+        self._sent = deque()    # (tick, time sent), oldest first
+        self._lastAcked = 0
+        self._lock = threading.Lock()
+        self._nextDecision = None
+        self._calm = 0
+        self.rtt = None         # Smoothed round trip in seconds
+        self.jitter = 0.0       # Smoothed round trip variation in seconds
+        self.fastest = None     # Fastest round trip seen, creeping up slowly in case the route changes
+        self.backlog = 0        # Unsent bytes last measured
+
+    @property # Level getter, 0 is the best
+    def level(self) -> int:
+        return self._level
+
+    @property # Worst level allowed getter, 0 never adapts
+    def maxLevel(self) -> int:
+        return self._maxLevel
+
+    @property # Ticks between snapshots getter
+    def interval(self) -> int:
+        return self._levels[self._level][0]
+
+    @property # Delta position quantum getter
+    def quantum(self) -> int:
+        return self._levels[self._level][1]
+
+    # Whether this pass of the game loop should send the player a snapshot, counts the pass either way
+    def due(self) -> bool:
+        self._skipped += 1
+        return self._skipped >= self.interval
+
+    # Record that a tick was sent at time now
+    def sent(self, tick: int, now: float) -> None:
+        self._skipped = 0
+        with self._lock:
+            self._sent.append((tick, now))
+            if len(self._sent) > SENT_HISTORY:
+                self._sent.popleft()
+
+    # Record an acknowledgement of tick arriving at time now, taking a round trip sample if it's new
+    # Returns the sample in seconds, or None if the acknowledgement didn't give one
+    def acked(self, tick: int, now: float) -> Optional[float]:
+        with self._lock:
+            if tick <= self._lastAcked:
+                return None
+            self._lastAcked = tick
+            sentAt = None
+            while self._sent and self._sent[0][0] <= tick:
+                sentTick, sentAt = self._sent.popleft()
+            if sentAt is None or sentTick != tick:
+                return None
+            sample = now - sentAt
+            if self.rtt is None:
+                self.rtt = self.fastest = sample
+                return sample
+            self.jitter += (abs(sample - self.rtt) - self.jitter) / 4    # As TCP smooths its own round trip
+            self.rtt += (sample - self.rtt) / 8
+            if sample < self.fastest:
+                self.fastest = sample
+            else:
+                self.fastest += (sample - self.fastest) * 0.001
+            return sample
+
+    # Move up or down a level if it's time to decide, returns a description of the change or None
+    # The caller keeps backlog up to date with the player's unsent bytes
+    def adapt(self, now: float) -> Optional[str]:
+        if self._nextDecision is None:
+            self._nextDecision = now + self._adaptInterval
+        if now < self._nextDecision:
+            return None
+        self._nextDecision = now + self._adaptInterval
+
+        rtt, jitter, fastest, backlog = self.rtt, self.jitter, self.fastest, self.backlog
+        queueing = rtt - fastest if rtt is not None else 0.0
+        struggling = backlog > BACKLOG_HIGH or queueing > QUEUE_DELAY_HIGH or jitter > JITTER_HIGH
+        if struggling:
+            self._calm = 0
+            if self._level >= self._maxLevel:
+                return None
+            self._level += 1
+        else:
+            self._calm += 1
+            if self._level == 0 or self._calm < CALM_DECISIONS:
+                return None
+            self._calm = 0
+            self._level -= 1
+        return ("every " + str(self.interval) + " tick(s), positions to " + str(self.quantum) + " px ("
+            + ("no round trips yet" if rtt is None else f"RTT {rtt*1000:.0f} ms, {queueing*1000:.0f} ms queueing, jitter {jitter*1000:.0f} ms")
+            + ", " + str(backlog) + " bytes unsent)")
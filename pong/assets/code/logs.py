@@ -0,0 +1,56 @@
+# =================================================================================================
+# Purpose:                  Leveled logging with a rate limit, so per-frame debug output can't flood the console
+# Misc:                     Per-frame messages are logged at DEBUG, which is off unless PONG_LOG_LEVEL=DEBUG is set
+# =================================================================================================
+
+import logging
+import os
+import threading
+import time
+
+LOG_LEVEL = os.environ.get("PONG_LOG_LEVEL", "INFO").upper()
+LOG_RATE = 5            # Messages let through per call site per LOG_INTERVAL
+LOG_INTERVAL = 1.0      # Seconds
+
+
+# Purpose:  To let through at most a few records per second from each line of code, counting the rest
+# Pre:  Attached to a handler, so it sees every record that would be written
+# Post: The first record after a quiet spell says how many were dropped before it
+class RateLimitFilter(logging.Filter):
+    # Default constructor
+    def __init__(self, rate: int = LOG_RATE, interval: float = LOG_INTERVAL) -> None:
+        super().__init__()
+        self._rate = rate
+        self._interval = interval
+        self._windows = {}  # (file, line) -> [window start, records let through, records dropped]
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        key = (record.pathname, record.lineno)
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None or now - window[0] >= self._interval:
+                dropped = window[2] if window is not None else 0
+                self._windows[key] = [now, 1, 0]
+                if dropped:
+                    record.msg = str(record.msg) + " (" + str(dropped) + " similar messages suppressed)"
+                return True
+            if window[1] < self._rate:
+                window[1] += 1
+                return True
+            window[2] += 1
+            return False
+
+
+# Purpose:  To send the pong loggers to the console at the configured level, through the rate limit
+# Post: Safe to call more than once, later calls only change the level
+def setupLogging(level: str = LOG_LEVEL) -> None:
+    logger = logging.getLogger("pong")
+    logger.setLevel(level)
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        handler.addFilter(RateLimitFilter())
+        logger.addHandler(handler)
+        logger.propagate = False
@@ -0,0 +1,166 @@
+# =================================================================================================
+# Purpose:                  Counters, gauges and histograms rendered in the Prometheus text format
+# Misc:                     Served at /metrics by the leaderboard server, cheap enough to update every tick.
+#                           Worker processes report snapshots to the supervisor, which adds them to its own
+# =================================================================================================
+
+import threading
+from bisect import bisect_left
+from typing import Callable, Optional
+
+# Default histogram bucket upper bounds, in seconds
+TIME_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+
+# Purpose:  A number that only goes up, like bytes sent
+class Counter():
+    kind = "counter"
+
+    # Default constructor
+    def __init__(self, name: str, help: str) -> None:
+        self.name = name
+        self.help = help
+        self._value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1) -> None:
+        with self._lock:
+            self._value += amount
+
+    @property # Value getter
+    def value(self) -> float:
+        return self._value
+
+    # What another process needs to add this counter to its own
+    def state(self) -> float:
+        return self._value
+
+    # others are state()s of the same counter reported by other processes
+    def render(self, others: list = ()) -> list:
+        return [self.name + " " + str(self._value + sum(others))]
+
+
+# Purpose:  A number that goes up and down, either set directly or read from a function when scraped
+class Gauge():
+    kind = "gauge"
+
+    # Default constructor
+    # function  Called on every scrape for the current value, instead of set()
+    def __init__(self, name: str, help: str, function: Optional[Callable[[], float]] = None) -> None:
+        self.name = name
+        self.help = help
+        self._value = 0
+        self._function = function
+
+    def set(self, value: float) -> None:
+        self._value = value
+
+    @property # Value getter
+    def value(self) -> float:
+        return self._function() if self._function is not None else self._value
+
+    def state(self) -> float:
+        return self.value
+
+    # Gauges from other processes are added up too, they count games, players and connections
+    def render(self, others: list = ()) -> list:
+        return [self.name + " " + str(self.value + sum(others))]
+
+
+# Purpose:  To count observations into fixed buckets, so percentiles can be worked out afterwards
+class Histogram():
+    kind = "histogram"
+
+    # Default constructor
+    # buckets   Increasing upper bounds, a +Inf bucket is always added
+    def __init__(self, name: str, help: str, buckets: tuple = TIME_BUCKETS) -> None:
+        self.name = name
+        self.help = help
+        self._bounds = tuple(buckets)
+        self._counts = [0] * (len(self._bounds) + 1)
+        self._sum = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect_left(self._bounds, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    @property # Observation count getter
+    def count(self) -> int:
+        return sum(self._counts)
+
+    # Bucket counts and sum, for adding to the same histogram in another process
+    def state(self) -> tuple:
+        with self._lock:
+            return list(self._counts), self._sum
+
+    def render(self, others: list = ()) -> list:
+        counts, total = self.state()
+        for otherCounts, otherSum in others:
+            if len(otherCounts) != len(counts):    # Bucketed differently, can't be added
+                continue
+            counts = [count + other for count, other in zip(counts, otherCounts)]
+            total += otherSum
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self._bounds + (float("inf"),), counts):
+            cumulative += count
+            label = "+Inf" if bound == float("inf") else repr(bound)
+            lines.append(self.name + '_bucket{le="' + label + '"} ' + str(cumulative))
+        lines.append(self.name + "_sum " + str(total))
+        lines.append(self.name + "_count " + str(cumulative))
+        return lines
+
+
+# Purpose:  To hold a program's metrics and render them all for a scrape
+class MetricsRegistry():
+    # Default constructor
+    def __init__(self) -> None:
+        self._metrics = []
+        self._reports = {}  # Source -> {name: state} last reported by another process
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, help: str) -> Counter:
+        return self._add(Counter(name, help))
+
+    def gauge(self, name: str, help: str, function: Optional[Callable[[], float]] = None) -> Gauge:
+        return self._add(Gauge(name, help, function))
+
+    def histogram(self, name: str, help: str, buckets: tuple = TIME_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help, buckets))
+
+    # Every metric's state, to report() to the registry of another process
+    def snapshot(self) -> dict:
+        return {metric.name: metric.state() for metric in self._metrics}
+
+    # Add a snapshot() taken in another process to every render, replacing what source reported before
+    # A None snapshot stops adding source, once that process has gone
+    def report(self, source, snapshot: Optional[dict]) -> None:
+        with self._lock:
+            if snapshot is None:
+                self._reports.pop(source, None)
+            else:
+                self._reports[source] = snapshot
+
+    # Every metric in the Prometheus text exposition format
+    def render(self) -> bytes:
+        with self._lock:
+            reports = list(self._reports.values())
+        lines = []
+        for metric in self._metrics:
+            lines.append("# HELP " + metric.name + " " + metric.help)
+            lines.append("# TYPE " + metric.name + " " + metric.kind)
+            lines.extend(metric.render([report[metric.name] for report in reports if metric.name in report]))
+        return ("\n".join(lines) + "\n").encode()
+
+    # A metric with the same name as one already registered replaces it, as when a worker process remakes
+    # an object that registered metrics before it forked
+    def _add(self, metric):
+        for i, existing in enumerate(self._metrics):
+            if existing.name == metric.name:
+                self._metrics[i] = metric
+                return metric
+        self._metrics.append(metric)
+        return metric
@@ -0,0 +1,280 @@
+# =================================================================================================
+# Purpose:                  Client-side networking, prediction and snapshot interpolation for playGame
+# Misc:                     Pygame-free so it can be driven headlessly
+# =================================================================================================
+
+import threading
+import time
+from collections import deque
+from typing import Optional, Tuple
+
+from assets.code.physics import stepPaddle
+from assets.code.protocol import *
+
+MAX_PENDING_INPUTS = 256    # Unacknowledged inputs kept for replay, older ones are given up on
+SNAP_DISTANCE = 100         # Moves longer than this between two snapshots are teleports (a reset ball)
+
+
+# Purpose:  To move the player's own paddle as soon as a key is pressed and correct it against the server
+class PaddlePredictor():
+    # Default constructor
+    def __init__(self, y: int, screenHeight: int) -> None:
+        self.y = y
+        self._screenHeight = screenHeight
+        self._pending = deque()    # (sequence, moving) inputs the server hasn't applied yet
+
+    # Apply one frame of local input right away and remember it until the server acknowledges it
+    def applyInput(self, sequence: int, moving: int) -> None:
+        self._pending.append((sequence, moving))
+        if len(self._pending) > MAX_PENDING_INPUTS:
+            self._pending.popleft()
+        self.y = stepPaddle(self.y, moving, self._screenHeight)
+
+    # Start again from the server's paddle and replay every input it hasn't applied yet
+    # acked     Sequence of the last input the server applied before taking the snapshot
+    def reconcile(self, serverY: int, acked: int) -> None:
+        while self._pending and self._pending[0][0] <= acked:
+            self._pending.popleft()
+        y = int(serverY)
+        for _, moving in self._pending:
+            y = stepPaddle(y, moving, self._screenHeight)
+        self.y = y
+
+    @property # Unacknowledged input count getter
+    def pending(self) -> int:
+        return len(self._pending)
+
+
+# Purpose:  To draw remote objects a fixed delay in the past, blended between the snapshots around that time
+class SnapshotInterpolator():
+    # Default constructor
+    # tickRate  Server ticks per second, converts snapshot ticks to server time
+    # delay     Seconds behind the newest snapshot things are drawn, should cover a couple of ticks of jitter
+    def __init__(self, tickRate: int, delay: float = 0.1, size: int = 32) -> None:
+        self._tickRate = tickRate
+        self._delay = delay
+        self._snapshots = deque(maxlen=size)   # (server time, snapshot), oldest first
+        self._offset = None     # Local clock minus server time, from the fastest snapshot seen
+
+    # Buffer a snapshot that arrived at local time now
+    def push(self, snapshot: dict, now: float) -> None:
+        serverTime = snapshot['sync'] / self._tickRate
+        if self._snapshots and serverTime <= self._snapshots[-1][0]:
+            return  # Stale or duplicate
+
+        # The least-delayed snapshot gives the best clock offset, so jitter never pushes it later,
+        # but let it creep up slowly in case the two clocks drift apart
+        offset = now - serverTime
+        if self._offset is None or offset < self._offset:
+            self._offset = offset
+        else:
+            self._offset += (offset - self._offset) * 0.01
+
+        self._snapshots.append((serverTime, snapshot))
+
+    # Positions of the left paddle, right paddle and ball at local time now, or None before any snapshot
+    def sample(self, now: float) -> Optional[dict]:
+        if not self._snapshots:
+            return None
+        renderTime = now - self._offset - self._delay
+
+        # Hold the ends of the buffer rather than extrapolating past them
+        if renderTime <= self._snapshots[0][0]:
+            return self._snapshots[0][1]
+        if renderTime >= self._snapshots[-1][0]:
+            return self._snapshots[-1][1]
+
+        older = self._snapshots[0]
+        for newer in self._snapshots:
+            if newer[0] >= renderTime:
+                break
+            older = newer
+
+        fraction = (renderTime - older[0]) / (newer[0] - older[0])
+        return {field: lerp(older[1][field], newer[1][field], fraction) for field in ('left', 'right', 'ball')}
+
+
+# Purpose:  To blend two positions, jumping instead of sliding across teleports
+def lerp(a: list, b: list, fraction: float) -> list:
+    if abs(b[0] - a[0]) + abs(b[1] - a[1]) > SNAP_DISTANCE:
+        return b if fraction >= 0.5 else a
+    return [a[0] + (b[0] - a[0]) * fraction, a[1] + (b[1] - a[1]) * fraction]
+
+
+# Purpose:  To summarise a rolling window of timings (frame times, round trips) in seconds
+class TimingStats():
+    # Default constructor
+    def __init__(self, size: int = 1000) -> None:
+        self._samples = deque(maxlen=size)
+
+    def add(self, sample: float) -> None:
+        self._samples.append(sample)
+
+    @property # Sample count getter
+    def count(self) -> int:
+        return len(self._samples)
+
+    # Add every sample from another window, for rolling several connections into one report
+    def merge(self, other: "TimingStats") -> None:
+        self._samples.extend(other._samples)
+
+    # Mean, median, 99th percentile and standard deviation of the window, all zero when empty
+    def summary(self) -> dict:
+        if not self._samples:
+            return {'mean': 0.0, 'p50': 0.0, 'p99': 0.0, 'stdev': 0.0}
+        ordered = sorted(self._samples)
+        mean = sum(ordered) / len(ordered)
+        variance = sum((sample - mean) ** 2 for sample in ordered) / len(ordered)
+        return {'mean': mean,
+            'p50': ordered[len(ordered) // 2],
+            'p99': ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))],
+            'stdev': variance ** 0.5}
+
+
+# Purpose:  To do all of a client's network I/O on background threads so rendering never waits on it
+# Pre:  The handshake is done and client's codec is set
+# Post: Once started, the newest state is always ready to poll() and sendInput() never blocks
+class NetworkClient():
+    # Default constructor
+    # client        TCP connection to the server
+    # dataChannel   Carries per-tick input and snapshots in UDP mode, otherwise client does
+    def __init__(self, client: Connection, dataChannel=None, tickRate: int = 60, interpolationDelay: float = 0.1) -> None:
+        self._client = client
+        self._data = client if dataChannel is None else dataChannel
+        self._lock = threading.Lock()
+        self._outgoingReady = threading.Condition(self._lock)
+        self._incomingReady = threading.Condition(self._lock)   # A newer snapshot or the result arrived, or we closed
+        self._outgoing = None   # Newest input not sent yet, older unsent inputs are replaced by it
+
+        self._history = SnapshotHistory()   # Recent snapshots the server may send deltas against
+        self._interpolator = SnapshotInterpolator(tickRate, interpolationDelay)
+        self._latest = None
+        self._events = 0
+        self._result = None
+        self._needKeyframe = False
+        self._closed = False
+
+        self._sentAt = {}   # Input sequence -> time it was sent, until a snapshot acknowledges it
+        self.rtt = TimingStats()
+
+    # Start the sending and receiving threads
+    def start(self) -> None:
+        threads = [threading.Thread(target=self._sendLoop, daemon=True),
+            threading.Thread(target=self._recvLoop, daemon=True)]
+        if self._data is not self._client:  # In UDP mode the TCP connection is read on its own
+            threads.append(threading.Thread(target=self._controlLoop, daemon=True))
+        for thread in threads:
+            thread.start()
+
+    @property # Closed getter, True once the server has gone away
+    def closed(self) -> bool:
+        return self._closed
+
+    # Queue an input to send, replacing any input still waiting, the snapshot ack and flags are filled in here
+    def sendInput(self, data: dict) -> None:
+        with self._lock:
+            data['sync'] = self._latest['sync'] if self._latest is not None else 0
+            data['flags'] = INPUT_KEYFRAME if self._needKeyframe else 0
+            self._needKeyframe = False
+            self._outgoing = data
+            self._outgoingReady.notify()
+
+    # Newest snapshot, the event bits of every snapshot since the last poll and the match result if it's over
+    def poll(self) -> Tuple[Optional[dict], int, Optional[dict]]:
+        with self._lock:
+            events = self._events
+            self._events = 0
+            return self._latest, events, self._result
+
+    # Wait up to timeout seconds for a snapshot newer than sync, returns whether one has arrived
+    # Also returns once the match is over or the connection closes
+    def waitForSnapshot(self, sync: int, timeout: float) -> bool:
+        with self._lock:
+            self._incomingReady.wait_for(lambda: (self._latest is not None and self._latest['sync'] > sync)
+                or self._result is not None or self._closed, timeout)
+            return self._latest is not None and self._latest['sync'] > sync
+
+    # Interpolated positions to draw at local time now
+    def sample(self, now: float) -> Optional[dict]:
+        with self._lock:
+            return self._interpolator.sample(now)
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+            self._outgoingReady.notify()
+            self._incomingReady.notify_all()
+
+    def _sendLoop(self) -> None:
+        while True:
+            with self._lock:
+                while self._outgoing is None and not self._closed:
+                    self._outgoingReady.wait()
+                if self._closed:
+                    return
+                data = self._outgoing
+                self._outgoing = None
+                self._sentAt[data['seq']] = time.perf_counter()
+            try:
+                self._data.sendInput(data)
+            except (OSError, ProtocolError):
+                self.close()
+                return
+
+    def _recvLoop(self) -> None:
+        while not self._closed:
+            try:
+                received = self._data.recv()
+            except (OSError, ProtocolError):
+                break
+            if received is None:
+                if self._data is self._client:  # Server closed the connection
+                    break
+                continue    # No datagram this time, check we're still open and go again
+            self._handle(*received)
+        self.close()
+
+    def _controlLoop(self) -> None:
+        while not self._closed:
+            try:
+                received = self._client.recv()
+            except (OSError, ProtocolError):
+                break
+            if received is None:
+                break
+            self._handle(*received)
+        self.close()
+
+    # Apply one received message to the buffered state
+    def _handle(self, msgType: int, payload: bytes) -> None:
+        now = time.perf_counter()
+        codec = self._client.codec
+        with self._lock:
+            snapshot = None
+            if msgType == MSG_END:
+                self._result = decodeJson(payload)
+                self._incomingReady.notify_all()
+            elif msgType == MSG_SNAPSHOT:
+                snapshot = codec.decodeSnapshot(payload) # Full keyframe
+            elif msgType == MSG_DELTA:
+                delta = codec.decodeDelta(payload)
+                base = self._history.get(delta['base'])
+                if base is None:    # We no longer have what the delta was made against
+                    self._needKeyframe = True
+                else:
+                    snapshot = applyDelta(base, delta)
+
+            if snapshot is None or (self._latest is not None and snapshot['sync'] <= self._latest['sync']):
+                return
+            self._history.record(snapshot)
+            self._interpolator.push(snapshot, now)
+            self._events |= snapshot['events']
+            self._latest = snapshot
+            self._incomingReady.notify_all()
+
+            # Round trip from sending an input to seeing it applied
+            sentAt = self._sentAt.pop(snapshot['acked'], None)
+            if sentAt is not None:
+                self.rtt.add(now - sentAt)
+                for sequence in [sequence for sequence in self._sentAt if sequence < snapshot['acked']]:
+                    del self._sentAt[sequence]
@@ -0,0 +1,249 @@
+# =================================================================================================
+# Purpose:                  Headless pong rules the server simulates each game with
+# Misc:                     Mirrors Ball, Paddle and the ball logic in playGame without needing pygame
+# =================================================================================================
+
+import random
+from typing import Optional
+
+# Game constants, matching the values playGame has always used
+PADDLE_WIDTH = 10
+PADDLE_HEIGHT = 50
+PADDLE_SPEED = 5
+BALL_SIZE = 5
+BALL_START_XVEL = -5
+MAX_XVEL = 6
+WALL_HEIGHT = 10
+WINNING_SCORE = 5
+MAX_SERVE_YVEL = 3  # Steepest serve a seeded game draws, unseeded games always serve flat
+
+# Movement directions sent as paddle input
+MOVE_UP = -1
+MOVE_NONE = 0
+MOVE_DOWN = 1
+
+# Event bits reported by PongSimulation.step() so clients know when to play sounds
+EVENT_BOUNCE = 1
+EVENT_POINT = 2
+
+
+# Purpose:  To move a paddle's top edge some ticks in a direction, staying inside the walls
+# Shared by the server's simulation and the client's paddle prediction so both agree exactly
+# The paddle moves each tick only while it hasn't reached the wall, so this is the same as ticks single steps
+def stepPaddle(y: int, moving: int, screenHeight: int, ticks: int = 1) -> int:
+    if moving == MOVE_DOWN:
+        room = -(-(screenHeight - WALL_HEIGHT - PADDLE_HEIGHT - y) // PADDLE_SPEED)    # Steps left before the bottom wall
+        return y + PADDLE_SPEED * min(ticks, max(0, room))
+    elif moving == MOVE_UP:
+        room = -(-(y - WALL_HEIGHT) // PADDLE_SPEED)
+        return y - PADDLE_SPEED * min(ticks, max(0, room))
+    return y
+
+
+# Purpose:  To find the first tick a span moving at a constant whole-pixel speed could overlap (lo, hi)
+# Pre:  The span starts at position and is size wide, velocity is in pixels per tick
+# Post: Returns None if it never will, otherwise the first tick k >= 1 whose movement from tick k-1
+#   touches (lo, hi) at any moment, so a jump clean over the range counts too
+def firstContact(position: int, velocity: int, size: int, lo: int, hi: int) -> Optional[int]:
+    if velocity == 0:
+        return 1 if position < hi and lo < position + size else None
+    # The span overlaps the range for times strictly between start and end, kept as fractions over speed
+    if velocity > 0:
+        start, end, speed = lo - size - position, hi - position, velocity
+    else:
+        start, end, speed = position - hi, position + size - lo, -velocity
+    if end <= 0:    # Moving away, or already past it
+        return None
+    return max(1, start // speed + 1)
+
+
+# Purpose:  An integer rectangle that collides the same way pygame.Rect does
+class Body():
+    __slots__ = ('x', 'y', 'width', 'height')
+
+    # Default constructor, coordinates are truncated to ints like pygame.Rect
+    def __init__(self, x: float, y: float, width: int, height: int) -> None:
+        self.x = int(x)
+        self.y = int(y)
+        self.width = width
+        self.height = height
+
+    @property # Bottom edge getter
+    def bottom(self) -> int:
+        return self.y + self.height
+
+    @property # Vertical center getter
+    def centery(self) -> int:
+        return self.y + self.height // 2
+
+    # True if the two rectangles overlap, touching edges don't count
+    def collides(self, other: "Body") -> bool:
+        return (self.x < other.x + other.width and other.x < self.x + self.width
+            and self.y < other.y + other.height and other.y < self.y + self.height)
+
+
+# Purpose:  To own and step one game's ball, paddles and score at a fixed timestep
+class PongSimulation():
+    # Default constructor
+    # serveDelay    Ticks the ball waits before it starts moving
+    # seed          Draws the first serve's direction and every serve's angle, the same seed plays the same serves
+    def __init__(self, screenWidth: int = 640, screenHeight: int = 480, serveDelay: int = 0, seed: Optional[int] = None) -> None:
+        self.screenWidth = screenWidth
+        self.screenHeight = screenHeight
+
+        paddleStartPosY = (screenHeight/2)-(PADDLE_HEIGHT/2)
+        self.leftPaddle = Body(10, paddleStartPosY, PADDLE_WIDTH, PADDLE_HEIGHT)
+        self.rightPaddle = Body(screenWidth-20, paddleStartPosY, PADDLE_WIDTH, PADDLE_HEIGHT)
+        self.topWall = Body(-10, 0, screenWidth+20, WALL_HEIGHT)
+        self.bottomWall = Body(-10, screenHeight-WALL_HEIGHT, screenWidth+20, WALL_HEIGHT)
+
+        self.ball = Body(screenWidth/2, screenHeight/2, BALL_SIZE, BALL_SIZE)
+        self.ballStartX = self.ball.x
+        self.ballStartY = self.ball.y
+        self.xVel = BALL_START_XVEL
+        self.yVel = 0
+        self.seed = seed
+        self._random = random.Random(seed) if seed is not None else None
+        if self._random is not None:
+            self.xVel = self._random.choice((BALL_START_XVEL, -BALL_START_XVEL))
+            self.yVel = self._random.randint(-MAX_SERVE_YVEL, MAX_SERVE_YVEL)
+
+        self.lScore = 0
+        self.rScore = 0
+        self.tick = 0
+        self.serveDelay = serveDelay
+        self.leftMoving = MOVE_NONE
+        self.rightMoving = MOVE_NONE
+
+    # Record the latest paddle input for a side, it is applied on every following tick
+    def setInput(self, side: str, moving: int) -> None:
+        moving = MOVE_UP if moving < 0 else MOVE_DOWN if moving > 0 else MOVE_NONE
+        if side == "left":
+            self.leftMoving = moving
+        else:
+            self.rightMoving = moving
+
+    @property # Game over getter
+    def over(self) -> bool:
+        return self.lScore >= WINNING_SCORE or self.rScore >= WINNING_SCORE
+
+    @property # Winning side getter, None while the game is still going
+    def winner(self) -> Optional[str]:
+        if self.lScore >= WINNING_SCORE:
+            return "left"
+        if self.rScore >= WINNING_SCORE:
+            return "right"
+        return None
+
+    # Move a paddle one tick in a direction, staying inside the walls
+    def movePaddle(self, paddle: Body, moving: int) -> None:
+        paddle.y = stepPaddle(paddle.y, moving, self.screenHeight)
+
+    # Put the ball back in the middle heading towards a side
+    def resetBall(self, nowGoing: str) -> None:
+        self.ball.x = self.ballStartX
+        self.ball.y = self.ballStartY
+        self.xVel = -5 if nowGoing == "left" else 5
+        self.yVel = self._random.randint(-MAX_SERVE_YVEL, MAX_SERVE_YVEL) if self._random is not None else 0
+
+    # Advance the game by one tick, returns the EVENT_* bits that happened
+    def step(self) -> int:
+        self.tick += 1
+        self.movePaddle(self.leftPaddle, self.leftMoving)
+        self.movePaddle(self.rightPaddle, self.rightMoving)
+
+        if self.over or self.tick <= self.serveDelay:
+            return 0
+
+        events = 0
+        ball = self.ball
+
+        # Clamp velocity to 6 and move the ball
+        if self.xVel > MAX_XVEL:
+            self.xVel = MAX_XVEL
+        elif self.xVel < -MAX_XVEL:
+            self.xVel = -MAX_XVEL
+        previousX = ball.x
+        ball.x += self.xVel
+        ball.y += self.yVel
+
+        # A ball faster than PADDLE_WIDTH + BALL_SIZE a tick could jump clean over a paddle, so put one that did
+        # just inside the face it passed and let the paddle check below bounce it (never happens at MAX_XVEL 6)
+        for paddle in (self.leftPaddle, self.rightPaddle):
+            if not (ball.y < paddle.bottom and paddle.y < ball.bottom):
+                continue
+            if self.xVel < 0 and previousX >= paddle.x + paddle.width and ball.x + ball.width <= paddle.x:
+                ball.x = paddle.x + paddle.width - 1
+            elif self.xVel > 0 and previousX + ball.width <= paddle.x and ball.x >= paddle.x + paddle.width:
+                ball.x = paddle.x - ball.width + 1
+
+        # If the ball makes it past the edge of the screen, update score, etc.
+        if ball.x > self.screenWidth:
+            self.lScore += 1
+            events |= EVENT_POINT
+            self.resetBall(nowGoing="left")
+        elif ball.x < 0:
+            self.rScore += 1
+            events |= EVENT_POINT
+            self.resetBall(nowGoing="right")
+
+        # If the ball hits a paddle
+        for paddle in (self.leftPaddle, self.rightPaddle):
+            if ball.collides(paddle):
+                events |= EVENT_BOUNCE
+                self.xVel *= -1
+                self.yVel = (ball.centery - paddle.centery)//2
+                break
+
+        # If the ball hits a wall
+        if ball.collides(self.topWall) or ball.collides(self.bottomWall):
+            events |= EVENT_BOUNCE
+            self.yVel *= -1
+
+        return events
+
+    # Advance the game by several ticks at once, returns the EVENT_* bits that happened in any of them
+    # Ends in exactly the state calling step() that many times would, but the ball's flight between
+    # collisions is solved for in one go, so a game stepped 3 ticks at a time at 20 Hz costs a third as much
+    def advance(self, ticks: int) -> int:
+        events = 0
+        while ticks > 0:
+            quiet = self._quietTicks(ticks - 1)
+            self._coast(quiet)
+            events |= self.step()   # A tick something might happen on runs the ordinary rules
+            ticks -= quiet + 1
+        return events
+
+    # How many of the next ticks, up to limit, certainly pass with nothing but movement
+    def _quietTicks(self, limit: int) -> int:
+        if limit <= 0 or self.over:
+            return max(0, limit)
+        if self.tick < self.serveDelay:     # The ball is waiting to be served
+            return min(limit, self.serveDelay - self.tick)
+
+        ball = self.ball
+        xVel = max(-MAX_XVEL, min(MAX_XVEL, self.xVel))
+        contacts = [
+            # Leaving the screen for a point
+            (self.screenWidth - ball.x) // xVel + 1 if xVel > 0 else ball.x // -xVel + 1 if xVel < 0 else None,
+            # The paddles' columns, whatever their height, since they move while the ball does
+            firstContact(ball.x, xVel, ball.width, self.leftPaddle.x, self.leftPaddle.x + self.leftPaddle.width),
+            firstContact(ball.x, xVel, ball.width, self.rightPaddle.x, self.rightPaddle.x + self.rightPaddle.width),
+            # The walls' rows
+            firstContact(ball.y, self.yVel, ball.height, self.topWall.y, self.topWall.bottom),
+            firstContact(ball.y, self.yVel, ball.height, self.bottomWall.y, self.bottomWall.bottom)]
+        contacts = [tick for tick in contacts if tick is not None]
+        return min([limit] + [tick - 1 for tick in contacts])
+
+    # Run ticks in which nothing but movement happens
+    def _coast(self, ticks: int) -> None:
+        if ticks <= 0:
+            return
+        moving = not self.over and self.tick >= self.serveDelay
+        self.tick += ticks
+        self.leftPaddle.y = stepPaddle(self.leftPaddle.y, self.leftMoving, self.screenHeight, ticks)
+        self.rightPaddle.y = stepPaddle(self.rightPaddle.y, self.rightMoving, self.screenHeight, ticks)
+        if moving:
+            self.xVel = max(-MAX_XVEL, min(MAX_XVEL, self.xVel))
+            self.ball.x += self.xVel * ticks
+            self.ball.y += self.yVel * ticks
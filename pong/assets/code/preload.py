@@ -0,0 +1,78 @@
+# =================================================================================================
+# Purpose:                  Starts pygame and loads the fonts and sounds while the player waits for an opponent
+# Misc:                     Everything is loaded once per process and reused by every game after the first
+# =================================================================================================
+
+import logging
+import os
+import threading
+import time
+
+import pygame
+
+SCORE_FONT = "./assets/fonts/pong-score.ttf"
+WIN_FONT = "./assets/fonts/visitor.ttf"
+POINT_SOUND = "./assets/sounds/point.wav"
+BOUNCE_SOUND = "./assets/sounds/bounce.wav"
+
+log = logging.getLogger("pong.preload")
+
+
+# Purpose:  The fonts and sounds a game uses
+class GameAssets():
+    __slots__ = ('scoreFont', 'winFont', 'pointSound', 'bounceSound')
+
+    # Default constructor
+    def __init__(self, scoreFont: pygame.font.Font, winFont: pygame.font.Font, pointSound: pygame.mixer.Sound, bounceSound: pygame.mixer.Sound) -> None:
+        self.scoreFont = scoreFont
+        self.winFont = winFont
+        self.pointSound = pointSound
+        self.bounceSound = bounceSound
+
+
+# Purpose:  To get pygame ready on a background thread so a game can start the moment an opponent is found
+# Pre:  start() is called from the main thread, pygame's display has to be started there on some platforms
+# Post: get() returns the same GameAssets for every game in the process, loading them first if start() wasn't called
+class AssetCache():
+    # Default constructor
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._thread = None
+        self._assets = None
+        self._error = None
+
+    # Begin loading in the background if that hasn't happened yet, returns straight away
+    # headless uses SDL's dummy drivers, so nothing is shown or played
+    def start(self, headless: bool = False) -> None:
+        with self._lock:
+            if self._thread is None:
+                if headless:
+                    os.environ["SDL_VIDEODRIVER"] = "dummy"     # Events still work, nothing is shown
+                    os.environ["SDL_AUDIODRIVER"] = "dummy"
+                pygame.mixer.pre_init(44100, -16, 2, 2048)
+                self._thread = threading.Thread(target=self._load, daemon=True)
+                self._thread.start()
+        pygame.display.init()   # Cheap, and stopped again at the end of every game
+
+    # Wait for loading to finish, raises whatever went wrong loading
+    def get(self, headless: bool = False) -> GameAssets:
+        self.start(headless)
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+        return self._assets
+
+    @property # Loaded yet getter
+    def ready(self) -> bool:
+        return self._assets is not None
+
+    def _load(self) -> None:
+        started = time.perf_counter()
+        try:
+            pygame.init()   # The display was started by start(), so this brings up the mixer, fonts and the rest
+            self._assets = GameAssets(pygame.font.Font(SCORE_FONT, 32), pygame.font.Font(WIN_FONT, 48),
+                pygame.mixer.Sound(POINT_SOUND), pygame.mixer.Sound(BOUNCE_SOUND))
+        except Exception as error:
+            self._error = error
+            return
+        log.debug("Assets loaded in %.1f ms", (time.perf_counter() - started) * 1000)
@@ -0,0 +1,469 @@
+# =================================================================================================
+# Purpose:                  The wire protocol spoken between pongServer.py and pongClient.py
+# Misc:                     Every message is framed as [length:2][version:1][type:1][payload], UDP
+#                           datagrams prefix the frame with [token:8][sequence:4]
+# =================================================================================================
+
+import json # For the handshake messages and the json codec
+import select
+import socket
+import struct # For packing the binary messages
+from collections import deque
+from typing import Optional, Tuple
+
+PROTOCOL_VERSION = 6  # Bump whenever an old peer would misread a message instead of rejecting it
+
+# Message types
+MSG_HELLO = 1       # Client -> server, JSON: name and the codecs the client speaks
+MSG_WELCOME = 2     # Server -> client, JSON: side, screen size and the codec chosen by the server
+MSG_INPUT = 3       # Client -> server, paddle input once per frame
+MSG_SNAPSHOT = 4    # Server -> client, full authoritative game state (a keyframe)
+MSG_DELTA = 5       # Server -> client, only the fields changed since a snapshot the client acknowledged
+MSG_END = 6         # Server -> client, JSON: winner, final score and the winner's leaderboard total
+
+# Transports for the per-tick input and snapshots, the handshake and match end always use TCP
+TRANSPORT_TCP = "tcp"
+TRANSPORT_UDP = "udp"
+
+# Codecs for the per-frame messages, in the server's order of preference
+CODEC_BINARY = "binary"
+CODEC_JSON = "json"
+SUPPORTED_CODECS = (CODEC_BINARY, CODEC_JSON)
+
+HEADER = struct.Struct("!HBB")          # Payload length, protocol version, message type
+INPUT = struct.Struct("!IIbB")          # Sync of the last snapshot received, input sequence, paddle movement (-1 up, 0 still, 1 down), flags
+SNAPSHOT = struct.Struct("!II2f2f2f2HB")    # Tick, last input applied, left paddle x/y, right paddle x/y, ball x/y, left/right score, event bits
+DELTA_HEADER = struct.Struct("!IIIBB")  # Tick, base tick, last input applied, changed field mask, event bits
+POSITION = struct.Struct("!2f")
+QUANTIZED_POSITION = struct.Struct("!2h")   # A position in whole steps of the delta's quantum
+QUANTUM = struct.Struct("!B")
+SCORE = struct.Struct("!2H")
+DATAGRAM = struct.Struct("!QI")         # Session token, sequence number
+TICK = struct.Struct("!I")
+
+# Snapshot fields a delta can carry, in mask bit order
+DELTA_FIELDS = (('left', POSITION), ('right', POSITION), ('ball', POSITION), ('score', SCORE))
+
+# Where things sit in a SNAPSHOT-packed buffer, so snapshots can be encoded and diffed without unpacking them
+PACKED_ACKED = 4    # Byte offset of the last input applied
+PACKED_FIELDS = ((8, 16), (16, 24), (24, 32), (32, 36))    # Byte range of each of DELTA_FIELDS
+PACKED_EVENTS = 36
+DELTA_QUANTIZED = 0x80  # Delta mask bit: a QUANTUM byte follows the header and positions are QUANTIZED_POSITION
+
+# Input flags
+INPUT_KEYFRAME = 1  # The client has no usable base snapshot and needs a full one
+MAX_PAYLOAD = 0xFFFF
+
+RECV_SIZE = 4096
+MAX_DATAGRAM = 1200     # Stay well under a typical path MTU
+
+
+# Purpose:  Raised when a peer sends bytes that are not a valid message
+class ProtocolError(Exception):
+    pass
+
+
+# Purpose:  To frame a payload with its length, the protocol version and its message type
+def encodeFrame(msgType: int, payload: bytes) -> bytes:
+    if len(payload) > MAX_PAYLOAD:
+        raise ProtocolError("Payload of " + str(len(payload)) + " bytes is too large to frame")
+    return HEADER.pack(len(payload), PROTOCOL_VERSION, msgType) + payload
+
+
+# Purpose:  To split a TCP byte stream back into whole messages no matter how recv() cut it up
+class StreamDecoder():
+    # Default constructor
+    def __init__(self) -> None:
+        self._buffer = bytearray()
+        self._messages = deque()   # (msgType, payload) pairs decoded but not yet consumed
+
+    # Add freshly received bytes and decode every message they complete
+    def feed(self, data: bytes) -> None:
+        self._buffer += data
+        offset = 0
+        while len(self._buffer) - offset >= HEADER.size:
+            length, version, msgType = HEADER.unpack_from(self._buffer, offset)
+            if version != PROTOCOL_VERSION:
+                raise ProtocolError("Unsupported protocol version " + str(version))
+            end = offset + HEADER.size + length
+            if end > len(self._buffer):
+                break   # Partial message, wait for the rest
+            self._messages.append((msgType, bytes(self._buffer[offset + HEADER.size:end])))
+            offset = end
+        del self._buffer[:offset]
+
+    # Pop the oldest decoded message, or None if there is no whole message yet
+    def next(self) -> Optional[Tuple[int, bytes]]:
+        return self._messages.popleft() if self._messages else None
+
+    @property # Pending message count getter
+    def pending(self) -> int:
+        return len(self._messages)
+
+
+# Purpose:  To pack and unpack per-frame messages as fixed-size structs
+class BinaryCodec():
+    name = CODEC_BINARY
+
+    def encodeInput(self, data: dict) -> bytes:
+        return INPUT.pack(data['sync'], data.get('seq', 0), data['moving'], data.get('flags', 0))
+
+    def decodeInput(self, payload: bytes) -> dict:
+        try:
+            sync, seq, moving, flags = INPUT.unpack(payload)
+        except struct.error as e:
+            raise ProtocolError("Malformed input message") from e
+        return {'sync': sync, 'seq': seq, 'moving': moving, 'flags': flags}
+
+    def encodeSnapshot(self, data: dict) -> bytes:
+        return SNAPSHOT.pack(data['sync'], data.get('acked', 0), *data['left'], *data['right'], *data['ball'], *data['score'], data['events'])
+
+    def decodeSnapshot(self, payload: bytes) -> dict:
+        return unpackSnapshot(payload)
+
+    # Copy a SNAPSHOT-packed buffer straight onto the wire with this player's acked filled in
+    # events replaces the packed event bits, for ticks that were skipped before this one
+    def encodePackedSnapshot(self, packed: memoryview, acked: int, events: Optional[int] = None) -> bytes:
+        if events is None:
+            return b''.join((packed[:PACKED_ACKED], TICK.pack(acked), packed[PACKED_ACKED + TICK.size:]))
+        return b''.join((packed[:PACKED_ACKED], TICK.pack(acked), packed[PACKED_ACKED + TICK.size:PACKED_EVENTS], bytes((events,))))
+
+    # Build a delta between two SNAPSHOT-packed buffers by comparing and copying their raw field bytes
+    # quantum above 1 rounds positions to that many pixels and sends them as 16-bit steps, for slow links
+    def encodePackedDelta(self, packed: memoryview, base: memoryview, acked: int, events: Optional[int] = None, quantum: int = 1) -> bytes:
+        mask = 0
+        fields = []
+        for bit, (start, end) in enumerate(PACKED_FIELDS):
+            if packed[start:end] != base[start:end]:    # Against the exact base, so a rounded field is never left stale
+                mask |= 1 << bit
+                if quantum > 1 and DELTA_FIELDS[bit][1] is POSITION:
+                    fields.append(QUANTIZED_POSITION.pack(*(round(value / quantum) for value in POSITION.unpack(packed[start:end]))))
+                else:
+                    fields.append(packed[start:end])
+        if quantum > 1:
+            mask |= DELTA_QUANTIZED
+            fields.insert(0, QUANTUM.pack(quantum))
+        header = DELTA_HEADER.pack(TICK.unpack_from(packed)[0], TICK.unpack_from(base)[0], acked, mask,
+            packed[PACKED_EVENTS] if events is None else events)
+        return header + b''.join(fields)
+
+    def encodeDelta(self, data: dict) -> bytes:
+        mask = 0
+        fields = []
+        for bit, (field, fieldStruct) in enumerate(DELTA_FIELDS):
+            if field in data:
+                mask |= 1 << bit
+                fields.append(fieldStruct.pack(*data[field]))
+        return DELTA_HEADER.pack(data['sync'], data['base'], data.get('acked', 0), mask, data['events']) + b''.join(fields)
+
+    def decodeDelta(self, payload: bytes) -> dict:
+        try:
+            sync, base, acked, mask, events = DELTA_HEADER.unpack_from(payload)
+            data = {'sync': sync, 'base': base, 'acked': acked, 'events': events}
+            offset = DELTA_HEADER.size
+            quantum = None
+            if mask & DELTA_QUANTIZED:
+                quantum = QUANTUM.unpack_from(payload, offset)[0]
+                offset += QUANTUM.size
+            for bit, (field, fieldStruct) in enumerate(DELTA_FIELDS):
+                if not mask & (1 << bit):
+                    continue
+                if quantum is not None and fieldStruct is POSITION:
+                    data[field] = [step * quantum for step in QUANTIZED_POSITION.unpack_from(payload, offset)]
+                    offset += QUANTIZED_POSITION.size
+                else:
+                    data[field] = list(fieldStruct.unpack_from(payload, offset))
+                    offset += fieldStruct.size
+        except struct.error as e:
+            raise ProtocolError("Malformed delta message") from e
+        if offset != len(payload):
+            raise ProtocolError("Malformed delta message")
+        return data
+
+
+# Purpose:  To carry per-frame messages as JSON for peers that cannot speak the binary codec
+class JsonCodec():
+    name = CODEC_JSON
+
+    def encodeInput(self, data: dict) -> bytes:
+        return json.dumps(data).encode()
+
+    # Checked and coerced to the same ints the binary codec produces, seq and flags may be left out
+    def decodeInput(self, payload: bytes) -> dict:
+        data = decodeJson(payload)
+        if not isinstance(data, dict):
+            raise ProtocolError("Malformed input message")
+        try:
+            decoded = {'sync': int(data['sync']), 'seq': int(data.get('seq', 0)),
+                'moving': int(data['moving']), 'flags': int(data.get('flags', 0))}
+        except (KeyError, TypeError, ValueError, OverflowError) as e:
+            raise ProtocolError("Malformed input message") from e
+        if not (0 <= decoded['sync'] < 2**32 and 0 <= decoded['seq'] < 2**32
+                and -128 <= decoded['moving'] < 128 and 0 <= decoded['flags'] < 256):
+            raise ProtocolError("Input message field out of range")
+        return decoded
+
+    def encodeSnapshot(self, data: dict) -> bytes:
+        return json.dumps(data).encode()
+
+    def decodeSnapshot(self, payload: bytes) -> dict:
+        return decodeJson(payload)
+
+    def encodeDelta(self, data: dict) -> bytes:
+        return json.dumps(data).encode()
+
+    def decodeDelta(self, payload: bytes) -> dict:
+        return decodeJson(payload)
+
+    def encodePackedSnapshot(self, packed: memoryview, acked: int, events: Optional[int] = None) -> bytes:
+        snapshot = dict(unpackSnapshot(packed), acked=acked)
+        if events is not None:
+            snapshot['events'] = events
+        return self.encodeSnapshot(snapshot)
+
+    def encodePackedDelta(self, packed: memoryview, base: memoryview, acked: int, events: Optional[int] = None, quantum: int = 1) -> bytes:
+        delta = diffSnapshot(unpackSnapshot(base), dict(unpackSnapshot(packed), acked=acked))
+        if events is not None:
+            delta['events'] = events
+        if quantum > 1:
+            for field, fieldStruct in DELTA_FIELDS:
+                if field in delta and fieldStruct is POSITION:
+                    delta[field] = [round(value / quantum) * quantum for value in delta[field]]
+        return self.encodeDelta(delta)
+
+
+CODECS = {CODEC_BINARY: BinaryCodec(), CODEC_JSON: JsonCodec()}
+
+
+# Purpose:  To parse a JSON payload, reporting garbage as a ProtocolError
+def decodeJson(payload: bytes) -> dict:
+    try:
+        return json.loads(payload.decode())
+    except (UnicodeDecodeError, ValueError) as e:
+        raise ProtocolError("Malformed JSON message") from e
+
+
+# Purpose:  To turn a SNAPSHOT-packed payload or buffer into a snapshot dictionary
+def unpackSnapshot(payload: bytes) -> dict:
+    try:
+        sync, acked, lx, ly, rx, ry, bx, by, lScore, rScore, events = SNAPSHOT.unpack(payload)
+    except struct.error as e:
+        raise ProtocolError("Malformed snapshot message") from e
+    return {'sync': sync, 'acked': acked, 'left': [lx, ly], 'right': [rx, ry], 'ball': [bx, by], 'score': [lScore, rScore], 'events': events}
+
+
+# Purpose:  To build a delta holding only the fields of current that differ from base
+def diffSnapshot(base: dict, current: dict) -> dict:
+    delta = {'sync': current['sync'], 'base': base['sync'], 'acked': current.get('acked', 0), 'events': current['events']}
+    for field, _ in DELTA_FIELDS:
+        if current[field] != base[field]:
+            delta[field] = current[field]
+    return delta
+
+
+# Purpose:  To rebuild a full snapshot from the base snapshot a delta was made against
+def applyDelta(base: dict, delta: dict) -> dict:
+    snapshot = {'sync': delta['sync'], 'acked': delta.get('acked', 0), 'events': delta['events']}
+    for field, _ in DELTA_FIELDS:
+        snapshot[field] = delta[field] if field in delta else base[field]
+    return snapshot
+
+
+# Purpose:  To remember the last few snapshots by tick so deltas can be made and applied against them
+class SnapshotHistory():
+    # Default constructor
+    def __init__(self, size: int = 64) -> None:
+        self._size = size
+        self._snapshots = {}
+        self._ticks = deque()
+
+    # Remember a snapshot, forgetting the oldest once the history is full
+    def record(self, snapshot: dict) -> None:
+        if snapshot['sync'] in self._snapshots:
+            return
+        self._snapshots[snapshot['sync']] = snapshot
+        self._ticks.append(snapshot['sync'])
+        if len(self._ticks) > self._size:
+            del self._snapshots[self._ticks.popleft()]
+
+    # The snapshot for a tick, or None if it was never recorded or has been forgotten
+    def get(self, tick: int) -> Optional[dict]:
+        return self._snapshots.get(tick)
+
+
+# Purpose:  To pick the codec both ends speak, falling back to JSON
+# Pre:  offered is whatever the client sent as its codecs, anything but a list of names counts as no offer
+def negotiateCodec(offered) -> str:
+    if not isinstance(offered, (list, tuple)):
+        return CODEC_JSON
+    offered = [codec for codec in offered if isinstance(codec, str)]
+    for codec in SUPPORTED_CODECS:
+        if codec in offered:
+            return codec
+    return CODEC_JSON
+
+
+# Purpose:  To pair a socket with its stream decoder and negotiated codec
+class Connection():
+    # Default constructor
+    def __init__(self, sock: socket.socket, codec: str = CODEC_JSON) -> None:
+        self._sock = sock
+        self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)  # Small per-frame messages can't wait on Nagle
+        self._decoder = StreamDecoder()
+        self._codec = CODECS[codec]
+
+    @property # Socket getter
+    def sock(self) -> socket.socket:
+        return self._sock
+
+    @property # Codec getter
+    def codec(self):
+        return self._codec
+
+    @codec.setter # Codec setter, takes a codec name
+    def codec(self, codec: str) -> None:
+        self._codec = CODECS[codec]
+
+    # Frame and send a raw payload
+    def send(self, msgType: int, payload: bytes) -> None:
+        self._sock.sendall(encodeFrame(msgType, payload))
+
+    # Send a JSON handshake message
+    def sendJson(self, msgType: int, data: dict) -> None:
+        self.send(msgType, json.dumps(data).encode())
+
+    def sendInput(self, data: dict) -> None:
+        self.send(MSG_INPUT, self._codec.encodeInput(data))
+
+    def sendSnapshot(self, data: dict) -> None:
+        self.send(MSG_SNAPSHOT, self._codec.encodeSnapshot(data))
+
+    def sendDelta(self, data: dict) -> None:
+        self.send(MSG_DELTA, self._codec.encodeDelta(data))
+
+    # Block until a whole message arrives, returns None once the peer has closed the connection
+    def recv(self) -> Optional[Tuple[int, bytes]]:
+        message = self._decoder.next()
+        while message is None:
+            received = self._sock.recv(RECV_SIZE)
+            if not received:
+                return None
+            self._decoder.feed(received)
+            message = self._decoder.next()
+        return message
+
+    # Read whatever has arrived with one recv, for callers that already know the socket is readable
+    # Returns False once the peer has closed the connection
+    def fill(self) -> bool:
+        received = self._sock.recv(RECV_SIZE)
+        if not received:
+            return False
+        self._decoder.feed(received)
+        return True
+
+    # The next whole message already read by fill(), or None
+    def next(self) -> Optional[Tuple[int, bytes]]:
+        return self._decoder.next()
+
+    @property # Already received but unread message count getter
+    def pending(self) -> int:
+        return self._decoder.pending
+
+    # Block until a message of the expected type arrives and parse it as JSON
+    def recvJson(self, msgType: int) -> Optional[dict]:
+        message = self.recv()
+        if message is None:
+            return None
+        if message[0] != msgType:
+            raise ProtocolError("Expected message type " + str(msgType) + ", got " + str(message[0]))
+        return decodeJson(message[1])
+
+    # Shut the socket down so any thread blocked in recv() wakes up, then close it
+    def close(self) -> None:
+        try:
+            self._sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._sock.close()
+
+
+# Purpose:  To split a datagram into its session token, sequence number and framed message
+# Post: Returns None for anything that isn't a whole, current-version datagram
+def parseDatagram(datagram: bytes) -> Optional[Tuple[int, int, int, bytes]]:
+    if len(datagram) < DATAGRAM.size + HEADER.size:
+        return None
+    token, sequence = DATAGRAM.unpack_from(datagram)
+    length, version, msgType = HEADER.unpack_from(datagram, DATAGRAM.size)
+    start = DATAGRAM.size + HEADER.size
+    if version != PROTOCOL_VERSION or start + length != len(datagram):
+        return None
+    return token, sequence, msgType, datagram[start:]
+
+
+# Purpose:  To carry per-tick messages over UDP, dropping datagrams older than the newest one seen
+class DatagramChannel():
+    # Default constructor
+    # peer      Address datagrams are sent to, None until it is known
+    # timeout   Seconds recv() waits for a datagram before giving up
+    def __init__(self, sock: socket.socket, token: int, peer=None, codec: str = CODEC_JSON, timeout: Optional[float] = None) -> None:
+        self._sock = sock
+        self._token = token
+        self._codec = CODECS[codec]
+        self._timeout = timeout
+        self.peer = peer
+        self._sendSequence = 0
+        self._recvSequence = -1
+
+    @property # Codec getter
+    def codec(self):
+        return self._codec
+
+    @property # Token getter
+    def token(self) -> int:
+        return self._token
+
+    # Frame and send a raw payload, silently dropped while the peer is unknown
+    def send(self, msgType: int, payload: bytes) -> None:
+        if self.peer is None:
+            return
+        self._sendSequence += 1
+        datagram = DATAGRAM.pack(self._token, self._sendSequence) + encodeFrame(msgType, payload)
+        if len(datagram) > MAX_DATAGRAM:
+            raise ProtocolError("Datagram of " + str(len(datagram)) + " bytes is too large to send")
+        self._sock.sendto(datagram, self.peer)
+
+    def sendInput(self, data: dict) -> None:
+        self.send(MSG_INPUT, self._codec.encodeInput(data))
+
+    def sendSnapshot(self, data: dict) -> None:
+        self.send(MSG_SNAPSHOT, self._codec.encodeSnapshot(data))
+
+    def sendDelta(self, data: dict) -> None:
+        self.send(MSG_DELTA, self._codec.encodeDelta(data))
+
+    # True if this datagram is newer than any accepted so far, and remember it as the newest
+    def accept(self, sequence: int) -> bool:
+        if sequence <= self._recvSequence:
+            return False
+        self._recvSequence = sequence
+        return True
+
+    # Wait up to the timeout for the next current datagram, returns None if none arrived
+    def recv(self) -> Optional[Tuple[int, bytes]]:
+        self._sock.settimeout(self._timeout)
+        while True:
+            try:
+                datagram = self._sock.recv(MAX_DATAGRAM)
+            except socket.timeout:
+                return None
+            parsed = parseDatagram(datagram)
+            if parsed is None or parsed[0] != self._token or not self.accept(parsed[1]):
+                continue    # Garbage, someone else's or stale
+            return parsed[2], parsed[3]
+
+    @property # True when a datagram is waiting to be read
+    def pending(self) -> bool:
+        return bool(select.select([self._sock], [], [], 0)[0])
+
+    def close(self) -> None:
+        self._sock.close()
@@ -0,0 +1,267 @@
+# =================================================================================================
+# Purpose:                  Accepts connections, reads handshakes and reads every player's input from one thread
+# Misc:                     Only this thread may close a socket it watches, others ask it to through close()
+# =================================================================================================
+
+import heapq
+import logging
+import selectors
+import socket
+import threading
+import time
+from typing import Callable, Optional, Tuple
+
+from assets.code.protocol import *
+
+HANDSHAKE_TIMEOUT = 5   # Seconds a new connection has to send its hello
+IDLE_TIMEOUT = 10       # Seconds a watched connection may go without being heard from
+SWEEP_INTERVAL = 1      # Seconds between checks for connections that have gone quiet
+
+log = logging.getLogger("pong.reactor")
+
+
+# Purpose:  One connection the reactor is reading, and what to do with what it reads
+class Watched():
+    __slots__ = ('connection', 'address', 'onMessage', 'onClosed', 'heard', 'lastHeard', 'handshake')
+
+    # Default constructor
+    def __init__(self, connection: Connection, address: Optional[tuple], onMessage: Callable, onClosed: Callable,
+            lastHeard: Optional[Callable[[], float]], handshake: bool) -> None:
+        self.connection = connection
+        self.address = address
+        self.onMessage = onMessage
+        self.onClosed = onClosed
+        self.heard = time.monotonic()   # Last time anything was read, or when the handshake started
+        self.lastHeard = lastHeard      # Overrides heard, for players whose input may arrive some other way
+        self.handshake = handshake
+
+
+# Purpose:  To serve any number of connections from one thread, so a silent client never holds up anyone else
+# Pre:  run() is started on its own thread, every other method may be called from any thread
+# Post: Idle connections cost nothing until they speak, hang up or time out
+class Reactor():
+    # Default constructor
+    def __init__(self, handshakeTimeout: float = HANDSHAKE_TIMEOUT, idleTimeout: float = IDLE_TIMEOUT) -> None:
+        self._selector = selectors.DefaultSelector()
+        self._handshakeTimeout = handshakeTimeout
+        self._idleTimeout = idleTimeout
+        self._lock = threading.Lock()
+        self._requests = []     # Calls to make on the reactor thread, added since it last looked
+        self._timers = []       # Heap of (due, order, callback)
+        self._order = 0
+        self._handshakes = 0
+        self._watching = 0
+        self._thread = None
+        self._wakeRead, self._wakeWrite = socket.socketpair()
+        self._wakeRead.setblocking(False)
+        self._wakeWrite.setblocking(False)
+        self._woken = False
+        self._selector.register(self._wakeRead, selectors.EVENT_READ, None)
+
+    @property # Connections waiting for their hello getter
+    def handshakes(self) -> int:
+        return self._handshakes
+
+    @property # Connections being read after their handshake getter
+    def watching(self) -> int:
+        return self._watching
+
+    # Accept connections on server, handing each one's first message to onHello(connection, address, message)
+    # Connections that don't send a whole message within the handshake timeout are closed
+    def listen(self, server: socket.socket, onHello: Callable[[Connection, tuple, Tuple[int, bytes]], None]) -> None:
+        server.setblocking(False)
+        self._request(lambda: self._selector.register(server, selectors.EVENT_READ, onHello))
+
+    # Read a connection's messages, calling onMessage(msgType, payload) for each and onClosed() once if it
+    # hangs up, sends something onMessage raises on, or goes quiet for the idle timeout
+    # lastHeard returns when the client was last heard from, by default when the connection was last read
+    def watch(self, connection: Connection, onMessage: Callable[[int, bytes], None], onClosed: Callable[[], None],
+            lastHeard: Optional[Callable[[], float]] = None) -> None:
+        watched = Watched(connection, None, onMessage, onClosed, lastHeard, False)
+        self._request(lambda: self._register(watched))
+
+    # Stop watching a connection and close it, without calling its onClosed
+    def close(self, connection: Connection) -> None:
+        self._request(lambda: self._close(connection))
+
+    # Call callback on the reactor thread after delay seconds
+    def later(self, delay: float, callback: Callable[[], None]) -> None:
+        due = time.monotonic() + delay
+        def schedule() -> None:
+            self._order += 1
+            heapq.heappush(self._timers, (due, self._order, callback))
+        self._request(schedule)
+
+    # Start run() on a daemon thread, returns the thread
+    def start(self) -> threading.Thread:
+        self._thread = threading.Thread(target=self.run, daemon=True)
+        self._thread.start()
+        return self._thread
+
+    # Serve connections forever
+    def run(self) -> None:
+        self._thread = threading.current_thread()
+        nextSweep = time.monotonic() + SWEEP_INTERVAL
+        while(True):
+            now = time.monotonic()
+            due = min(nextSweep, self._timers[0][0]) if self._timers else nextSweep
+            for key, _ in self._selector.select(max(0, due - now)):
+                if self._selector.get_map().get(key.fd) is not key:
+                    continue    # Closed by an earlier event in this batch, its descriptor may even belong to someone new
+                if key.data is None:
+                    self._collect()
+                elif isinstance(key.data, Watched):
+                    self._safely(lambda: self._onReadable(key.data))
+                else:
+                    self._safely(lambda: self._accept(key.fileobj, key.data))
+
+            now = time.monotonic()
+            while self._timers and self._timers[0][0] <= now:
+                _, _, callback = heapq.heappop(self._timers)
+                self._safely(callback)
+            if now >= nextSweep:
+                self._safely(lambda: self._sweep(now))
+                nextSweep = now + SWEEP_INTERVAL
+
+    # Run a call on the reactor thread, straight away if already on it
+    def _request(self, call: Callable[[], None]) -> None:
+        if threading.current_thread() is self._thread:
+            call()
+            return
+        with self._lock:
+            self._requests.append(call)
+            if self._woken:     # One byte in the pipe is enough however many requests arrive before the reactor wakes
+                return
+            self._woken = True
+        try:
+            self._wakeWrite.send(b'\0')
+        except BlockingIOError:
+            pass
+
+    def _collect(self) -> None:
+        try:
+            while self._wakeRead.recv(4096):
+                pass
+        except BlockingIOError:
+            pass
+        with self._lock:
+            self._woken = False
+            requests, self._requests = self._requests, []
+        for call in requests:
+            self._safely(call)
+
+    # Accept every connection waiting in the backlog
+    def _accept(self, server: socket.socket, onHello: Callable) -> None:
+        while(True):
+            try:
+                clientSocket, clientAddress = server.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as error:   # Out of file descriptors, say, try again on the next wake
+                log.warning("Accept failed: " + str(error))
+                return
+            clientSocket.setblocking(True)  # Game threads send on it, a readable socket is only read once per wake
+            watched = Watched(Connection(clientSocket), clientAddress, onHello, None, None, True)
+            self._register(watched)
+
+    def _register(self, watched: Watched) -> None:
+        try:
+            self._selector.register(watched.connection.sock, selectors.EVENT_READ, watched)
+        except (KeyError, ValueError, OSError):   # Closed before it could be watched
+            if watched.onClosed is not None:
+                self._safely(watched.onClosed)
+            return
+        watched.heard = time.monotonic()
+        if watched.handshake:
+            self._handshakes += 1
+        else:
+            self._watching += 1
+        self._readBuffered(watched)   # Anything read along with the hello
+
+    def _unregister(self, watched: Watched) -> None:
+        self._selector.unregister(watched.connection.sock)
+        if watched.handshake:
+            self._handshakes -= 1
+        else:
+            self._watching -= 1
+
+    def _close(self, connection: Connection) -> None:
+        try:
+            key = self._selector.get_key(connection.sock)
+        except (KeyError, ValueError):
+            key = None
+        if key is not None:
+            self._unregister(key.data)
+        connection.close()
+
+    def _onReadable(self, watched: Watched) -> None:
+        try:
+            alive = watched.connection.fill()
+        except OSError:
+            alive = False
+        except ProtocolError as error:  # Garbage framing, possibly before a hello was even sent
+            log.info("Dropping connection: " + str(error))
+            alive = False
+        if not alive:
+            self._drop(watched)
+            return
+        if not watched.handshake:   # A hello trickled in a byte at a time still has to finish in time
+            watched.heard = time.monotonic()
+        self._readBuffered(watched)
+
+    # Hand on every whole message read so far
+    def _readBuffered(self, watched: Watched) -> None:
+        while(True):
+            message = watched.connection.next()
+            if message is None:
+                return
+            if watched.handshake:   # The first message decides where the connection goes, and it's no longer ours
+                self._unregister(watched)
+                try:
+                    watched.onMessage(watched.connection, watched.address, message)
+                except Exception:   # Nobody else will ever close it, and the handshake timeout no longer applies
+                    log.exception("Error handling a hello, closing the connection")
+                    watched.connection.close()
+                return
+            try:
+                watched.onMessage(*message)
+            except ProtocolError as error:
+                log.info("Dropping connection: " + str(error))
+                self._drop(watched)
+                return
+            except Exception:   # A message we didn't expect shouldn't take every other connection down with it
+                log.exception("Error handling a message, dropping the connection")
+                self._drop(watched)
+                return
+
+    # Stop watching a connection that hung up, misbehaved or went quiet, and say so
+    def _drop(self, watched: Watched) -> None:
+        self._unregister(watched)
+        watched.connection.close()
+        if watched.onClosed is not None:
+            self._safely(watched.onClosed)
+
+    # Close connections that haven't sent their hello or been heard from in time
+    def _sweep(self, now: float) -> None:
+        quiet = []
+        for key in list(self._selector.get_map().values()):
+            watched = key.data
+            if not isinstance(watched, Watched):
+                continue
+            if watched.handshake:
+                if now - watched.heard > self._handshakeTimeout:
+                    quiet.append(watched)
+                continue
+            heard = max(watched.heard, watched.lastHeard()) if watched.lastHeard is not None else watched.heard
+            if now - heard > self._idleTimeout:
+                quiet.append(watched)
+        for watched in quiet:
+            log.info("Closing quiet connection" + (" from " + str(watched.address[0]) if watched.address else ""))
+            self._drop(watched)
+
+    # A bug in one callback shouldn't stop every other connection being served
+    def _safely(self, call: Callable[[], None]) -> None:
+        try:
+            call()
+        except Exception:
+            log.exception("Error serving a connection")
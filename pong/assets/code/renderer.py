@@ -0,0 +1,98 @@
+# =================================================================================================
+# Purpose:                  Draws the game by repainting only what moved since the last frame
+# Misc:                     The walls and center line never change, so they're drawn once into a background
+#                           that is copied back over wherever something moved away from
+# =================================================================================================
+
+from typing import List, Tuple
+
+import pygame
+
+SCORE_CENTER_Y = 50     # Vertical center of the score text, as updateScore() places it
+
+
+# Purpose:  To draw frames of the game into the window, updating only the rectangles that changed
+# Pre:  screen is the display surface, nothing else draws into it while the renderer is in use
+# Post: After each draw() the window shows the given objects and score, exactly as a full redraw would
+class Renderer():
+    # Default constructor
+    def __init__(self, screen: pygame.Surface, color: Tuple[int, int, int], scoreFont: pygame.font.Font) -> None:
+        self._screen = screen
+        self._color = color
+        self._scoreFont = scoreFont
+        self._background = self._drawBackground(screen.get_width(), screen.get_height())
+        self._scores = {}   # (lScore, rScore) -> rendered text, in case a score is shown again
+        self._score = None  # Score on screen and where its text is
+        self._scoreRect = pygame.Rect(0, 0, 0, 0)
+        self._drawn = []    # Rectangles of the moving objects on screen
+        self._full = True   # Repaint the whole window next frame
+
+    # Repaint the whole window next frame, for when something else has drawn over it
+    def invalidate(self) -> None:
+        self._full = True
+
+    # Draw one frame: the moving objects as white rectangles, then the score on top
+    def draw(self, objects: List[pygame.Rect], lScore: int, rScore: int) -> None:
+        screen = self._screen
+        objects = [pygame.Rect(rect) for rect in objects]   # Copies, the callers move theirs in place
+        score = (lScore, rScore)
+
+        if self._full:
+            screen.blit(self._background, (0, 0))
+            dirty = None
+        else:
+            # Paint the background back over wherever an object was last frame
+            dirty = self._drawn
+            for rect in dirty:
+                screen.blit(self._background, rect, rect)
+
+        # The score is redrawn when it changes or when an object was erased from or is drawn over it
+        redrawScore = (dirty is None or score != self._score
+            or self._scoreRect.collidelist(dirty) != -1 or self._scoreRect.collidelist(objects) != -1)
+        if redrawScore and dirty is not None:
+            screen.blit(self._background, self._scoreRect, self._scoreRect)
+
+        for rect in objects:
+            pygame.draw.rect(screen, self._color, rect)
+
+        if redrawScore:
+            textSurface = self._scoreSurface(score)
+            textRect = textSurface.get_rect(center=(screen.get_width() / 2 + 5, SCORE_CENTER_Y))
+            screen.blit(textSurface, textRect)
+            if dirty is not None:
+                dirty = dirty + [self._scoreRect, textRect]
+            self._score = score
+            self._scoreRect = textRect
+
+        if dirty is None:
+            pygame.display.update()
+        else:
+            pygame.display.update(dirty + objects)
+        self._drawn = objects
+        self._full = False
+
+    # The walls and dotted center line on black, the parts of the screen that never move
+    def _drawBackground(self, screenWidth: int, screenHeight: int) -> pygame.Surface:
+        background = pygame.Surface((screenWidth, screenHeight)).convert(self._screen)
+        background.fill((0, 0, 0))
+        for i in range(0, screenHeight, 10):
+            pygame.draw.rect(background, self._color, pygame.Rect((screenWidth/2)-5, i, 5, 5))
+        pygame.draw.rect(background, self._color, pygame.Rect(-10, 0, screenWidth+20, 10))
+        pygame.draw.rect(background, self._color, pygame.Rect(-10, screenHeight-10, screenWidth+20, 10))
+        return background
+
+    def _scoreSurface(self, score: Tuple[int, int]) -> pygame.Surface:
+        textSurface = self._scores.get(score)
+        if textSurface is None:
+            textSurface = self._scoreFont.render(f"{score[0]}   {score[1]}", False, self._color)
+            self._scores[score] = textSurface
+        return textSurface
+
+
+# Purpose:  To stand in for Renderer when nothing should be drawn at all
+class HeadlessRenderer():
+    def invalidate(self) -> None:
+        pass
+
+    def draw(self, objects: List[pygame.Rect], lScore: int, rScore: int) -> None:
+        pass
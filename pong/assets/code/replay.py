@@ -0,0 +1,191 @@
+# =================================================================================================
+# Purpose:                  Records matches tick by tick to a compact file and reads them back
+# Misc:                     A replay is the magic bytes then ordinary protocol frames: a MSG_WELCOME with the
+#                           match details, a MSG_SNAPSHOT keyframe every so often with MSG_DELTAs in between,
+#                           a MSG_END with the result, and finally an index of the keyframes
+# =================================================================================================
+
+import json
+import mmap
+import os
+import struct
+from bisect import bisect_right
+from typing import Iterator, Optional
+
+from assets.code.protocol import *
+
+REPLAY_MAGIC = b"PONGREPL"
+INDEX_MAGIC = b"PIDX"
+INDEX_ENTRY = struct.Struct("!IQ")      # Keyframe tick, file offset of its frame
+TRAILER = struct.Struct("!QQI4s")       # Index offset, end frame offset, keyframe count, INDEX_MAGIC
+REPLAY_KEYFRAME_INTERVAL = 60           # Ticks between keyframes, the most a seek has to decode forward
+REPLAY_EXTENSION = ".pongreplay"
+
+
+# Purpose:  To keep a directory of replays within a file count and a total size by deleting the oldest
+# Pre:  Replay file names start with the time they were started, so sorting by name puts the oldest first
+# Post: At most maxFiles replays, taking at most maxBytes, are left, None leaves either unlimited
+#   Returns the number deleted, other files in the directory are never touched
+def pruneReplays(directory: str, maxFiles: Optional[int] = None, maxBytes: Optional[int] = None) -> int:
+    replays = []
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.name.endswith(REPLAY_EXTENSION) and entry.is_file():
+                    try:
+                        replays.append((entry.name, entry.stat().st_size))
+                    except OSError:     # Pruned by another process in the meantime
+                        continue
+    except OSError:
+        return 0
+    replays.sort()
+
+    total = sum(size for _, size in replays)
+    deleted = 0
+    for name, size in replays:
+        if (maxFiles is None or len(replays) - deleted <= maxFiles) and (maxBytes is None or total <= maxBytes):
+            break
+        try:
+            os.remove(os.path.join(directory, name))
+        except FileNotFoundError:
+            pass
+        deleted += 1
+        total -= size
+    return deleted
+
+
+# Purpose:  To append one match's ticks to a replay file as they're played
+# Pre:  record() is given the same SNAPSHOT-packed buffers the players are sent, one per tick in order
+# Post: After finish() the file ends with a keyframe index, a file cut short by a crash can still be read
+class ReplayWriter():
+    # Default constructor
+    # details   Match details saved at the top of the file, like the players' names and tick rate
+    def __init__(self, path: str, details: dict, keyframeInterval: int = REPLAY_KEYFRAME_INTERVAL) -> None:
+        self._file = open(path, 'wb')
+        self._keyframeInterval = keyframeInterval
+        self._index = []    # (tick, offset) of every keyframe
+        self._previous = bytearray(SNAPSHOT.size)  # Last tick recorded, deltas are made against it
+        self._lastKeyframe = None
+        self._offset = 0
+        self._write(REPLAY_MAGIC)
+        self._write(encodeFrame(MSG_WELCOME, json.dumps(details).encode()))
+
+    # Append one tick, as a keyframe when one is due and as a delta against the last tick otherwise
+    def record(self, packed: memoryview) -> None:
+        tick = TICK.unpack_from(packed)[0]
+        if self._lastKeyframe is None or tick - self._lastKeyframe >= self._keyframeInterval:
+            self._index.append((tick, self._offset))
+            self._lastKeyframe = tick
+            self._write(encodeFrame(MSG_SNAPSHOT, CODECS[CODEC_BINARY].encodePackedSnapshot(packed, 0)))
+        else:
+            self._write(encodeFrame(MSG_DELTA, CODECS[CODEC_BINARY].encodePackedDelta(packed, self._previous, 0)))
+        self._previous[:] = packed
+
+    # Write the result and the keyframe index, then close the file
+    def finish(self, result: dict) -> None:
+        endOffset = self._offset
+        self._write(encodeFrame(MSG_END, json.dumps(result).encode()))
+        indexOffset = self._offset
+        self._write(b''.join(INDEX_ENTRY.pack(tick, offset) for tick, offset in self._index))
+        self._write(TRAILER.pack(indexOffset, endOffset, len(self._index), INDEX_MAGIC))
+        self._file.close()
+
+    def _write(self, data: bytes) -> None:
+        self._file.write(data)
+        self._offset += len(data)
+
+
+# Purpose:  To read a replay through a memory map, seeking to any tick without reading the whole match
+# Pre:  path is a file written by ReplayWriter, finished or not
+# Post: Only the frames around the ticks asked for are ever touched
+class ReplayReader():
+    # Default constructor
+    def __init__(self, path: str) -> None:
+        with open(path, 'rb') as replayFile:
+            self._map = mmap.mmap(replayFile.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._map)
+        if self._view[:len(REPLAY_MAGIC)] != REPLAY_MAGIC:
+            self.close()
+            raise ProtocolError(path + " is not a pong replay")
+
+        msgType, payload, self._firstFrame = self._frameAt(len(REPLAY_MAGIC))
+        self.details = decodeJson(bytes(payload))
+        self.result = None
+
+        # A finished file says where its index is, otherwise find the keyframes by walking the frames once
+        self._end = len(self._map)
+        trailer = TRAILER.unpack_from(self._view, self._end - TRAILER.size) if self._end - TRAILER.size >= self._firstFrame else None
+        if trailer is not None and trailer[3] == INDEX_MAGIC:
+            indexOffset, endOffset, count, _ = trailer
+            entries = [INDEX_ENTRY.unpack_from(self._view, indexOffset + i * INDEX_ENTRY.size) for i in range(count)]
+            self._end = endOffset
+            self.result = decodeJson(bytes(self._frameAt(endOffset)[1]))
+        else:
+            entries = self._scan()
+        self._ticks = [tick for tick, _ in entries]
+        self._offsets = [offset for _, offset in entries]
+
+    @property # Keyframe count getter
+    def keyframes(self) -> int:
+        return len(self._ticks)
+
+    @property # First tick getter, None for an empty replay
+    def firstTick(self) -> Optional[int]:
+        return self._ticks[0] if self._ticks else None
+
+    # Snapshot dictionaries from tick start (the first tick by default) up to and including tick end
+    # Seeks through the keyframe index, then decodes forward from the nearest keyframe at or before start
+    def frames(self, start: Optional[int] = None, end: Optional[int] = None) -> Iterator[dict]:
+        if not self._ticks:
+            return
+        start = self._ticks[0] if start is None else start
+        position = max(0, bisect_right(self._ticks, start) - 1)
+        offset = self._offsets[position]
+        codec = CODECS[CODEC_BINARY]
+        snapshot = None
+        while offset < self._end:
+            msgType, payload, offset = self._frameAt(offset)
+            if msgType == MSG_SNAPSHOT:
+                snapshot = codec.decodeSnapshot(payload)
+            elif msgType == MSG_DELTA and snapshot is not None:
+                snapshot = applyDelta(snapshot, codec.decodeDelta(payload))
+            else:
+                break
+            if end is not None and snapshot['sync'] > end:
+                break
+            if snapshot['sync'] >= start:
+                yield snapshot
+
+    def close(self) -> None:
+        self._view.release()
+        self._map.close()
+
+    # The frame starting at offset, returns its type, payload and the offset of the next frame
+    def _frameAt(self, offset: int):
+        if offset + HEADER.size > len(self._map):
+            raise ProtocolError("Replay is cut off at byte " + str(offset))
+        length, version, msgType = HEADER.unpack_from(self._view, offset)
+        start = offset + HEADER.size
+        if start + length > len(self._map):
+            raise ProtocolError("Replay is cut off at byte " + str(offset))
+        return msgType, self._view[start:start + length], start + length
+
+    # Walk an unfinished file's frames to find its keyframes, stopping at the first incomplete frame
+    def _scan(self) -> list:
+        entries = []
+        offset = self._firstFrame
+        while offset < len(self._map):
+            try:
+                msgType, payload, nextOffset = self._frameAt(offset)
+            except ProtocolError:
+                break
+            if msgType == MSG_SNAPSHOT:
+                entries.append((TICK.unpack_from(payload)[0], offset))
+            elif msgType == MSG_END:
+                self.result = decodeJson(bytes(payload))
+                break
+            elif msgType != MSG_DELTA:
+                break
+            offset = nextOffset
+        self._end = offset
+        return entries
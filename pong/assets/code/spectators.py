@@ -0,0 +1,206 @@
+# =================================================================================================
+# Purpose:                  Sends running games to any number of spectators from one thread
+# Misc:                     Spectators get a full snapshot per tick, so a dropped tick never breaks what follows it
+# =================================================================================================
+
+import json
+import logging
+import selectors
+import socket
+import threading
+from typing import Optional
+
+from assets.code.protocol import *
+from assets.code.metrics import MetricsRegistry
+
+log = logging.getLogger("pong.spectators")
+
+
+# Purpose:  One spectator's socket and the at most two frames held for it
+class Spectator():
+    __slots__ = ('sock', 'codec', 'gameId', 'outgoing', 'sent', 'next', 'closing', 'writing')
+
+    # Default constructor
+    def __init__(self, sock: socket.socket, codec: str, gameId: int) -> None:
+        self.sock = sock
+        self.codec = codec
+        self.gameId = gameId
+        self.outgoing = None    # Frame being written, must be finished before another can start
+        self.sent = 0           # Bytes of outgoing already written
+        self.next = None        # Newest frame waiting behind outgoing, replaced when a newer tick arrives
+        self.closing = False    # Disconnect once the last frame is written
+        self.writing = False    # Waiting for the socket to drain
+
+
+# Purpose:  To fan each tick of a game out to its spectators without the game thread ever waiting on them
+# Pre:  run() is started on its own thread, games are opened when created, game threads call publish() every
+#       tick, and every game is finished once, whether it was played or abandoned
+# Post: Each tick is encoded once per codec in use, and a spectator who can't keep up skips to the newest tick
+class SpectatorHub():
+    # Default constructor
+    def __init__(self, metrics: Optional[MetricsRegistry] = None) -> None:
+        self._selector = selectors.DefaultSelector()
+        self._games = {}    # Game id -> list of its spectators, only touched by the hub thread
+        self._codecs = {}   # Game id -> codec names its spectators use, read by the game threads
+        self._open = set()  # Ids of games that can still be watched
+        self._joining = []  # Spectators added since the hub thread last looked
+        self._frames = {}   # Game id -> ({codec name: frame}, closing) published since the hub thread last looked
+        self._lock = threading.Lock()
+        self._wakeRead, self._wakeWrite = socket.socketpair()
+        self._wakeRead.setblocking(False)
+        self._wakeWrite.setblocking(False)
+        self._woken = False
+        self._count = 0
+        self._selector.register(self._wakeRead, selectors.EVENT_READ, None)
+        self._dropped = self._sent = None
+        if metrics is not None:
+            metrics.gauge("pong_spectators", "Spectators watching a game", lambda: self._count)
+            self._sent = metrics.counter("pong_spectator_frames_sent_total", "Frames written to spectators")
+            self._dropped = metrics.counter("pong_spectator_frames_dropped_total", "Ticks skipped for spectators that fell behind")
+
+    @property # Spectator count getter
+    def count(self) -> int:
+        return self._count
+
+    # Let spectators watch a new game until it is finished
+    def open(self, gameId: int) -> None:
+        with self._lock:
+            self._open.add(gameId)
+
+    # Start sending a game to a spectator whose handshake is done, the socket is owned by the hub from here on
+    # Returns False, leaving the socket to the caller, if the game has already been finished
+    def add(self, sock: socket.socket, codec: str, gameId: int) -> bool:
+        with self._lock:
+            if gameId not in self._open:
+                return False
+            sock.setblocking(False)
+            self._joining.append(Spectator(sock, codec, gameId))
+            self._codecs.setdefault(gameId, set()).add(codec)
+            self._wake()
+            return True
+
+    # Hand the hub a game's newest tick, returns straight away
+    # Costs one dictionary lookup when nobody is watching the game
+    def publish(self, gameId: int, packed: memoryview) -> None:
+        if not self._codecs.get(gameId):
+            return
+        with self._lock:
+            codecs = tuple(self._codecs.get(gameId, ()))
+        frames = {codec: encodeFrame(MSG_SNAPSHOT, CODECS[codec].encodePackedSnapshot(packed, 0)) for codec in codecs}
+        with self._lock:
+            self._frames[gameId] = (frames, False)
+            self._wake()
+
+    # Send the game's result to its spectators and disconnect them once it's written
+    def finish(self, gameId: int, result: dict) -> None:
+        with self._lock:
+            self._open.discard(gameId)
+            if self._codecs.pop(gameId, None) is None:
+                return
+            frame = encodeFrame(MSG_END, json.dumps(result).encode())
+            self._frames[gameId] = ({codec: frame for codec in SUPPORTED_CODECS}, True)
+            self._wake()
+
+    # Write frames to spectators as their sockets allow, forever
+    def run(self) -> None:
+        while(True):
+            for key, mask in self._selector.select():
+                spectator = key.data
+                if spectator is None:
+                    self._collect()
+                    continue
+                if mask & selectors.EVENT_READ:
+                    self._onReadable(spectator)
+                if mask & selectors.EVENT_WRITE and spectator.sock.fileno() != -1:
+                    self._flush(spectator)
+
+    # Called with the lock held
+    def _wake(self) -> None:
+        if self._woken:     # One byte in the pipe is enough however many ticks arrive before the hub wakes
+            return
+        self._woken = True
+        try:
+            self._wakeWrite.send(b'\0')
+        except BlockingIOError:
+            pass
+
+    # Pick up new spectators and published frames, and start writing to anyone who was idle
+    def _collect(self) -> None:
+        try:
+            while self._wakeRead.recv(4096):
+                pass
+        except BlockingIOError:
+            pass
+        with self._lock:
+            self._woken = False
+            joining, self._joining = self._joining, []
+            published, self._frames = self._frames, {}
+
+        for spectator in joining:
+            self._selector.register(spectator.sock, selectors.EVENT_READ, spectator)
+            self._games.setdefault(spectator.gameId, []).append(spectator)
+            self._count += 1
+
+        for gameId, (frames, closing) in published.items():
+            spectators = self._games.pop(gameId, []) if closing else self._games.get(gameId, [])
+            for spectator in list(spectators):     # Flushing can remove a spectator from the list
+                if spectator.next is not None and not closing and self._dropped is not None:
+                    self._dropped.inc()
+                spectator.next = frames[spectator.codec]
+                spectator.closing = closing
+                if spectator.outgoing is None:
+                    self._flush(spectator)
+
+    # Write as much as the socket takes without blocking, then wait for it to drain if anything is left
+    def _flush(self, spectator: Spectator) -> None:
+        while(True):
+            if spectator.outgoing is None:
+                if spectator.next is None:
+                    break
+                spectator.outgoing, spectator.next, spectator.sent = memoryview(spectator.next), None, 0
+            try:
+                spectator.sent += spectator.sock.send(spectator.outgoing[spectator.sent:])
+            except BlockingIOError:
+                pass
+            except OSError:
+                self._remove(spectator)
+                return
+            if spectator.sent < len(spectator.outgoing):
+                if not spectator.writing:
+                    spectator.writing = True
+                    self._selector.modify(spectator.sock, selectors.EVENT_READ | selectors.EVENT_WRITE, spectator)
+                return
+            spectator.outgoing = None
+            if self._sent is not None:
+                self._sent.inc()
+
+        if spectator.closing:
+            self._remove(spectator)
+        elif spectator.writing:
+            spectator.writing = False
+            self._selector.modify(spectator.sock, selectors.EVENT_READ, spectator)
+
+    # Spectators have nothing to say, so anything readable is them hanging up
+    def _onReadable(self, spectator: Spectator) -> None:
+        try:
+            if spectator.sock.recv(RECV_SIZE):
+                return
+        except BlockingIOError:
+            return
+        except OSError:
+            pass
+        self._remove(spectator)
+
+    def _remove(self, spectator: Spectator) -> None:
+        if spectator.sock.fileno() == -1:
+            return
+        self._selector.unregister(spectator.sock)
+        spectator.sock.close()
+        self._count -= 1
+        spectators = self._games.get(spectator.gameId)
+        if spectators is not None and spectator in spectators:
+            spectators.remove(spectator)
+            # Stop encoding codecs nobody watching the game uses any more
+            with self._lock:
+                if spectator.gameId in self._codecs:
+                    self._codecs[spectator.gameId] = {other.codec for other in spectators + self._joining if other.gameId == spectator.gameId}
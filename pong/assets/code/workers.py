@@ -0,0 +1,107 @@
+# =================================================================================================
+# Purpose:                  Carries connections from the supervisor to worker processes and results back
+# Misc:                     Sockets are passed as file descriptors over a Unix socket, so this only runs on Linux and macOS
+# =================================================================================================
+
+import json
+import logging
+import socket
+import threading
+import time
+from multiprocessing.connection import Connection as Pipe
+from typing import List, Optional, Tuple
+
+from assets.code.leaderboardService import LeaderboardCache
+from assets.code.leaderboardStore import LeaderboardStore
+from assets.code.metrics import MetricsRegistry
+
+HANDOFF_SIZE = 65536    # Largest hand-off message, a pair's hellos are far smaller
+MAX_HANDOFF = 2         # Connections in one hand-off, a pair of players
+METRICS_INTERVAL = 1    # Seconds between a worker's metrics reports, so the supervisor's /metrics is at most this stale
+
+log = logging.getLogger("pong.workers")
+
+
+# Purpose:  To give a worker process connections whose hellos the supervisor has already read
+# Pre:  connections is a list of (socket, address, hello), at most MAX_HANDOFF of them
+# Post: The worker has its own copy of each socket, the caller should close() (never shutdown) theirs
+def handOff(channel: socket.socket, connections: List[Tuple[socket.socket, tuple, dict]]) -> None:
+    data = json.dumps([{'address': list(address), 'hello': hello} for _, address, hello in connections]).encode()
+    socket.send_fds(channel, [data], [sock.fileno() for sock, _, _ in connections])
+
+
+# Purpose:  To take the next hand-off from the supervisor
+# Post: Returns the (socket, address, hello) handed over, or None once the supervisor has gone away
+def receiveHandOff(channel: socket.socket) -> Optional[List[Tuple[socket.socket, tuple, dict]]]:
+    data, fds, _, _ = socket.recv_fds(channel, HANDOFF_SIZE, MAX_HANDOFF)
+    if not data:
+        return None
+    return [(socket.socket(fileno=fd), tuple(item['address']), item['hello']) for fd, item in zip(fds, json.loads(data))]
+
+
+# Purpose:  To stand in for the leaderboard store and cache in a worker, which only the supervisor holds
+# Pre:  The other end of pipe is being answered by serveLeaderboard
+# Post: addPlayer(), recordWin() and publish() behave as they do on a LeaderboardStore and LeaderboardCache
+class RemoteLeaderboard():
+    # Default constructor
+    def __init__(self, pipe: Pipe) -> None:
+        self._pipe = pipe
+        self._lock = threading.Lock()   # One request at a time from the game threads
+
+    # Make sure a player is on the leaderboard, without waiting for the supervisor
+    def addPlayer(self, name: str) -> None:
+        with self._lock:
+            self._pipe.send(('addPlayer', name))
+
+    # Credit a player with one win, returns their new total
+    def recordWin(self, name: str) -> int:
+        with self._lock:
+            self._pipe.send(('recordWin', name))
+            return self._pipe.recv()
+
+    # Tell the supervisor results have changed so it refreshes the leaderboard page
+    def publish(self) -> None:
+        with self._lock:
+            self._pipe.send(('publish',))
+
+    # Send the supervisor this process's metrics, to serve at /metrics along with its own
+    def reportMetrics(self, snapshot: dict) -> None:
+        with self._lock:
+            self._pipe.send(('metrics', snapshot))
+
+
+# Purpose:  To keep the supervisor's /metrics up to date with a worker's games
+# Pre:  Run on its own thread in a worker
+# Post: Returns once the supervisor has gone away
+def reportMetrics(remote: RemoteLeaderboard, metrics: MetricsRegistry, interval: float = METRICS_INTERVAL) -> None:
+    while(True):
+        time.sleep(interval)
+        try:
+            remote.reportMetrics(metrics.snapshot())
+        except (OSError, ValueError):
+            return
+
+
+# Purpose:  To apply one worker's results to the supervisor's leaderboard, and its metrics to the supervisor's
+# Pre:  Run on its own thread per worker, source names the worker in metrics
+# Post: Returns once the worker has exited, and its metrics are no longer served
+def serveLeaderboard(pipe: Pipe, store: LeaderboardStore, cache: LeaderboardCache, metrics: Optional[MetricsRegistry] = None,
+        source: Optional[int] = None) -> None:
+    while(True):
+        try:
+            request = pipe.recv()
+        except (EOFError, OSError):
+            if metrics is not None:
+                metrics.report(source, None)
+            return
+        if request[0] == 'addPlayer':
+            store.addPlayer(request[1])
+        elif request[0] == 'recordWin':
+            pipe.send(store.recordWin(request[1]))
+        elif request[0] == 'publish':
+            cache.publish()
+        elif request[0] == 'metrics':
+            if metrics is not None:
+                metrics.report(source, request[1])
+        else:
+            log.warning("Unknown worker request " + str(request[0]))
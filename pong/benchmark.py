@@ -0,0 +1,266 @@
+# =================================================================================================
+# Purpose:                  Repeatable benchmarks for the server and client hot paths
+# Misc:                     Usage: python benchmark.py [--output results.json] [--baseline baseline.json]
+# =================================================================================================
+
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable
+
+from assets.code.protocol import *
+from assets.code.physics import PongSimulation
+
+SCRIPT_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(SCRIPT_DIRECTORY, "benchmarkBaseline.json")
+SERVER_PORT = 7777
+
+# The per-frame dictionaries as clientThread and playGame have always built them
+CLIENT_FRAME = {'sync': 1234, 'paddle': [10, 215], 'ball': [320, 240], 'score': [2, 3]}
+SERVER_FRAME = {'sync': 1234, 'left': [10, 215], 'right': [620, 215], 'ball': [320, 240], 'score': [2, 3]}
+
+# The current binary protocol's messages
+INPUT_MESSAGE = {'sync': 1234, 'seq': 1300, 'moving': 1, 'flags': 0}
+SNAPSHOT_MESSAGE = {'sync': 1234, 'acked': 1290, 'left': [10, 215], 'right': [620, 215], 'ball': [320, 240], 'score': [2, 3], 'events': 0}
+
+
+# Purpose:  To time a function call, returning the best of several repeats in nanoseconds per call
+def timeIt(function: Callable, number: int, repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        best = min(best, time.perf_counter() - start)
+    return best / number * 1e9
+
+
+# Purpose:  To benchmark encoding and decoding the per-frame messages
+def benchSerialization(results: dict, scale: int) -> None:
+    encodedClient = json.dumps(CLIENT_FRAME).encode()
+    encodedServer = json.dumps(SERVER_FRAME).encode()
+    results['json_encode_client_frame'] = timeIt(lambda: json.dumps(CLIENT_FRAME).encode(), 20000 * scale)
+    results['json_decode_client_frame'] = timeIt(lambda: json.loads(encodedClient.decode()), 20000 * scale)
+    results['json_encode_server_frame'] = timeIt(lambda: json.dumps(SERVER_FRAME).encode(), 20000 * scale)
+    results['json_decode_server_frame'] = timeIt(lambda: json.loads(encodedServer.decode()), 20000 * scale)
+
+    for name, codec in CODECS.items():
+        encodedInput = codec.encodeInput(INPUT_MESSAGE)
+        encodedSnapshot = codec.encodeSnapshot(SNAPSHOT_MESSAGE)
+        results[name + '_encode_input'] = timeIt(lambda: codec.encodeInput(INPUT_MESSAGE), 20000 * scale)
+        results[name + '_decode_input'] = timeIt(lambda: codec.decodeInput(encodedInput), 20000 * scale)
+        results[name + '_encode_snapshot'] = timeIt(lambda: codec.encodeSnapshot(SNAPSHOT_MESSAGE), 20000 * scale)
+        results[name + '_decode_snapshot'] = timeIt(lambda: codec.decodeSnapshot(encodedSnapshot), 20000 * scale)
+
+    # Framing and reassembling a stream of snapshots cut at awkward places
+    frames = encodeFrame(MSG_SNAPSHOT, CODECS[CODEC_BINARY].encodeSnapshot(SNAPSHOT_MESSAGE)) * 64
+    def decodeStream() -> None:
+        decoder = StreamDecoder()
+        for start in range(0, len(frames), 50):
+            decoder.feed(frames[start:start + 50])
+        while decoder.next() is not None:
+            pass
+    results['stream_decode_64_snapshots'] = timeIt(decodeStream, 500 * scale)
+
+
+# Purpose:  To stand in for a player's channel, encoding is measured but nothing is sent
+class DiscardChannel():
+    def __init__(self, codec: str) -> None:
+        self.codec = CODECS[codec]
+
+    def send(self, msgType: int, payload: bytes) -> None:
+        pass
+
+
+# Purpose:  To benchmark building and updating the server's GameState and a whole server tick
+def benchGameState(results: dict, scale: int) -> None:
+    from pongServer import GameState, sendUpdate
+    from assets.code.linkQuality import LinkMonitor
+
+    results['gamestate_construct'] = timeIt(lambda: GameState(), 20000 * scale)
+
+    simulation = PongSimulation()
+    state = GameState()
+    def update() -> None:
+        simulation.tick += 1
+        state.update(simulation, 0)
+    results['gamestate_update'] = timeIt(update, 20000 * scale)
+
+    # One game's tick as gameThread runs it: step, store and send both players a delta
+    simulation = PongSimulation()
+    state = GameState()
+    players = [{'channel': DiscardChannel(CODEC_BINARY), 'connection': None, 'ack': 0, 'applied': 0, 'keyframe': False,
+        'lastKeyframe': 0, 'link': LinkMonitor(maxLevel=0), 'events': 0} for _ in range(2)]
+    def serverTick() -> None:
+        for player in players:
+            player['ack'] = state.sync
+        state.update(simulation, simulation.step())
+        for player in players:
+            sendUpdate(player, state, time.perf_counter())
+        if simulation.over:
+            simulation.lScore = simulation.rScore = 0
+    results['server_tick'] = timeIt(serverTick, 20000 * scale)
+
+
+# Purpose:  To benchmark stepping the ball and its collisions
+def benchPhysics(results: dict, scale: int) -> None:
+    simulation = PongSimulation()
+    def stepSimulation() -> None:
+        simulation.step()
+        if simulation.over:
+            simulation.lScore = simulation.rScore = 0
+    results['simulation_step'] = timeIt(stepSimulation, 20000 * scale)
+
+    try:
+        import pygame
+        from assets.code.helperCode import Ball
+    except ImportError:
+        pygame = None
+    if pygame is not None:
+        # Ball logic exactly as playGame runs it every frame
+        ball = Ball(pygame.Rect(320, 240, 5, 5), -5, 0)
+        leftPaddle = pygame.Rect(10, 215, 10, 50)
+        rightPaddle = pygame.Rect(620, 215, 10, 50)
+        topWall = pygame.Rect(-10, 0, 660, 10)
+        bottomWall = pygame.Rect(-10, 470, 660, 10)
+        def stepBall() -> None:
+            ball.updatePos()
+            if ball.rect.x > 640:
+                ball.reset(nowGoing="left")
+            elif ball.rect.x < 0:
+                ball.reset(nowGoing="right")
+            if ball.rect.colliderect(leftPaddle):
+                ball.hitPaddle(leftPaddle.center[1])
+            elif ball.rect.colliderect(rightPaddle):
+                ball.hitPaddle(rightPaddle.center[1])
+            if ball.rect.colliderect(topWall) or ball.rect.colliderect(bottomWall):
+                ball.hitWall()
+        results['ball_update_and_collide'] = timeIt(stepBall, 20000 * scale)
+
+    try:
+        from assets.code.batchPhysics import BatchSimulation
+    except ImportError:
+        return
+    batch = BatchSimulation(10000)
+    def stepBatch() -> None:
+        batch.step()
+        if batch.over.any():
+            batch.reset(batch.over)
+    results['batch_step_10000_games'] = timeIt(stepBatch, 20 * scale)
+
+
+# Purpose:  To start pongServer.py in a scratch directory so benchmark games never touch the real leaderboard
+def startServer() -> tuple:
+    workDirectory = tempfile.mkdtemp(prefix="pongbench")
+    with open(os.path.join(workDirectory, "leaderboard.json"), "w") as leaderboardFile:
+        leaderboardFile.write("[{}]")
+    server = subprocess.Popen([sys.executable, os.path.join(SCRIPT_DIRECTORY, "pongServer.py")], cwd=workDirectory,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    deadline = time.perf_counter() + 10
+    while time.perf_counter() < deadline:
+        try:
+            socket.create_connection(("localhost", SERVER_PORT), timeout=1).close()
+            return server, workDirectory
+        except OSError:
+            time.sleep(0.1)
+    server.kill()
+    raise RuntimeError("pongServer.py did not start listening on port " + str(SERVER_PORT))
+
+
+# Purpose:  To benchmark full client-server round trips over loopback at several numbers of concurrent games
+def benchRoundTrips(results: dict, gameCounts: list, duration: float, external: bool) -> None:
+    from loadClient import runLoad, summarize
+
+    for games in gameCounts:
+        server = workDirectory = None
+        if not external:
+            server, workDirectory = startServer()
+        serverCpu = resource.getrusage(resource.RUSAGE_CHILDREN)
+        serverCpu = serverCpu.ru_utime + serverCpu.ru_stime
+        try:
+            bots = runLoad("localhost", SERVER_PORT, 2 * games, duration, 60, [CODEC_BINARY], "track", 1000)
+            report = summarize(bots)
+        finally:
+            if server is not None:
+                server.kill()
+                server.wait()
+                shutil.rmtree(workDirectory, ignore_errors=True)
+        if server is not None:  # CPU the server burned per game per second of play
+            usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+            results['server_cpu_ms_per_game_second_' + str(games) + '_games'] = (usage.ru_utime + usage.ru_stime - serverCpu) * 1000 / (games * duration)
+        results['roundtrip_p50_ms_' + str(games) + '_games'] = report['rtt_ms']['p50']
+        results['roundtrip_p99_ms_' + str(games) + '_games'] = report['rtt_ms']['p99']
+        results['snapshots_per_second_min_' + str(games) + '_games'] = report['snapshots_per_second']['min']
+
+
+# Purpose:  To compare results with a stored baseline, returning the names of the results that regressed
+# Everything is a time where lower is better, except rates, where higher is better
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    regressions = []
+    for name, value in sorted(results.items()):
+        if name not in baseline or not baseline[name]:
+            continue
+        change = (value - baseline[name]) / baseline[name]
+        if name.startswith("snapshots_per_second"):
+            change = -change
+        flag = "REGRESSED" if change > tolerance else ""
+        if flag:
+            regressions.append(name)
+        print(f"{name:45} {baseline[name]:12.1f} -> {value:12.1f} {change*100:+7.1f}% {flag}")
+    return regressions
+
+
+# Purpose:  To run the benchmark suite from the command line
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the pong hot paths")
+    parser.add_argument("--output", help="Write results to this JSON file")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline JSON to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="Store these results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Slowdown beyond which a result counts as regressed")
+    parser.add_argument("--scale", type=int, default=1, help="Multiply the micro-benchmark iteration counts")
+    parser.add_argument("--games", default="1,10,100", help="Concurrent game counts for the round-trip benchmark")
+    parser.add_argument("--duration", type=float, default=5.0, help="Seconds each round-trip run lasts")
+    parser.add_argument("--skip-network", action="store_true", help="Only run the in-process micro-benchmarks")
+    parser.add_argument("--external-server", action="store_true", help="Use an already running server on localhost")
+    args = parser.parse_args()
+
+    results = {}
+    benchSerialization(results, args.scale)
+    benchGameState(results, args.scale)
+    benchPhysics(results, args.scale)
+    if not args.skip_network:
+        benchRoundTrips(results, [int(games) for games in args.games.split(",")], args.duration, args.external_server)
+
+    output = {'meta': {'python': platform.python_version(), 'platform': platform.platform(), 'time': time.time(),
+            'units': 'ns per call, except roundtrip_* and server_cpu_* in ms and snapshots_per_second_*'},
+        'results': results}
+
+    for name, value in sorted(results.items()):
+        print(f"{name:45} {value:12.1f}")
+
+    if args.output:
+        with open(args.output, "w") as outputFile:
+            json.dump(output, outputFile, indent=2)
+
+    regressions = []
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as baselineFile:
+            print("\nCompared with " + args.baseline + ":")
+            regressions = compare(results, json.load(baselineFile)['results'], args.tolerance)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as baselineFile:
+            json.dump(output, baselineFile, indent=2)
+
+    if regressions:
+        print("\n" + str(len(regressions)) + " benchmark(s) regressed past " + str(int(args.tolerance * 100)) + "%")
+        sys.exit(1)
@@ -0,0 +1,258 @@
+# =================================================================================================
+# Purpose:                  Conformance checks that PongSimulation plays exactly like the Ball and Paddle logic
+#                           playGame has always run, that BatchSimulation plays exactly like PongSimulation, and
+#                           that PongSimulation.advance(n) ends exactly where n calls to step() do
+# Misc:                     Usage: python checkPhysics.py [--games 200] [--ticks 5000] [--seed 1]
+#                           Exits with status 1 at the first tick where any pair disagrees. The first check
+#                           needs pygame for its Rects, but never opens a window
+# =================================================================================================
+
+import argparse
+import copy
+import os
+import random
+import sys
+
+from assets.code.physics import *
+from assets.code.batchPhysics import BatchSimulation
+
+try:
+    os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+    import pygame
+    from assets.code.helperCode import Ball, Paddle
+except ImportError:
+    pygame = None
+
+MOVES = (MOVE_UP, MOVE_NONE, MOVE_DOWN)
+MOVING = {MOVE_UP: "up", MOVE_NONE: "", MOVE_DOWN: "down"}  # How playGame's paddles spell each input
+INPUT_CHANGE_CHANCE = 0.1   # Chance each tick that a scripted player changes what they're pressing
+MAX_CHUNK = 8               # Most ticks advance() is asked to run at once
+
+
+# Purpose:  To stop the check with a description of the first difference
+def assertSame(what: str, expected, actual) -> None:
+    if expected != actual:
+        raise AssertionError(what + ": expected " + str(expected) + ", got " + str(actual))
+
+
+# Purpose:  To describe one scalar game the way the batch stores it, for comparing the two
+def scalarState(simulation: PongSimulation) -> tuple:
+    return (simulation.ball.x, simulation.ball.y, simulation.xVel, simulation.yVel, simulation.leftPaddle.y,
+        simulation.rightPaddle.y, simulation.lScore, simulation.rScore, simulation.tick)
+
+
+# Purpose:  To describe game i of a batch in the same order as scalarState()
+def batchState(batch: BatchSimulation, i: int) -> tuple:
+    return tuple(int(array[i]) for array in (batch.ballX, batch.ballY, batch.xVel, batch.yVel, batch.leftY,
+        batch.rightY, batch.lScore, batch.rScore, batch.tick))
+
+
+# Purpose:  To start a game somewhere random but legal, instead of from the opening serve
+def scatter(rng: random.Random, simulation: PongSimulation) -> None:
+    height = simulation.screenHeight
+    simulation.ball.x = int(simulation.ball.x) + rng.randint(-200, 200)
+    simulation.ball.y = rng.randint(WALL_HEIGHT, height - WALL_HEIGHT - simulation.ball.height)
+    simulation.xVel = rng.choice((-1, 1)) * rng.randint(1, MAX_XVEL)
+    simulation.yVel = rng.randint(-6, 6)
+    simulation.leftPaddle.y = rng.randint(WALL_HEIGHT, height - WALL_HEIGHT - PADDLE_HEIGHT)
+    simulation.rightPaddle.y = rng.randint(WALL_HEIGHT, height - WALL_HEIGHT - PADDLE_HEIGHT)
+
+
+# Purpose:  To play a game with the pygame Ball and Paddle objects, tick by tick as playGame did before the
+#   server took the simulation over, as the reference PongSimulation has to match
+class OriginalGame():
+    # Default constructor, laid out exactly as playGame sets up its window
+    def __init__(self, screenWidth: int = 640, screenHeight: int = 480) -> None:
+        self.screenWidth = screenWidth
+        self.screenHeight = screenHeight
+        self.topWall = pygame.Rect(-10, 0, screenWidth+20, 10)
+        self.bottomWall = pygame.Rect(-10, screenHeight-10, screenWidth+20, 10)
+        paddleStartPosY = (screenHeight/2)-(50/2)
+        self.leftPaddle = Paddle(pygame.Rect(10, paddleStartPosY, 10, 50))
+        self.rightPaddle = Paddle(pygame.Rect(screenWidth-20, paddleStartPosY, 10, 50))
+        self.ball = Ball(pygame.Rect(screenWidth/2, screenHeight/2, 5, 5), -5, 0)
+        self.lScore = 0
+        self.rScore = 0
+        self.tick = 0
+
+    # One frame of playGame with both paddles under local control, returns the EVENT_* bits for the sounds played
+    def step(self) -> int:
+        self.tick += 1
+        for paddle in (self.leftPaddle, self.rightPaddle):
+            if paddle.moving == "down":
+                if paddle.rect.bottomleft[1] < self.screenHeight-10:
+                    paddle.rect.y += paddle.speed
+            elif paddle.moving == "up":
+                if paddle.rect.topleft[1] > 10:
+                    paddle.rect.y -= paddle.speed
+
+        if self.lScore > 4 or self.rScore > 4:
+            return 0
+
+        events = 0
+        ball = self.ball
+        ball.updatePos()
+        if ball.rect.x > self.screenWidth:
+            self.lScore += 1
+            events |= EVENT_POINT   # pointSound
+            ball.reset(nowGoing="left")
+        elif ball.rect.x < 0:
+            self.rScore += 1
+            events |= EVENT_POINT
+            ball.reset(nowGoing="right")
+
+        if ball.rect.colliderect(self.leftPaddle.rect):
+            events |= EVENT_BOUNCE  # bounceSound
+            ball.hitPaddle(self.leftPaddle.rect.center[1])
+        elif ball.rect.colliderect(self.rightPaddle.rect):
+            events |= EVENT_BOUNCE
+            ball.hitPaddle(self.rightPaddle.rect.center[1])
+
+        if ball.rect.colliderect(self.topWall) or ball.rect.colliderect(self.bottomWall):
+            events |= EVENT_BOUNCE
+            ball.hitWall()
+        return events
+
+    # Described in the same order as scalarState()
+    def state(self) -> tuple:
+        return (self.ball.rect.x, self.ball.rect.y, self.ball.xVel, self.ball.yVel, self.leftPaddle.rect.y,
+            self.rightPaddle.rect.y, self.lScore, self.rScore, self.tick)
+
+
+# Purpose:  To play the same seeded games with playGame's original objects and with PongSimulation
+# Pre:  pygame is installed, no display is needed
+# Post: Raises AssertionError at the first tick where any game's state or events differ, returns the ticks compared
+def checkOriginal(games: int, ticks: int, seed: int) -> int:
+    rng = random.Random(seed)
+    compared = 0
+    for game in range(games):
+        original = OriginalGame()
+        simulation = PongSimulation()   # Unseeded, so every serve is flat like Ball.reset()'s
+        if game % 2:
+            scatter(rng, simulation)
+            original.ball.rect.topleft = (simulation.ball.x, simulation.ball.y)
+            original.ball.xVel, original.ball.yVel = simulation.xVel, simulation.yVel
+            original.leftPaddle.rect.y, original.rightPaddle.rect.y = simulation.leftPaddle.y, simulation.rightPaddle.y
+        assertSame("Game " + str(game) + " start", original.state(), scalarState(simulation))
+
+        left = right = MOVE_NONE
+        for tick in range(1, ticks + 1):
+            if rng.random() < INPUT_CHANGE_CHANCE:
+                left = rng.choice(MOVES)
+            if rng.random() < INPUT_CHANGE_CHANCE:
+                right = rng.choice(MOVES)
+            simulation.setInput("left", left)
+            simulation.setInput("right", right)
+            original.leftPaddle.moving, original.rightPaddle.moving = MOVING[left], MOVING[right]
+
+            events = simulation.step()
+            originalEvents = original.step()
+            assertSame("Game " + str(game) + " tick " + str(tick) + " state", original.state(), scalarState(simulation))
+            assertSame("Game " + str(game) + " tick " + str(tick) + " events", originalEvents, events)
+            compared += 1
+            if simulation.over:
+                break
+    return compared
+
+
+# Purpose:  To play the same seeded games in a BatchSimulation and in one PongSimulation each
+# Post: Raises AssertionError at the first tick where any game's state or events differ, returns the ticks compared
+def checkBatch(games: int, ticks: int, seed: int) -> int:
+    rng = random.Random(seed)
+    serveDelay = rng.randint(0, 60)
+    batch = BatchSimulation(games, serveDelay=serveDelay)
+    simulations = [PongSimulation(serveDelay=serveDelay) for _ in range(games)]
+    for i, simulation in enumerate(simulations):
+        if i % 2:   # Half start from the opening serve, half from anywhere
+            scatter(rng, simulation)
+            (batch.ballX[i], batch.ballY[i], batch.xVel[i], batch.yVel[i], batch.leftY[i], batch.rightY[i],
+                batch.lScore[i], batch.rScore[i], batch.tick[i]) = scalarState(simulation)
+
+    left = [MOVE_NONE] * games
+    right = [MOVE_NONE] * games
+    compared = 0
+    for tick in range(1, ticks + 1):
+        for i in range(games):
+            if rng.random() < INPUT_CHANGE_CHANCE:
+                left[i] = rng.choice(MOVES)
+            if rng.random() < INPUT_CHANGE_CHANCE:
+                right[i] = rng.choice(MOVES)
+            simulations[i].setInput("left", left[i])
+            simulations[i].setInput("right", right[i])
+        batch.setInputs(left, right)
+
+        batchEvents = batch.step()
+        for i, simulation in enumerate(simulations):
+            events = simulation.step()
+            assertSame("Game " + str(i) + " tick " + str(tick) + " state", scalarState(simulation), batchState(batch, i))
+            assertSame("Game " + str(i) + " tick " + str(tick) + " events", events, int(batchEvents[i]))
+            compared += 1
+        if all(simulation.over for simulation in simulations):
+            break
+    return compared
+
+
+# Purpose:  To check that advance(n) ends every seeded game exactly where n calls to step() do
+# Post: Raises AssertionError at the first chunk where the state or the events differ, returns the ticks compared
+def checkAdvance(games: int, ticks: int, seed: int) -> int:
+    rng = random.Random(seed)
+    compared = 0
+    for game in range(games):
+        advanced = PongSimulation(serveDelay=rng.choice((0, rng.randint(1, 60))), seed=rng.randrange(2**32))
+        if game % 2:
+            scatter(rng, advanced)
+        stepped = copy.deepcopy(advanced)   # Including where its serves are drawn from
+        left = right = MOVE_NONE
+        tick = 0
+        while tick < ticks and not advanced.over:
+            if rng.random() < INPUT_CHANGE_CHANCE * MAX_CHUNK:
+                left = rng.choice(MOVES)
+            if rng.random() < INPUT_CHANGE_CHANCE * MAX_CHUNK:
+                right = rng.choice(MOVES)
+            for simulation in (advanced, stepped):
+                simulation.setInput("left", left)
+                simulation.setInput("right", right)
+
+            chunk = rng.randint(1, MAX_CHUNK)
+            events = advanced.advance(chunk)
+            steppedEvents = 0
+            for _ in range(chunk):
+                steppedEvents |= stepped.step()
+            tick += chunk
+            assertSame("Game " + str(game) + " ticks to " + str(tick) + " state", scalarState(stepped), scalarState(advanced))
+            assertSame("Game " + str(game) + " ticks to " + str(tick) + " events", steppedEvents, events)
+            compared += chunk
+    return compared
+
+
+# Purpose:  To run the checks from the command line
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check that the simulations play exactly like the original game and each other")
+    parser.add_argument("--games", type=int, default=200, help="Games to play side by side")
+    parser.add_argument("--ticks", type=int, default=5000, help="Most ticks to play each game for")
+    parser.add_argument("--seed", type=int, default=1, help="Seed for the starting states and inputs")
+    args = parser.parse_args()
+
+    if pygame is None:
+        print("Skipping the check against playGame's Ball and Paddle, pygame isn't installed")
+    else:
+        try:
+            compared = checkOriginal(args.games, args.ticks, args.seed)
+        except AssertionError as error:
+            print("PongSimulation differs from playGame's Ball and Paddle: " + str(error))
+            sys.exit(1)
+        print(f"PongSimulation matches playGame's Ball and Paddle: {compared} game ticks over {args.games} games, seed {args.seed}")
+
+    try:
+        compared = checkBatch(args.games, args.ticks, args.seed)
+    except AssertionError as error:
+        print("BatchSimulation differs from PongSimulation: " + str(error))
+        sys.exit(1)
+    print(f"BatchSimulation matches PongSimulation: {compared} game ticks over {args.games} games, seed {args.seed}")
+
+    try:
+        compared = checkAdvance(args.games, args.ticks, args.seed)
+    except AssertionError as error:
+        print("advance(n) differs from n calls to step(): " + str(error))
+        sys.exit(1)
+    print(f"advance(n) matches n calls to step(): {compared} game ticks over {args.games} games, seed {args.seed}")
@@ -0,0 +1,379 @@
+# =================================================================================================
+# Purpose:                  Headless load generator that plays many scripted clients against pongServer.py
+# Misc:                     Usage: python loadClient.py --players 200 --duration 30
+# =================================================================================================
+
+import argparse
+import hashlib
+import json
+import random
+import selectors
+import socket
+import time
+from typing import Optional
+
+from assets.code.protocol import *
+from assets.code.physics import MOVE_UP, MOVE_NONE, MOVE_DOWN, PADDLE_HEIGHT
+from assets.code.netcode import TimingStats
+
+
+# Purpose:  One scripted player, speaking the same handshake and per-frame protocol as pongClient.py
+class Bot():
+    # Default constructor
+    # policy    "track" follows the ball, "random" mashes keys, "idle" never moves
+    # watch     Id of a game to spectate instead of playing
+    # seed      Seeds the random policy together with the bot's name, None mashes keys differently every run
+    def __init__(self, name: str, codecs: list, policy: str, watch: Optional[int] = None, seed: Optional[int] = None) -> None:
+        self.name = name
+        self.codecs = codecs
+        self.policy = policy
+        self.watch = watch
+        self.random = random.Random(str(seed) + name) if seed is not None else random.Random()
+        self.sock = None
+        self.udpSock = None
+        self.udpChannel = None
+        self.decoder = StreamDecoder()
+        self.outgoing = bytearray()
+        self.codec = CODECS[CODEC_JSON]
+        self.side = None
+        self.tickRate = 60
+        self.lockstep = False   # The server waits for an input on every tick, sent the moment its snapshot arrives
+        self.digest = hashlib.sha256()  # Every snapshot seen, the same for every run of a deterministic match
+        self.history = SnapshotHistory()
+        self.latest = None
+        self.result = None
+        self.closed = False
+
+        self.inputSeq = 0
+        self.sentAt = {}    # Input sequence -> time sent, until a snapshot acknowledges it
+        self.rtt = TimingStats(100000)
+        self.firstSnapshot = None   # (local time, tick) of the first snapshot, for sync drift
+        self.drift = TimingStats(100000)
+        self.startedAt = None
+        self.lastActive = None
+        self.framesSent = 0
+        self.snapshotsReceived = 0
+        self.keyframesRequested = 0
+        self.garbled = 0
+        self.udpSequence = 0
+        self.udpLost = 0
+
+    # Start a non-blocking connect and queue the hello
+    def connect(self, address: tuple, selector: selectors.BaseSelector) -> None:
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.sock.setblocking(False)
+        self.sock.connect_ex(address)
+        self.address = address
+        hello = {'name': self.name, 'codecs': self.codecs}
+        if self.watch is not None:
+            hello['spectate'] = self.watch
+        self.queue(MSG_HELLO, json.dumps(hello).encode())
+        selector.register(self.sock, selectors.EVENT_READ | selectors.EVENT_WRITE, self)
+        self.selector = selector
+
+    # Frame a message into the TCP send buffer
+    def queue(self, msgType: int, payload: bytes) -> None:
+        self.outgoing += encodeFrame(msgType, payload)
+
+    def flush(self) -> None:
+        if not self.outgoing or self.closed:
+            return
+        try:
+            sent = self.sock.send(self.outgoing)
+        except BlockingIOError:
+            return
+        except OSError:
+            self.close()
+            return
+        del self.outgoing[:sent]
+
+    def wantsWrite(self) -> bool:
+        return bool(self.outgoing)
+
+    # Read whatever the TCP socket has and handle every whole message in it
+    def onReadable(self, now: float) -> None:
+        try:
+            received = self.sock.recv(RECV_SIZE)
+        except BlockingIOError:
+            return
+        except OSError:
+            self.close()
+            return
+        if not received:
+            self.close()
+            return
+        try:
+            self.decoder.feed(received)
+        except ProtocolError:
+            self.garbled += 1
+            self.close()
+            return
+        message = self.decoder.next()
+        while message is not None:
+            self.handle(message[0], message[1], now)
+            message = self.decoder.next()
+
+    # Read every waiting datagram
+    def onDatagram(self, now: float) -> None:
+        while True:
+            try:
+                datagram = self.udpSock.recv(MAX_DATAGRAM)
+            except (BlockingIOError, OSError):
+                return
+            parsed = parseDatagram(datagram)
+            if parsed is None or parsed[0] != self.udpChannel.token:
+                self.garbled += 1
+                continue
+            if parsed[1] <= self.udpSequence:
+                continue    # Stale or duplicated
+            self.udpLost += parsed[1] - self.udpSequence - 1
+            self.udpSequence = parsed[1]
+            self.handle(parsed[2], parsed[3], now)
+
+    def handle(self, msgType: int, payload: bytes, now: float) -> None:
+        try:
+            if msgType == MSG_WELCOME:
+                self.welcome(decodeJson(payload), now)
+            elif msgType == MSG_END:
+                self.result = decodeJson(payload)
+            elif msgType == MSG_SNAPSHOT:
+                self.apply(self.codec.decodeSnapshot(payload), now)
+            elif msgType == MSG_DELTA:
+                delta = self.codec.decodeDelta(payload)
+                base = self.history.get(delta['base'])
+                if base is None:
+                    self.keyframesRequested += 1
+                else:
+                    self.apply(applyDelta(base, delta), now)
+            else:
+                self.garbled += 1
+        except (ProtocolError, KeyError, TypeError):
+            self.garbled += 1
+
+    def welcome(self, data: dict, now: float) -> None:
+        self.side = data['side']
+        self.codec = CODECS[data.get('codec', CODEC_JSON)]
+        self.tickRate = data.get('tickRate', 60)
+        self.lockstep = data.get('lockstep', False)
+        self.startedAt = now
+        if data.get('transport') == TRANSPORT_UDP:
+            self.udpSock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.udpSock.setblocking(False)
+            self.udpChannel = DatagramChannel(self.udpSock, data['token'], peer=(self.address[0], data['udpPort']), codec=self.codec.name)
+            self.selector.register(self.udpSock, selectors.EVENT_READ, self)
+
+    def apply(self, snapshot: dict, now: float) -> None:
+        if self.latest is not None and snapshot['sync'] <= self.latest['sync']:
+            return
+        self.history.record(snapshot)
+        self.latest = snapshot
+        self.snapshotsReceived += 1
+        self.lastActive = now
+        self.digest.update(json.dumps([snapshot['sync'], snapshot['left'], snapshot['right'], snapshot['ball'],
+            snapshot['score'], snapshot['events']]).encode())
+
+        # How far the snapshot stream has fallen behind the server's tick clock since the first one
+        if self.firstSnapshot is None:
+            self.firstSnapshot = (now, snapshot['sync'])
+        else:
+            expected = self.firstSnapshot[1] + (now - self.firstSnapshot[0]) * self.tickRate
+            self.drift.add(expected - snapshot['sync'])
+
+        sentAt = self.sentAt.pop(snapshot.get('acked', 0), None)
+        if sentAt is not None:
+            self.rtt.add(now - sentAt)
+            for sequence in [sequence for sequence in self.sentAt if sequence < snapshot['acked']]:
+                del self.sentAt[sequence]
+        if self.lockstep:
+            self.send(now)
+
+    # Pick this frame's paddle movement
+    def decide(self) -> int:
+        if self.policy == "idle" or self.latest is None:
+            return MOVE_NONE
+        if self.policy == "random":
+            return self.random.choice((MOVE_UP, MOVE_NONE, MOVE_DOWN))
+        paddleCenter = self.latest[self.side][1] + PADDLE_HEIGHT / 2
+        ballY = self.latest['ball'][1]
+        if ballY < paddleCenter - 10:
+            return MOVE_UP
+        if ballY > paddleCenter + 10:
+            return MOVE_DOWN
+        return MOVE_NONE
+
+    # Send one frame of input, the same message playGame sends every frame, unless inputs answer snapshots instead
+    def frame(self, now: float) -> None:
+        if not self.lockstep:
+            self.send(now)
+
+    def send(self, now: float) -> None:
+        if self.side in (None, 'spectator') or self.closed or self.result is not None:
+            return
+        self.inputSeq += 1
+        data = {'sync': self.latest['sync'] if self.latest is not None else 0,
+            'seq': self.inputSeq,
+            'moving': self.decide(),
+            'flags': INPUT_KEYFRAME if self.keyframesRequested and self.latest is None else 0}
+        self.sentAt[self.inputSeq] = now
+        self.framesSent += 1
+        self.lastActive = now
+        if self.udpChannel is not None:
+            try:
+                self.udpChannel.sendInput(data)
+            except OSError:
+                pass
+        else:
+            self.queue(MSG_INPUT, self.codec.encodeInput(data))
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        self.closed = True
+        for sock in (self.sock, self.udpSock):
+            if sock is None:
+                continue
+            try:
+                self.selector.unregister(sock)
+            except (KeyError, ValueError):
+                pass
+            sock.close()
+
+
+# Purpose:  To drive every bot from one selector loop, sending input at a fixed frame rate
+# Post: Returns the bots once the duration has passed or every bot has finished
+# spectators   Extra connections that watch game watch once the players are connected
+# seed         Seeds the random policy, against a deterministic server the whole run then plays the same every time
+def runLoad(host: str, port: int, players: int, duration: float, fps: float, codecs: list, policy: str, rampRate: float,
+        spectators: int = 0, watch: int = 0, seed: Optional[int] = None) -> list:
+    selector = selectors.DefaultSelector()
+    bots = [Bot("bot" + str(i), codecs, policy, seed=seed) for i in range(players)]
+    bots += [Bot("spectator" + str(i), codecs, policy, watch) for i in range(spectators)]
+    players = len(bots)
+    start = time.perf_counter()
+    nextFrame = start
+    connected = 0
+
+    while True:
+        now = time.perf_counter()
+        if now - start >= duration or (connected == players and all(bot.closed or bot.result is not None for bot in bots)):
+            break
+
+        # Ramp connections up so the server's accept backlog isn't flooded
+        while connected < players and connected < (now - start) * rampRate + 1:
+            bots[connected].connect((host, port), selector)
+            connected += 1
+
+        if now >= nextFrame:
+            for bot in bots[:connected]:
+                bot.frame(now)
+            nextFrame += 1 / fps
+            if nextFrame < now:
+                nextFrame = now + 1 / fps
+
+        # Only ask to write when there is something to write, so idle sockets cost nothing
+        for bot in bots[:connected]:
+            if not bot.closed:
+                bot.flush()
+                selector.modify(bot.sock, selectors.EVENT_READ | (selectors.EVENT_WRITE if bot.wantsWrite() else 0), bot)
+
+        for key, mask in selector.select(timeout=max(0.0, nextFrame - time.perf_counter())):
+            bot = key.data
+            if mask & selectors.EVENT_READ:
+                if key.fileobj is bot.udpSock:
+                    bot.onDatagram(time.perf_counter())
+                else:
+                    bot.onReadable(time.perf_counter())
+            if mask & selectors.EVENT_WRITE:
+                bot.flush()
+
+    for bot in bots:
+        bot.close()
+    selector.close()
+    return bots
+
+
+# Purpose:  To roll every bot's measurements up into one report
+def summarize(bots: list) -> dict:
+    spectators = [bot for bot in bots if bot.watch is not None]
+    bots = [bot for bot in bots if bot.watch is None]
+    rtt = TimingStats(10**7)
+    drift = TimingStats(10**7)
+    snapshotRates = []
+    frameRates = []
+    for bot in bots:
+        rtt.merge(bot.rtt)
+        drift.merge(bot.drift)
+        if bot.startedAt is not None and bot.lastActive is not None and bot.lastActive > bot.startedAt:
+            snapshotRates.append(bot.snapshotsReceived / (bot.lastActive - bot.startedAt))
+            frameRates.append(bot.framesSent / (bot.lastActive - bot.startedAt))
+
+    rttSummary = rtt.summary()
+    driftSummary = drift.summary()
+    return {'players': len(bots),
+        'playing': sum(bot.startedAt is not None for bot in bots),
+        'finished': sum(bot.result is not None for bot in bots),
+        'rtt_ms': {key: value * 1000 for key, value in rttSummary.items()},
+        'rtt_samples': rtt.count,
+        'snapshots_per_second': {'mean': sum(snapshotRates) / len(snapshotRates) if snapshotRates else 0.0,
+            'min': min(snapshotRates, default=0.0)},
+        'inputs_per_second': {'mean': sum(frameRates) / len(frameRates) if frameRates else 0.0},
+        'sync_drift_ticks': driftSummary,
+        'garbled': sum(bot.garbled for bot in bots),
+        'keyframes_requested': sum(bot.keyframesRequested for bot in bots),
+        'udp_lost': sum(bot.udpLost for bot in bots),
+        'lockstep': sum(bot.lockstep for bot in bots),
+        'digests': sorted({bot.digest.hexdigest() for bot in bots if bot.lockstep}),
+        'spectators': summarizeSpectators(spectators)}
+
+
+# Purpose:  To report how well the spectators kept up with the game they watched
+def summarizeSpectators(spectators: list) -> dict:
+    drift = TimingStats(10**7)
+    snapshotRates = []
+    for bot in spectators:
+        drift.merge(bot.drift)
+        if bot.startedAt is not None and bot.lastActive is not None and bot.lastActive > bot.startedAt:
+            snapshotRates.append(bot.snapshotsReceived / (bot.lastActive - bot.startedAt))
+    return {'spectators': len(spectators),
+        'watching': sum(bot.side == 'spectator' for bot in spectators),
+        'snapshots_per_second': {'mean': sum(snapshotRates) / len(snapshotRates) if snapshotRates else 0.0,
+            'min': min(snapshotRates, default=0.0)},
+        'sync_drift_ticks': drift.summary()}
+
+
+# Purpose:  To start the load generator from the command line
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Play many headless clients against a pong server")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=7777)
+    parser.add_argument("--players", type=int, default=100, help="Scripted players, paired into games by the server")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds to run for")
+    parser.add_argument("--fps", type=float, default=60.0, help="Inputs each player sends per second")
+    parser.add_argument("--codec", choices=SUPPORTED_CODECS, help="Only offer this codec (default offers all)")
+    parser.add_argument("--policy", choices=("track", "random", "idle"), default="track")
+    parser.add_argument("--ramp", type=float, default=200.0, help="New connections per second")
+    parser.add_argument("--spectators", type=int, default=0, help="Connections that watch a game instead of playing")
+    parser.add_argument("--watch", type=int, default=0, help="Id of the game the spectators watch")
+    parser.add_argument("--seed", type=int, help="Seed for the random policy, so a deterministic server plays the same matches every run")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    codecs = [args.codec] if args.codec else list(SUPPORTED_CODECS)
+    bots = runLoad(args.host, args.port, args.players, args.duration, args.fps, codecs, args.policy, args.ramp, args.spectators, args.watch, args.seed)
+    report = summarize(bots)
+
+    if args.json:
+        print(json.dumps(report))
+    else:
+        print(f"{report['playing']}/{report['players']} players got a game, {report['finished']} saw it finish")
+        print(f"RTT ms: p50 {report['rtt_ms']['p50']:.1f}, p99 {report['rtt_ms']['p99']:.1f}, mean {report['rtt_ms']['mean']:.1f} ({report['rtt_samples']} samples)")
+        print(f"Snapshots/s per connection: mean {report['snapshots_per_second']['mean']:.1f}, min {report['snapshots_per_second']['min']:.1f}")
+        print(f"Inputs/s per connection: mean {report['inputs_per_second']['mean']:.1f}")
+        print(f"Sync drift ticks: mean {report['sync_drift_ticks']['mean']:.2f}, p99 {report['sync_drift_ticks']['p99']:.2f}")
+        print(f"Garbled messages {report['garbled']}, keyframes requested {report['keyframes_requested']}, UDP datagrams lost {report['udp_lost']}")
+        if report['lockstep']:
+            print(f"{report['lockstep']} players in deterministic games, snapshot digests: " + ", ".join(digest[:16] for digest in report['digests']))
+        if args.spectators:
+            watching = report['spectators']
+            print(f"{watching['watching']}/{watching['spectators']} spectators watched, snapshots/s mean {watching['snapshots_per_second']['mean']:.1f}, min {watching['snapshots_per_second']['min']:.1f}, drift p99 {watching['sync_drift_ticks']['p99']:.2f}")
@@ -10,38 +10,70 @@ import pygame
 import tkinter as tk
 import sys
 import socket
-import json # For packing and sending
 import os # For file management
 import time # For sleep
+from typing import Optional, Tuple # For type hinting
 
 from assets.code.helperCode import *
+from assets.code.protocol import * # For framing, packing and sending
+from assets.code.physics import MOVE_UP, MOVE_NONE, MOVE_DOWN, EVENT_BOUNCE, EVENT_POINT
+from assets.code.netcode import PaddlePredictor, NetworkClient, TimingStats
+from assets.code.logs import setupLogging # For leveled, rate-limited logging
+from assets.code.renderer import Renderer, HeadlessRenderer # For drawing only what changed
+from assets.code.preload import AssetCache # For loading pygame, fonts and sounds while matchmaking
+from assets.code.clock import RealClock, VirtualClock # For running deterministic games faster than real time
+import threading # For matchmaking without freezing the start screen
+import logging
+
+log = logging.getLogger("pong.client")
+
+# Paddle input sent to the server for each value of Paddle.moving
+MOVES = {"up": MOVE_UP, "": MOVE_NONE, "down": MOVE_DOWN}
+
+UDP_TIMEOUT = 1/60  # Longest a frame waits for a snapshot datagram before drawing without one
+INTERPOLATION_DELAY = 0.1   # Seconds in the past the ball and opponent are drawn, hides network jitter
+HEADLESS = os.environ.get("PONG_HEADLESS", "") == "1"   # Play without a window, sound or drawing, for soak tests and bots
+CONNECT_TIMEOUT = 5     # Seconds to wait for the server to accept the connection
+POLL_INTERVAL = 20      # Milliseconds between the start screen's checks on matchmaking
+RECONNECT_TIMEOUT = 10  # Seconds to keep trying to get back into a game after the connection drops
+RECONNECT_INTERVAL = 0.1    # Seconds between reconnect attempts
+WIN_MESSAGE_TIME = 5    # Seconds the win message is shown for
+LOCKSTEP_TIMEOUT = 1/60 # Longest a frame of a deterministic game waits for the server's next tick
+
+assetCache = AssetCache()   # Shared by every game this process plays
 
 # This is the main game loop.  For the most part, you will not need to modify this.  The sections
 # where you should add to the code are marked.  Feel free to change any part of this project
 # to suit your needs.
 # Player1 is the left player, if it false then the player is assumed to be the right.
 # Modified by Ty Gordon, Caleb Fields, Abdallah Sher
-def playGame(screenWidth:int, screenHeight:int, playerPaddle:str, client:socket.socket) -> None:
-    # Pygame inits
-    pygame.mixer.pre_init(44100, -16, 2, 2048)
-    pygame.init()
+# dataChannel carries the per-tick input and snapshots when the server picked UDP, otherwise client does
+# tickRate is the server's simulation rate, used to place snapshots in time for interpolation
+# headless plays the game through without opening a window, drawing or playing sounds
+# matchedAt is the time.perf_counter() the opponent was found at, to report how long the first frame took
+# rejoin is called with the newest sync if the connection drops, and returns a new (client, dataChannel) or None
+# lockstep answers every snapshot with exactly one input, as a deterministic server waits for, and frames
+#   are then timed on a virtual clock unless another clock is given, so the game runs as fast as the server
+def playGame(screenWidth:int, screenHeight:int, playerPaddle:str, client:Connection, dataChannel=None, tickRate:int=60, headless:bool=HEADLESS, matchedAt:Optional[float]=None, rejoin=None, lockstep:bool=False, clock=None) -> None:
+    if matchedAt is None:
+        matchedAt = time.perf_counter()
+
+    # Pygame inits, usually already done in the background while matchmaking
+    assets = assetCache.get(headless)
 
     # Constants
     WHITE = (255,255,255)
-    clock = pygame.time.Clock()
-    scoreFont = pygame.font.Font("./assets/fonts/pong-score.ttf", 32)
-    winFont = pygame.font.Font("./assets/fonts/visitor.ttf", 48)
-    pointSound = pygame.mixer.Sound("./assets/sounds/point.wav")
-    bounceSound = pygame.mixer.Sound("./assets/sounds/bounce.wav")
-
-    # Display objects
+    if clock is None:
+        clock = VirtualClock() if lockstep else RealClock()
+    scoreFont = assets.scoreFont
+    winFont = assets.winFont
+    pointSound = assets.pointSound
+    bounceSound = assets.bounceSound
+
+    # Display objects, the walls and center line are drawn once by the renderer
     screen = pygame.display.set_mode((screenWidth, screenHeight))
     winMessage = pygame.Rect(0,0,0,0)
-    topWall = pygame.Rect(-10,0,screenWidth+20, 10)
-    bottomWall = pygame.Rect(-10, screenHeight-10, screenWidth+20, 10)
-    centerLine = []
-    for i in range(0, screenHeight, 10):
-        centerLine.append(pygame.Rect((screenWidth/2)-5,i,5,5))
+    renderer = HeadlessRenderer() if headless else Renderer(screen, WHITE, scoreFont)
 
     # Paddle properties and init
     paddleHeight = 50
@@ -62,21 +94,25 @@ def playGame(screenWidth:int, screenHeight:int, playerPaddle:str, client:socket.
     lScore = 0
     rScore = 0
 
-    sync = 0
-    ballCounter = 0
+    inputSeq = 0
+    predictor = PaddlePredictor(playerPaddleObj.rect.y, screenHeight)
+    network = NetworkClient(client, dataChannel, tickRate, INTERPOLATION_DELAY)  # All socket I/O happens on its threads
+    network.start()
+    frameTimes = TimingStats()
 
     playing = True
     sendPlayAgain = False
+    lastSync = 0    # Newest tick we've seen, the server resumes us from it if the connection drops
+    rejoined = []   # Connections made by rejoin, closed here since the caller only knows the first
 
     while True:
-        # Wiping the screen
-        screen.fill((0,0,0))
-
         # Getting keypress events
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 pygame.quit()
                 sys.exit()
+            elif event.type == pygame.WINDOWEXPOSED:   # Uncovered, the parts that haven't changed need drawing too
+                renderer.invalidate()
             elif event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_DOWN or event.key == pygame.K_s:
                     playerPaddleObj.moving = "down"
@@ -87,129 +123,95 @@ def playGame(screenWidth:int, screenHeight:int, playerPaddle:str, client:socket.
             elif event.type == pygame.KEYUP:
                 playerPaddleObj.moving = ""
 
-        # Update the player paddle's location on the screen
-        if playerPaddleObj.moving == "down":
-            if playerPaddleObj.rect.bottomleft[1] < screenHeight-10:
-                playerPaddleObj.rect.y += playerPaddleObj.speed
-        elif playerPaddleObj.moving == "up":
-            if playerPaddleObj.rect.topleft[1] > 10:
-                playerPaddleObj.rect.y -= playerPaddleObj.speed
+        # =========================================================================================
+        # ============================ SERVER-CLIENT DIALOG =======================================
+
+        # -_-_-_-_- SEND PADDLE INPUT -_-_-_-_-
+
+        # Move our own paddle right away instead of waiting a round trip for the server
+        # In lockstep the server plays nothing until it has our input on its last tick, so send one per tick
+        if not lockstep or network.waitForSnapshot(lastSync, LOCKSTEP_TIMEOUT):
+            inputSeq += 1
+            predictor.applyInput(inputSeq, MOVES[playerPaddleObj.moving])
+            network.sendInput({'seq': inputSeq, 'moving': MOVES[playerPaddleObj.moving]})    # Queued, never blocks
+
+        # -_-_-_-_- READ THE NEWEST GAME STATE -_-_-_-_-
+        jsonData, events, result = network.poll()
+        if network.closed and result is None:   # Connection lost, try to get back into the game
+            resumed = rejoin(lastSync) if rejoin is not None else None
+            if resumed is None:     # The game is over or the server is gone
+                pygame.display.quit()
+                break
+            rtt = network.rtt
+            rejoined.extend(resumed)
+            network = NetworkClient(resumed[0], resumed[1], tickRate, INTERPOLATION_DELAY)
+            network.rtt = rtt
+            network.start()
+            continue
+
+        # Play the sounds for whatever happened on the server since the last frame
+        if headless:
+            pass
+        elif events & EVENT_POINT:
+            pointSound.play()
+        elif events & EVENT_BOUNCE:
+            bounceSound.play()
+
+        if result is not None:  # The match is over, the result is final even if snapshots were lost
+            lScore, rScore = result['score']
+        elif jsonData is not None:
+            lastSync = jsonData['sync']
+            lScore = jsonData['score'][0]   # Update the scores
+            rScore = jsonData['score'][1]
+
+            # Correct our prediction with the server's paddle, replaying the inputs it hasn't seen yet
+            predictor.reconcile(jsonData[playerPaddle][1], jsonData['acked'])
+
+            # DEBUG, off unless PONG_LOG_LEVEL=DEBUG, and rate limited even then
+            log.debug("Sync: %s Left: %s Right: %s Ball: %s", jsonData['sync'], jsonData['left'], jsonData['right'], jsonData['ball'])
 
         # =========================================================================================
 
         # If the game is over, display the win message
-        if lScore > 4 or rScore > 4:
+        if (lScore > 4 or rScore > 4) and headless:
+            log.info("Player 1 wins" if lScore > 4 else "Player 2 wins")
+            pygame.display.quit()
+            break
+        elif lScore > 4 or rScore > 4:
             winText = "Player 1 Wins! " if lScore > 4 else "Player 2 Wins! "
             textSurface = winFont.render(winText, False, WHITE, (0,0,0))
             textRect = textSurface.get_rect()
             textRect.center = ((screenWidth/2), screenHeight/2)
             winMessage = screen.blit(textSurface, textRect)
             pygame.display.update()
-            time.sleep(5)
+            clock.sleep(WIN_MESSAGE_TIME)
             pygame.display.quit()
             break
-        elif ballCounter >= 1:
-            # ==== Ball Logic =====================================================================
-            ball.updatePos()
-
-            # If the ball makes it past the edge of the screen, update score, etc.
-            if ball.rect.x > screenWidth:
-                lScore += 1
-                pointSound.play()
-                ball.reset(nowGoing="left")
-            elif ball.rect.x < 0:
-                rScore += 1
-                pointSound.play()
-                ball.reset(nowGoing="right")
-                
-            # If the ball hits a paddle
-            if ball.rect.colliderect(playerPaddleObj.rect):
-                bounceSound.play()
-                ball.hitPaddle(playerPaddleObj.rect.center[1])
-            elif ball.rect.colliderect(opponentPaddleObj.rect):
-                bounceSound.play()
-                ball.hitPaddle(opponentPaddleObj.rect.center[1])
-                
-            # If the ball hits a wall
-            if ball.rect.colliderect(topWall) or ball.rect.colliderect(bottomWall):
-                bounceSound.play()
-                ball.hitWall()
-            
-            pygame.draw.rect(screen, WHITE, ball)
-            # ==== End Ball Logic =================================================================
-
-        # Drawing the dotted line in the center
-        for i in centerLine:
-            pygame.draw.rect(screen, WHITE, i)
-        
-        # Drawing the player's new location
-        for paddle in [playerPaddleObj, opponentPaddleObj]:
-            pygame.draw.rect(screen, WHITE, paddle)
-
-        pygame.draw.rect(screen, WHITE, topWall)
-        pygame.draw.rect(screen, WHITE, bottomWall)
-        scoreRect = updateScore(lScore, rScore, screen, WHITE, scoreFont)
-        pygame.display.update()
-        clock.tick(60)
-
-        # =========================================================================================
-        # ============================ SERVER-CLIENT DIALOG =======================================
 
-        # -_-_-_-_- SEND GAME STATE -_-_-_-_-
-        data = {'sync': sync,   # Assemble the Json dictionary
-                'paddle': [playerPaddleObj.rect.x, playerPaddleObj.rect.y],
-                'ball': [ball.rect.x, ball.rect.y],
-                'score': [lScore, rScore],
-                }
-            
-
-        
-        jsonData = json.dumps(data) # Dump the data
-        client.send(jsonData.encode()) # Send the data
-
-        # -_-_-_-_- RECIEVE GAME STATE -_-_-_-_-
-
-        # Recieve game state from server
-        received = client.recv(1024) # Recieve socket data
-        data = received.decode()    # Decode socket data
-        jsonData = json.loads(data) # Parse Json data
-
-        if sync != jsonData['sync']: # If the sync variable is not equal to the sync variable from the server
-            # Update the player paddle position
-            if playerPaddle == "left":
-                playerPaddleObj.rect.x = jsonData['left'][0]
-                playerPaddleObj.rect.y = jsonData['left'][1]
-            else:
-                playerPaddleObj.rect.x = jsonData['right'][0]
-                playerPaddleObj.rect.y = jsonData['right'][1]
-
-        ball.rect.x = jsonData['ball'][0]   # Update the ball position
-        ball.rect.y = jsonData['ball'][1]
-
-        lScore = jsonData['score'][0]   # Update the scores
-        rScore = jsonData['score'][1]
-
-        # Update paddle positions
-        if playerPaddle == "left":
-            opponentPaddleObj.rect.x = jsonData['right'][0]
-            opponentPaddleObj.rect.y = jsonData['right'][1]
-        else:
-            opponentPaddleObj.rect.x = jsonData['left'][0]
-            opponentPaddleObj.rect.y = jsonData['left'][1]
-
-        sync = jsonData['sync'] + 1 # Update the sync variable
+        # Our paddle is predicted, the ball and opponent are drawn a little in the past between snapshots
+        playerPaddleObj.rect.y = predictor.y
+        view = network.sample(time.perf_counter())
+        if view is not None:
+            opponentPaddleObj.rect.x, opponentPaddleObj.rect.y = view['right' if playerPaddle == "left" else 'left']
+            ball.rect.x, ball.rect.y = view['ball']
 
-        # DEBUG 
-        print("Sync: ", jsonData['sync'])
-        print("Left: ", jsonData['left'][0], " ", jsonData['left'][1])
-        print("Right: ", jsonData['right'][0], " ", jsonData['right'][1])
-        print("Ball: ", jsonData['ball'][0], " ", jsonData['ball'][1])
+        # Repaint only where the ball, paddles and score were and are now
+        renderer.draw([ball.rect, playerPaddleObj.rect, opponentPaddleObj.rect], lScore, rScore)
+        if matchedAt is not None:
+            log.info("First frame drawn %.1f ms after the opponent was found", (time.perf_counter() - matchedAt) * 1000)
+            matchedAt = None
+        frameTimes.add(clock.tick(60))
 
-        if ballCounter < 1:
-            time.sleep(1)
-            ballCounter+=1
+    network.close()
+    for channel in rejoined:
+        if channel is not None:
+            channel.close()
 
-        # =========================================================================================
+    # Frame pacing and network latency are reported separately, a slow network shouldn't show up in frame times
+    frameSummary = frameTimes.summary()
+    rttSummary = network.rtt.summary()
+    log.info(f"Frame time: mean {frameSummary['mean']*1000:.1f} ms, p99 {frameSummary['p99']*1000:.1f} ms, "
+        f"stdev {frameSummary['stdev']*1000:.1f} ms | RTT: mean {rttSummary['mean']*1000:.1f} ms, p99 {rttSummary['p99']*1000:.1f} ms")
 
 
 # This is where you will connect to the server to get the info required to call the game loop.  Mainly
@@ -219,42 +221,192 @@ def playGame(screenWidth:int, screenHeight:int, playerPaddle:str, client:socket.
 # Modified by Ty Gordon, Caleb Fields, Abdallah Sher
 # Purpose:      This method is fired when the join button is clicked
 # Pre: The fields in the start screen have been filled
-# Post: The game will be ready to be played
+# Post: Matchmaking runs in the background and the join button cancels it, the game starts once an opponent is found
 # Arguments:
 # ip            A string holding the IP address of the server
 # port          An int holding the port the server is using
 # errorLabel    A tk label widget, modify it's text to display messages to the user (example below)
+# joinButton    The tk button that was clicked, it becomes a cancel button until matchmaking is over
 # app           The tk window object, needed to kill the window
 # Create a socket and connect to the server
 # You don't have to use SOCK_STREAM, use what you think is best
-def joinServer(name:str, ip:str, port:str, errorLabel:tk.Label, app:tk.Tk) -> None:
-    
-    client = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    client.connect((ip, int(port)))
-    client.send(name.encode())
+def joinServer(name:str, ip:str, port:str, errorLabel:tk.Label, joinButton:tk.Button, app:tk.Tk) -> None:
+    assetCache.start()  # Get pygame, the fonts and the sounds ready while we wait for an opponent
+    request = MatchRequest(name, ip, port)
 
     errorLabel.config(text="Waiting for other player...")
-    errorLabel.update()
+    join = joinButton.cget("command")
+    joinButton.config(text="Cancel", command=request.cancel)
+    app.after(POLL_INTERVAL, waitForMatch, request, errorLabel, joinButton, join, app)
+
 
-    # -_-_-_-_- Recieve preliminary data from server -_-_-_-_-
-    received = client.recv(1024)
-    data = received.decode()
-    jsonData = json.loads(data)
+# Purpose:  To check on matchmaking from the Tk main loop, starting the game once an opponent is found
+# Pre:  request was started by joinServer(), join is the join button's original command
+# Post: Checks again in POLL_INTERVAL if matchmaking isn't over, otherwise plays the game or shows why not
+def waitForMatch(request: "MatchRequest", errorLabel: tk.Label, joinButton: tk.Button, join: str, app: tk.Tk) -> None:
+    if not request.done.is_set():
+        app.after(POLL_INTERVAL, waitForMatch, request, errorLabel, joinButton, join, app)
+        return
 
-    side = jsonData['side']
-    screenHeight = jsonData['height']
-    screenWidth = jsonData['width']
-    errorLabel.config(text=f"Unable to connect to server: IP: {ip}, Port: {port}")
-    errorLabel.update()     
+    joinButton.config(text="Join", command=join)
+    if request.welcome is None:
+        errorLabel.config(text=request.error)
+        return
+
+    client = request.connection
+    jsonData = request.welcome
+    dataChannel = openDataChannel(jsonData, client, request.ip)
 
     # Close this window and start the game with the info passed to you from the server
     app.withdraw()     # Hides the window (we'll kill it later)
-    playGame(screenWidth, screenHeight, side, client)  # User will be either left or right paddle
+    playGame(jsonData['width'], jsonData['height'], jsonData['side'], client, dataChannel, jsonData.get('tickRate', 60),
+        matchedAt=request.matchedAt, rejoin=request.resume, lockstep=jsonData.get('lockstep', False))  # User will be either left or right paddle
+    client.close()
+    if dataChannel is not None:
+        dataChannel.close()
+    errorLabel.config(text="")
     app.wm_deiconify()
 
 
     #app.quit()         # Kills the window
 
+
+# Purpose:  To connect to the server and wait for an opponent on a background thread
+# Pre:  ip and port are what the player typed, they are checked here
+# Post: done is set once matchmaking is over. welcome then holds the server's MSG_WELCOME and connection
+#       the connection to play on, or welcome is None and error says why
+class MatchRequest():
+    # Default constructor
+    def __init__(self, name: str, ip: str, port: str) -> None:
+        self._name = name
+        self._ip = ip
+        self._port = port
+        self._lock = threading.Lock()
+        self._cancelled = False
+        self.connection = None
+        self.welcome = None
+        self.matchedAt = None   # time.perf_counter() the welcome arrived at
+        self.error = ""
+        self.done = threading.Event()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    @property # Server IP getter
+    def ip(self) -> str:
+        return self._ip
+
+    # Stop waiting and hang up, done is set soon after
+    def cancel(self) -> None:
+        with self._lock:
+            self._cancelled = True
+            connection = self.connection
+        if connection is not None:
+            connection.close()  # Wakes the thread blocked waiting for the welcome
+
+    def _run(self) -> None:
+        try:
+            sock = socket.create_connection((self._ip, int(self._port)), timeout=CONNECT_TIMEOUT)
+            sock.settimeout(None)
+        except (OSError, ValueError):
+            self.error = f"Unable to connect to server: IP: {self._ip}, Port: {self._port}"
+            self.done.set()
+            return
+
+        connection = Connection(sock)
+        with self._lock:
+            if not self._cancelled:
+                self.connection = connection
+        if self.connection is None:
+            connection.close()
+            self.error = "Cancelled"
+            self.done.set()
+            return
+
+        try:
+            connection.sendJson(MSG_HELLO, {'name': self._name, 'codecs': list(SUPPORTED_CODECS)}) # Offer every codec we speak
+            # -_-_-_-_- Recieve preliminary data from server -_-_-_-_-
+            welcome = connection.recvJson(MSG_WELCOME)
+        except (OSError, ProtocolError):
+            welcome = None
+
+        if welcome is None or self._cancelled:
+            connection.close()
+            self.error = "Cancelled" if self._cancelled else f"Server closed the connection: IP: {self._ip}, Port: {self._port}"
+        else:
+            self.matchedAt = time.perf_counter()
+            connection.codec = welcome.get('codec', CODEC_JSON)   # Use the codec the server picked
+            self.welcome = welcome
+        self.done.set()
+
+    # Reconnect to the game after the connection dropped, retrying for up to RECONNECT_TIMEOUT
+    # sync is the newest tick the client has, the server answers with a full snapshot of the current one
+    # Returns the new (client, dataChannel), or None if the game can't be resumed
+    def resume(self, sync: int) -> Optional[Tuple[Connection, Optional[DatagramChannel]]]:
+        if self.welcome is None or 'session' not in self.welcome:
+            return None     # An older server that can't resume games
+        started = time.perf_counter()
+        deadline = time.monotonic() + RECONNECT_TIMEOUT
+        hello = {'name': self._name, 'codecs': list(SUPPORTED_CODECS),
+            'resume': {'session': self.welcome['session'], 'game': self.welcome.get('game'), 'sync': sync}}
+        log.info("Connection lost, reconnecting...")
+        while time.monotonic() < deadline:
+            connection = None
+            try:
+                sock = socket.create_connection((self._ip, int(self._port)), timeout=CONNECT_TIMEOUT)
+                connection = Connection(sock)
+                connection.sendJson(MSG_HELLO, hello)
+                received = connection.recv()
+                sock.settimeout(None)
+            except (OSError, ProtocolError):
+                if connection is not None:
+                    connection.close()
+                time.sleep(RECONNECT_INTERVAL)
+                continue
+
+            if received is None or received[0] != MSG_WELCOME:  # The server has given up on the game
+                log.info("Couldn't rejoin the game")
+                connection.close()
+                return None
+            welcome = decodeJson(received[1])
+            connection.codec = welcome.get('codec', CODEC_JSON)
+            self.connection = connection
+            self.welcome = welcome
+            log.info("Rejoined the game in %.1f ms", (time.perf_counter() - started) * 1000)
+            return connection, openDataChannel(welcome, connection, self._ip)
+        log.info("Couldn't reach the server to rejoin the game")
+        return None
+
+
+# Purpose:  To open the UDP channel for per-tick data if the server asked for one
+# Post: Returns None when everything stays on the TCP connection
+def openDataChannel(jsonData: dict, client: Connection, ip: str) -> Optional[DatagramChannel]:
+    if jsonData.get('transport') != TRANSPORT_UDP:
+        return None
+    return DatagramChannel(socket.socket(socket.AF_INET, socket.SOCK_DGRAM), jsonData['token'],
+        peer=(ip, jsonData['udpPort']), codec=client.codec.name, timeout=UDP_TIMEOUT)
+
+
+# Purpose:  To join a server and play one game without opening any window
+# Pre:  Started as PONG_HEADLESS=1 python pongClient.py NAME IP PORT
+# Post: Returns once the game is over or the server has closed the connection
+def playHeadless(name: str, ip: str, port: str) -> None:
+    assetCache.start(headless=True)
+    request = MatchRequest(name, ip, port)
+    log.info("Waiting for other player...")
+
+    request.done.wait()
+    if request.welcome is None:
+        log.info(request.error)
+        return
+
+    client = request.connection
+    jsonData = request.welcome
+    dataChannel = openDataChannel(jsonData, client, ip)
+    playGame(jsonData['width'], jsonData['height'], jsonData['side'], client, dataChannel, jsonData.get('tickRate', 60),
+        headless=True, matchedAt=request.matchedAt, rejoin=request.resume, lockstep=jsonData.get('lockstep', False))
+    client.close()
+    if dataChannel is not None:
+        dataChannel.close()
+
 # Author: Alexander Barrera, Modified by Caleb Fields, Abdallah Sher
 # Purpose: Create the starting screen for the client
 # Pre: None
@@ -297,16 +449,21 @@ def startScreen() -> None:
     errorLabel = tk.Label(text="")
     errorLabel.grid(column=0, row=5, columnspan=2)
 
-    joinButton = tk.Button(text="Join", command=lambda: joinServer(nameEntry.get(), ipEntry.get(), portEntry.get(), errorLabel, app))
+    joinButton = tk.Button(text="Join")
+    joinButton.config(command=lambda: joinServer(nameEntry.get(), ipEntry.get(), portEntry.get(), errorLabel, joinButton, app))
     joinButton.grid(column=0, row=4, columnspan=2)
 
     app.mainloop()
 
 
 if __name__ == "__main__":
-    startScreen()
+    setupLogging()
+    if HEADLESS and len(sys.argv) == 4:
+        playHeadless(*sys.argv[1:])
+    else:
+        startScreen()
     
     # Uncomment the line below if you want to play the game without a server to see how it should work
     # the startScreen() function should call playGame with the arguments given to it by the server this is
     # here for demo purposes only
-    #playGame(640, 480,"left",socket.socket(socket.AF_INET, socket.SOCK_STREAM))
\ No newline at end of file
+    #playGame(640, 480,"left",Connection(socket.socket(socket.AF_INET, socket.SOCK_STREAM)))
\ No newline at end of file
@@ -8,11 +8,26 @@
 
 import socket
 import threading
-import json # For packing and sending data
-from typing import Optional, Union # For type hinting
+from typing import Optional, Tuple, Union # For type hinting
 import time
-import http.server
-import socketserver
+from assets.code.protocol import * # For framing, packing and sending data
+from assets.code.physics import PongSimulation # For the authoritative game simulation
+import queue # For handing finished games to the leaderboard writer
+import secrets # For UDP session tokens
+from collections import deque # For the waiting game queue
+from assets.code.leaderboardStore import LeaderboardStore # For saving wins as games finish
+from assets.code.leaderboardService import LeaderboardCache, startLeaderboardServer # For the leaderboard page and API
+from assets.code.metrics import MetricsRegistry # For the /metrics endpoint
+from assets.code.logs import setupLogging # For leveled, rate-limited logging
+from assets.code.replay import ReplayWriter, pruneReplays, REPLAY_EXTENSION # For recording matches
+from assets.code.spectators import SpectatorHub # For sending games to spectators
+from assets.code.workers import RemoteLeaderboard, handOff, receiveHandOff, reportMetrics, serveLeaderboard # For running games in several processes
+from assets.code.linkQuality import LinkMonitor, unsentBytes, BACKLOG_HIGH # For sending less to players on slow links
+from assets.code.reactor import Reactor # For reading every connection from one thread
+from assets.code.clock import RealClock, VirtualClock # For playing games on virtual time
+import multiprocessing # For worker processes
+import logging
+import os
 
 
 # Use this file to write your server logic
@@ -23,14 +38,73 @@ import socketserver
 # clients are and take actions to resync the games
 
 SERVER_IP = "localhost"
-__gameList__ = [] # Private global list that stores dictionaries pairs of left and right players, which contain gameStates
+SCREEN_WIDTH = 640
+SCREEN_HEIGHT = 480
+TICK_RATE = 60      # Simulation steps per second for every game
+MAX_TICK_LAG = 5    # Ticks a game may fall behind before it stops trying to catch up
+STEP_TICKS = 1      # Ticks simulated per pass of a game's loop, 3 simulates and sends at 20 Hz with the same outcomes
+KEYFRAME_INTERVAL = 2 * TICK_RATE   # Ticks between full snapshots, deltas are sent in between
+SNAPSHOT_HISTORY = TICK_RATE        # Ticks of snapshots kept to make deltas against
+MAX_SEND_LEVEL = 4  # Worst of linkQuality.SEND_LEVELS a player on a bad link is moved to, 0 always sends every tick in full
+TRANSPORT = TRANSPORT_TCP   # Transport for per-tick input and snapshots, TRANSPORT_UDP adds a datagram path
+MAX_CONCURRENT_GAMES = 64   # Games played at once, any further pairs wait in the scheduler's queue
+WORKERS = 1     # Processes running games, above 1 a supervisor pairs players and hands each pair to a forked worker (not on Windows)
+MAX_GAMES = 4 * MAX_CONCURRENT_GAMES    # Games tracked at once, counting unpaired and queued ones, new players are turned away past this
+WAITING_TIMEOUT = 300   # Seconds a player waits for an opponent before their game is reaped
+REAP_INTERVAL = 5       # Seconds between sweeps for finished and abandoned games
+RECONNECT_GRACE = 10    # Seconds a game is paused and held for a player whose connection dropped
+ACCEPT_BACKLOG = 128    # Connections the operating system queues for the server before refusing more
+HANDSHAKE_TIMEOUT = 5   # Seconds a new connection has to send its hello before it's closed
+IDLE_TIMEOUT = 10       # Seconds a player in a running game may go unheard before they count as dropped
+LEADERBOARD_DB = "leaderboard.db"       # Where every player's wins are stored
+LEADERBOARD_JSON = "leaderboard.json"   # Leaderboard file from older versions, imported once
+LEADERBOARD_PORT = 80   # Port the leaderboard page and /api/leaderboard are served on
+REPLAY_DIRECTORY = "replays"    # Where every match is recorded, None turns recording off
+REPLAY_MAX_FILES = 1000     # Replays kept, the oldest are deleted as new matches start, None keeps every one
+REPLAY_MAX_BYTES = 1 << 30  # Total size of the replays kept, None for no limit
+DETERMINISTIC_SEED = None   # Seeds every game's serves and plays it in lockstep with its players on virtual time, None plays in real time
 
+# Lifecycle of a game in the registry
+GAME_WAITING = "waiting"    # Waiting for an opponent, or paired and queued for the scheduler
+GAME_RUNNING = "running"
+GAME_FINISHED = "finished"  # Over and handed to the leaderboard, its slot is freed at the next sweep
+GAME_REAPED = "reaped"      # Slot freed, the id may already belong to a new game
 
-leaderboard = {}
+
+leaderboard: Union[LeaderboardStore, RemoteLeaderboard, None] = None  # Opened by establishServer, a stand-in in worker processes
+leaderboardCache: Union[LeaderboardCache, RemoteLeaderboard, None] = None # Ready-made leaderboard responses for the web server
+leaderboardQueue = queue.Queue()    # Ids of finished games whose results haven't been published yet
+sessions = {}   # UDP session token -> (gameId, side) of the player it belongs to
+playerSessions = {} # Session token sent in MSG_WELCOME -> (gameId, side), for resuming after a dropped connection
+deterministicSeed: Optional[int] = None # Set by establishServer, game n is seeded with deterministicSeed + n
+log = logging.getLogger("pong.server")
+
+# Live numbers served at /metrics next to the leaderboard
+metrics = MetricsRegistry()
+tickSeconds = metrics.histogram("pong_tick_seconds", "Time to simulate a game tick and send it to both players")
+rttSeconds = metrics.histogram("pong_rtt_seconds", "Time from a snapshot being sent to an input that acknowledges it arriving")
+syncDrift = metrics.histogram("pong_sync_drift_ticks", "Ticks between the snapshots the two players of a game have acknowledged", (0, 1, 2, 3, 5, 10, 30, 60))
+bytesSent = metrics.counter("pong_bytes_sent_total", "Bytes of per-tick data sent to players, framing included")
+bytesReceived = metrics.counter("pong_bytes_received_total", "Bytes of per-tick data received from players, framing included")
+messagesSent = metrics.counter("pong_messages_sent_total", "Snapshots and deltas sent to players")
+snapshotsSkipped = metrics.counter("pong_snapshots_skipped_total", "Ticks not sent to a player because of their link")
+sendLevelChanges = metrics.counter("pong_send_level_changes_total", "Times a player's snapshot rate or precision was changed")
+messagesReceived = metrics.counter("pong_messages_received_total", "Inputs received from players")
+gamesStarted = metrics.counter("pong_games_started_total", "Games started")
+playersAccepted = metrics.counter("pong_players_accepted_total", "Players that completed the handshake")
+metrics.gauge("pong_games_running", "Games being played", lambda: __gameRegistry__.counts()[GAME_RUNNING])
+spectatorHub = SpectatorHub(metrics)  # Every game's spectators, served from one thread
+reactor = Reactor(HANDSHAKE_TIMEOUT, IDLE_TIMEOUT)    # Every handshake and player's input, read from one thread
+metrics.gauge("pong_connections_handshaking", "Connections that haven't sent their hello yet", lambda: reactor.handshakes)
+metrics.gauge("pong_games_waiting", "Games waiting for an opponent or a free slot", lambda: __gameRegistry__.counts()[GAME_WAITING])
+metrics.gauge("pong_players_connected", "Players in waiting or running games", lambda: __gameRegistry__.players)
+playersResumed = metrics.counter("pong_players_resumed_total", "Players that reconnected to a running game")
 
 # Author(s):   Ty Gordon, Caleb Fields, Abdallah Sher
 # Purpose:  To store 2-tuples of data in a concise way
 class Vec2D():
+    __slots__ = ('_x', '_y')
+
     # Default constructor
     def __init__(self, x=None, y=None) -> None:
         self._x = x if x is not None else 0.0
@@ -60,258 +134,912 @@ class Vec2D():
 
 # Author(s):   Ty Gordon, Caleb Fields, Abdallah Sher
 # Purpose:  To store game state data in a concise way
+# The last few ticks live in one preallocated buffer, each slot packed exactly like a SNAPSHOT message,
+# so a tick is written in place without allocating and sent to players without being rebuilt
+# Pre:  Only the game's own thread calls update()
+# Post: Other threads always read a whole, published tick, as a slot is only rewritten history ticks later
 class GameState():
+    __slots__ = ('_start', '_size', '_buffer', '_view', '_ticks', '_sync')
+
     # Default constructor
-    def __init__(self, sync: Optional[int] = None, leftPaddle: Optional[Vec2D] = None, rightPaddle: Optional[Vec2D] = None, ball: Optional[Vec2D] = None, score: Optional[Vec2D] = None, start:bool = False):
-        self._sync = 0 if sync is None else sync
-        self._leftPaddle = Vec2D() if leftPaddle is None else leftPaddle
-        self._rightPaddle = Vec2D() if rightPaddle is None else rightPaddle
-        self._ball = Vec2D() if ball is None else ball
-        self._score = Vec2D() if score is None else score  # x is left score, y is right score
-        self._start = False if start is None else start
-        
-    # Change all variables in state
-    def setState(self, sync: Optional[int], leftPaddle: Union[Vec2D, None], rightPaddle: Union[Vec2D, None], ball: Union[Vec2D, None], score: Union[Vec2D, None]):
-        self._sync = sync
-        self._leftPaddle = leftPaddle
-        self._rightPaddle = rightPaddle
-        self._ball = ball
-        self._score = score  # x is left score, y is right score
-
-    @property
+    # history   Ticks kept, players can be sent deltas against any of them
+    def __init__(self, history: int = SNAPSHOT_HISTORY, start: bool = False) -> None:
+        self._start = start
+        self._size = history
+        self._buffer = bytearray(SNAPSHOT.size * history)
+        self._view = memoryview(self._buffer)
+        self._ticks = [-1] * history    # Tick held in each slot
+        self._sync = 0  # Newest published tick, 0 before the first
+
+    # Pack the simulation's current tick into its slot, then publish it
+    def update(self, simulation: PongSimulation, events: int) -> None:
+        tick = simulation.tick
+        slot = tick % self._size
+        SNAPSHOT.pack_into(self._buffer, slot * SNAPSHOT.size, tick, 0,
+            simulation.leftPaddle.x, simulation.leftPaddle.y,
+            simulation.rightPaddle.x, simulation.rightPaddle.y,
+            simulation.ball.x, simulation.ball.y,
+            simulation.lScore, simulation.rScore, events)
+        self._ticks[slot] = tick
+        self._sync = tick
+
+    # A view of one tick's packed snapshot (the newest by default), or None if it has been overwritten
+    # Encode or copy it right away rather than holding on to it
+    def packed(self, tick: Optional[int] = None) -> Optional[memoryview]:
+        tick = self._sync if tick is None else tick
+        slot = tick % self._size
+        if tick <= 0 or self._ticks[slot] != tick:
+            return None
+        return self._view[slot * SNAPSHOT.size:(slot + 1) * SNAPSHOT.size]
+
+    # The newest tick as a snapshot dictionary, for anything off the hot path
+    def read(self) -> Optional[dict]:
+        packed = self.packed()
+        return unpackSnapshot(packed) if packed is not None else None
+
+    @property # Sync getter
     def sync(self) -> int:
         return self._sync
-    
-    @sync.setter # Sync setter
-    def sync(self, sync: int) -> None:
-        self._sync = sync
 
-    @property # Sync getter
+    @property # LeftPaddle getter
     def leftPaddle(self) -> Vec2D:
-        return self._leftPaddle
-    
-    @leftPaddle.setter # LeftPaddle setter
-    def leftPaddle(self, leftPaddle: Vec2D) -> None:
-        self._leftPaddle = leftPaddle
+        return Vec2D(*self._field('left'))
 
     @property # RightPaddle getter
     def rightPaddle(self) -> Vec2D:
-        return self._rightPaddle
-    
-    @rightPaddle.setter # RightPaddle setter
-    def rightPaddle(self, rightPaddle: Vec2D) -> None:
-        self._rightPaddle = rightPaddle
+        return Vec2D(*self._field('right'))
 
     @property # Ball getter
     def ball(self) -> Vec2D:
-        return self._ball
-    
-    @ball.setter # Ball setter
-    def ball(self, ball: Vec2D) -> None:
-        self._ball = ball
+        return Vec2D(*self._field('ball'))
 
-    @property # Score getter
+    @property # Score getter, x is left score, y is right score
     def score(self) -> Vec2D:
-        return self._score
-    
-    @score.setter # Score setter
-    def score(self, score: Vec2D) -> None:
-        self._score = score
+        return Vec2D(*self._field('score'))
 
-    @property # Start setter
+    @property # Start getter
     def start(self) -> bool:
         return self._start
 
-    @start.setter # Start getter
+    @start.setter # Start setter
     def start(self, start: bool) -> None:
         self._start = start
 
+    # One field of the newest tick, zeros before the first
+    def _field(self, field: str) -> tuple:
+        snapshot = self.read()
+        return tuple(snapshot[field]) if snapshot is not None else (0, 0)
 
-# Author(s):   Ty Gordon, Caleb Fields, Abdallah Sher
-# Purpose:  To manage the interactions between the server and each client
-# Pre:  A clientSocket object must be passed in order to know which client this thread regulates
-# Post: The thread will persist and handle its client's transmissions
-def clientThread(name:str, clientSocket: socket, clientAddress, gameId: int, isLeft: bool) -> None:
-
-    # Game constants
-    SCREEN_HEIGHT = 480
-    SCREEN_WIDTH = 640
-    SYNC_OFFSET = 1
-
-    leaderboard[name] = 0 
-
-    sideString = 'left' if isLeft else 'right' # Send player's side (left or right)
-    oppString = 'right' if isLeft else 'left'  # Opponent's side (left or right)
-
-    # Construct a preliminary data dict to send
-    preliminaryData = {'side': sideString,
-        'height': SCREEN_HEIGHT,
-        'width': SCREEN_WIDTH}
-    
-    jPreliminaryData = json.dumps(preliminaryData)  # Dump the data
-    clientSocket.send(jPreliminaryData.encode()) # Send side, screen height and screen width
-
-    # Initialize game state variables
-    clientGameState = GameState()
-    clientGameState.ball = Vec2D(SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2)
-    clientGameState.start = True
-
-    # -_-_-_-_-_-_-_ PERPETUAL LISTENING LOOP _-_-_-_-_-_-_-
-    while(__gameList__[gameId]['left'].start and __gameList__[gameId]['right'].start):
-        time.sleep(0.01)
-
-        # Recieve game state from client
-        print("Recieving data from client..." + sideString)
-        received = clientSocket.recv(1024) # Recieve socket data
-        data = received.decode()    # Decode socket data
-        jsonData = json.loads(data) # Parse Json data
-
-        syncNeeded = False
-
-        if not received: # Close connection
-            print("No data")
+
+# Purpose:  To hold every game in a fixed number of slots, reusing a slot once its game is reaped
+# Each game is a dictionary with its id, status, lock, left and right players, simulation and gameState
+# Pre:  The game's own threads only touch a game while it is waiting or running
+# Post: Memory stays bounded by capacity however long the server runs
+class GameRegistry():
+    # Default constructor
+    # firstId   Id of the first slot, so each worker process hands out its own range of ids
+    def __init__(self, capacity: int = MAX_GAMES, firstId: int = 0) -> None:
+        self._games = [None] * capacity
+        self._free = deque(range(capacity))   # Freed slots go to the back, so an id is reused as late as possible
+        self._firstId = firstId
+        self._lock = threading.Lock()
+
+    @property # Capacity getter
+    def capacity(self) -> int:
+        return len(self._games)
+
+    @property # Player count getter, everyone seated in a waiting or running game
+    def players(self) -> int:
+        with self._lock:
+            return sum(1 + (game['right'] is not None) for game in self._games
+                if game is not None and game['status'] in (GAME_WAITING, GAME_RUNNING))
+
+    # Number of games in each status
+    def counts(self) -> dict:
+        with self._lock:
+            counts = {GAME_WAITING: 0, GAME_RUNNING: 0, GAME_FINISHED: 0}
+            for game in self._games:
+                if game is not None:
+                    counts[game['status']] += 1
+            return counts
+
+    # The game with an id, or None if its slot is free or the id isn't this registry's
+    def get(self, gameId: int) -> Optional[dict]:
+        slot = gameId - self._firstId
+        return self._games[slot] if 0 <= slot < len(self._games) else None
+
+    # Open a new waiting game with player on the left, returns its id or None if every slot is taken
+    def create(self, player: dict) -> Optional[int]:
+        with self._lock:
+            if not self._free:  # Don't turn anyone away while a finished game still holds a slot
+                for game in self._games:
+                    if game is not None and game['status'] == GAME_FINISHED:
+                        self._release(game)
+            if not self._free:
+                return None
+            slot = self._free.popleft()
+            gameId = self._firstId + slot
+            seed = deterministicSeed + gameId if deterministicSeed is not None else None
+            lock = threading.Lock()
+            spectatorHub.open(gameId)
+            self._games[slot] = {'id': gameId, 'status': GAME_WAITING, 'since': time.monotonic(),
+                'lock': lock, 'inputArrived': threading.Condition(lock), 'left': player, 'right': None, 'state': GameState(),
+                'sim': PongSimulation(SCREEN_WIDTH, SCREEN_HEIGHT, serveDelay=TICK_RATE, seed=seed),
+                'clock': VirtualClock() if seed is not None else RealClock()}
+            return gameId
+
+    # Seat player on the right of a waiting game, False if it has been reaped or is already full
+    def join(self, gameId: int, player: dict) -> bool:
+        with self._lock:
+            game = self.get(gameId)
+            if game is None or game['status'] != GAME_WAITING or game['right'] is not None:
+                return False
+            game['right'] = player
+            return True
+
+    def setStatus(self, gameId: int, status: str) -> None:
+        with self._lock:
+            game = self.get(gameId)
+            game['status'] = status
+            game['since'] = time.monotonic()
+
+    # Free the slots of finished games and of lone players who left or waited too long
+    # Returns the reaped games so their connections can be cleaned up
+    def reap(self, waitingTimeout: float = WAITING_TIMEOUT) -> list:
+        reaped = []
+        now = time.monotonic()
+        with self._lock:
+            for game in self._games:
+                if game is None:
+                    continue
+                abandoned = (game['status'] == GAME_WAITING and game['right'] is None
+                    and (now - game['since'] > waitingTimeout or hasHungUp(game['left']['connection'])))
+                if game['status'] == GAME_FINISHED or abandoned:
+                    self._release(game)
+                    reaped.append(game)
+        return reaped
+
+    # Mark a game reaped and put its slot back on the free list, the registry lock must be held
+    # Its spectators are sent away before the id can be reused, a game that was played has already said goodbye
+    def _release(self, game: dict) -> None:
+        spectatorHub.finish(game['id'], {'error': "Game " + str(game['id']) + " has ended"})
+        game['status'] = GAME_REAPED
+        slot = game['id'] - self._firstId
+        self._games[slot] = None
+        self._free.append(slot)
+
+
+__gameRegistry__ = GameRegistry() # Private global registry of every open game
+
+
+# Purpose:  To tell, without blocking, whether a client that shouldn't be sending anything yet has disconnected
+def hasHungUp(connection: Connection) -> bool:
+    try:
+        if hasattr(socket, "MSG_DONTWAIT"):     # Unlike select(), works on descriptors past 1024
+            return connection.sock.recv(1, socket.MSG_PEEK | socket.MSG_DONTWAIT) == b''
+        connection.sock.setblocking(False)
+        try:
+            return connection.sock.recv(1, socket.MSG_PEEK) == b''
+        finally:
+            connection.sock.setblocking(True)
+    except BlockingIOError:
+        return False
+    except (OSError, ValueError):
+        return True
+
+
+# Purpose:  To periodically sweep finished and abandoned games out of the registry
+# Pre:  Started once by establishServer
+# Post: The thread will persist, closing the connections of reaped lone players
+def reaperThread() -> None:
+    while(True):
+        time.sleep(REAP_INTERVAL)
+        for game in __gameRegistry__.reap():
+            if game['right'] is None:   # A lone player gave up or timed out, the scheduler never saw them
+                log.info("Reaped abandoned game " + str(game['id']))
+                sessions.pop(game['left']['token'], None)
+                playerSessions.pop(game['left']['session'], None)
+                game['left']['connection'].close()
+
+
+# Purpose:  To have the reactor read a player's input for their game
+# Pre:  The player's connection is theirs alone, and not watched already
+# Post: Each input is fed into the game's simulation, and a drop or RECONNECT_GRACE of silence pauses the game
+def watchPlayer(game: dict, side: str) -> None:
+    player = game[side]
+    connection = player['connection']
+
+    # Called by the reactor for every message on the connection
+    def onMessage(msgType: int, payload: bytes) -> None:
+        messagesReceived.inc()
+        bytesReceived.inc(HEADER.size + len(payload))
+        if msgType == MSG_INPUT:
+            handleInput(game, side, connection.codec.decodeInput(payload))  # ProtocolError drops the connection
+
+    reactor.watch(connection, onMessage, lambda: dropPlayer(game, side, connection), lambda: player['lastHeard'])
+
+
+# Purpose:  To pause a game while one of its players is disconnected, and end it if they don't resume in time
+# Pre:  Called on the reactor thread once connection has hung up, misbehaved or gone quiet
+# Post: The game is paused, and ended after RECONNECT_GRACE unless the player resumes first
+def dropPlayer(game: dict, side: str, connection: Connection) -> None:
+    player = game[side]
+    with game['lock']:
+        if player['connection'] is not connection or not player['connected']:
+            return  # Already resumed on a new connection
+        player['connected'] = False
+        droppedAt = player['droppedAt'] = time.monotonic()
+        game['inputArrived'].notify_all()   # A lockstep game stops waiting for them and pauses
+    if not game['state'].start:
+        return
+    log.info(player['name'] + " dropped from game " + str(game['id']) + ", holding it " + str(RECONNECT_GRACE) + " seconds")
+
+    # Called by the reactor once the grace period is over
+    def giveUp() -> None:
+        if player['connected'] or player['droppedAt'] != droppedAt or not game['state'].start:
+            return
+        log.info("No data from " + player['name'] + ", closing")
+        game['state'].start = False     # A client leaving ends the game for both players
+
+    reactor.later(RECONNECT_GRACE, giveUp)
+
+
+# Purpose:  To apply one input message from a player, however it arrived
+def handleInput(game: dict, side: str, inputData: dict) -> None:
+    with game['lock']:  # So the input and its sequence number always reach the same tick together
+        game['sim'].setInput(side, inputData['moving'])   # Applied on the next server tick
+        game[side]['ack'] = inputData['sync']   # Newest snapshot this client has, deltas are made against it
+        sample = game[side]['link'].acked(inputData['sync'], game['clock'].now())
+        game[side]['inputSeq'] = inputData.get('seq', 0)    # Acknowledged in the snapshot after the next tick
+        if inputData.get('flags', 0) & INPUT_KEYFRAME:
+            game[side]['keyframe'] = True
+        game[side]['lastHeard'] = time.monotonic()
+        game['inputArrived'].notify_all()
+    if sample is not None:
+        rttSeconds.observe(sample)
+
+
+# Purpose:  To receive every player's UDP input on the server's one datagram socket
+# Pre:  udpSocket is bound to the server's port and players are registered in sessions by token
+# Post: The thread will persist and feed each current datagram into its player's game
+def udpThread(udpSocket: socket.socket) -> None:
+    while(True):
+        try:
+            datagram, address = udpSocket.recvfrom(MAX_DATAGRAM)
+        except OSError:
+            continue
+        messagesReceived.inc()
+        bytesReceived.inc(len(datagram))
+        parsed = parseDatagram(datagram)
+        seat = sessions.get(parsed[0]) if parsed is not None else None
+        if seat is None:
+            continue    # Garbage or a finished game
+        token, sequence, msgType, payload = parsed
+        gameId, side = seat
+        game = __gameRegistry__.get(gameId)
+        if game is None:
+            continue
+        # One bad datagram is dropped like a lost one, it mustn't stop this thread receiving for every other game
+        try:
+            channel = game[side]['channel']
+            if msgType != MSG_INPUT or not channel.accept(sequence):
+                continue    # Stale, duplicated or reordered behind a newer input
+            inputData = channel.codec.decodeInput(payload)
+            channel.peer = address  # Reply to wherever the client's datagrams come from
+            handleInput(game, side, inputData)
+        except ProtocolError:
+            continue
+        except Exception:
+            log.exception("Dropped a datagram from " + str(address[0]))
+
+
+# Purpose:  To step a game's simulation at a fixed tick rate and broadcast every tick to both players
+# Pre:  Both players of the game have been registered in __gameRegistry__
+# Post: The game will have been played to completion or abandoned, and the winner credited
+def gameThread(gameId: int) -> None:
+    game = __gameRegistry__.get(gameId)
+    simulation = game['sim']
+    state = game['state']
+    players = (game['left'], game['right'])
+
+    # Tell both players their side, the screen size and how per-tick data will travel
+    for side in ('left', 'right'):
+        try:
+            game[side]['connection'].sendJson(MSG_WELCOME, welcomeData(game, side, game[side]['token']))
+        except OSError:
+            state.start = False
+
+    recorder = startRecording(game)
+    result = {'winner': None, 'score': [0, 0]}  # Kept if the game is cut short
+
+    clock = game['clock']
+    lockstep = clock.virtual    # Each tick waits for both players' input on the last one instead of for the wall clock
+    tickLength = STEP_TICKS / TICK_RATE
+    nextTick = clock.now()
+
+    # -_-_-_-_-_-_-_ FIXED TIMESTEP LOOP _-_-_-_-_-_-_-
+    while(state.start):
+        if lockstep:    # So every tick runs on the same inputs however long they took to arrive
+            with game['lock']:
+                game['inputArrived'].wait_for(lambda: not state.start
+                    or all(player['ack'] >= state.sync or not player['connected'] for player in players))
+        tickStart = time.perf_counter()
+        with game['lock']:
+            paused = not all(player['connected'] for player in players)
+            if not paused:
+                for player in players:
+                    player['applied'] = player['inputSeq']  # The input this tick runs on, for client reconciliation
+                events = simulation.advance(STEP_TICKS)
+        if paused:  # Nothing changes until the missing player resumes, or their game is given up on
+            nextTick = clock.now() + tickLength
+            time.sleep(tickLength)  # Even on virtual time, they can only come back in real time
+            continue
+
+        # Copy the authoritative simulation into the game state and send the tick to both players
+        state.update(simulation, events)
+        if recorder is not None:
+            try:
+                recorder.record(state.packed())
+            except OSError as error:  # A full disk stops the recording, not the game
+                log.warning("Stopped recording game " + str(gameId) + ": " + str(error))
+                recorder = None
+        spectatorHub.publish(gameId, state.packed())
+        for player in players:
+            player['events'] |= events  # Kept until the player is next sent a tick, so no sound is missed
+            if not player['connected']:
+                continue
+            try:
+                sendUpdate(player, state, clock.now())
+            except OSError:
+                pass    # The reactor sees the connection drop and holds the game for a reconnect
+            change = player['link'].adapt(clock.now())
+            if change is not None:
+                sendLevelChanges.inc()
+                log.info("Game " + str(gameId) + " " + player['name'] + ": sending " + change)
+        tickSeconds.observe(time.perf_counter() - tickStart)
+        syncDrift.observe(abs(players[0]['ack'] - players[1]['ack']))
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("Game %d tick %d left %s right %s ball %s score %s", gameId, state.sync,
+                simulation.leftPaddle.y, simulation.rightPaddle.y, (simulation.ball.x, simulation.ball.y), (simulation.lScore, simulation.rScore))
+
+        if simulation.over:
+            winner = game[simulation.winner]['name']
+            wins = leaderboard.recordWin(winner)
+            log.info("Game " + str(gameId) + " over, " + winner + " wins")
+
+            # The final snapshot may have been a lost datagram, so confirm the result over TCP
+            result = {'winner': simulation.winner, 'score': [simulation.lScore, simulation.rScore], 'wins': wins}
+            for player in players:
+                try:
+                    player['connection'].sendJson(MSG_END, result)
+                except OSError:
+                    pass
             break
 
-        # Construct score, sync, and ball pos from recieved Json
-        clientGameState.score = Vec2D(jsonData['score'][0], jsonData['score'][1])
-        clientGameState.sync = jsonData['sync']
+        # Sleep until the next tick, catching up without sleeping if we fell behind, a virtual clock never waits
+        nextTick += tickLength
+        delay = nextTick - clock.now()
+        if delay > 0:
+            clock.sleep(delay)
+        elif delay < -MAX_TICK_LAG * tickLength:
+            nextTick = clock.now()   # Too far behind, drop the missed ticks
+
+    state.start = False
+    result['score'] = [simulation.lScore, simulation.rScore]
+    spectatorHub.finish(gameId, result)
+    if recorder is not None:
+        try:
+            recorder.finish(result)
+        except OSError as error:
+            log.warning("Replay of game " + str(gameId) + " has no index: " + str(error))
+    for player in players:
+        sessions.pop(player['token'], None)
+        playerSessions.pop(player['session'], None)
+        reactor.close(player['connection'])
+
+
+# Purpose:  To build a player's MSG_WELCOME: their side, the screen size, how per-tick data will travel
+#   and the session token to resume with
+# token is the player's UDP token, None in TCP mode
+def welcomeData(game: dict, side: str, token: Optional[int]) -> dict:
+    player = game[side]
+    welcome = {'side': side,
+        'height': game['sim'].screenHeight,
+        'width': game['sim'].screenWidth,
+        'codec': player['connection'].codec.name,
+        'transport': TRANSPORT_TCP,
+        'tickRate': TICK_RATE,
+        'game': game['id'],
+        'session': player['session']}
+    if token is not None:
+        welcome.update({'transport': TRANSPORT_UDP, 'token': token, 'udpPort': player['udpPort']})
+    if game['sim'].seed is not None:    # The client has to answer every tick, once, before the next is played
+        welcome.update({'lockstep': True, 'seed': game['sim'].seed})
+    return welcome
+
+
+# Purpose:  To open a replay file for a game that's about to start
+# Pre:  Both players have joined the game
+# Post: Returns None, and the game goes on unrecorded, if recording is off or the file can't be made
+def startRecording(game: dict) -> Optional[ReplayWriter]:
+    if REPLAY_DIRECTORY is None:
+        return None
+    started = time.time()
+    # Slots are reused, so the start time keeps a game's file from overwriting an earlier one in its slot
+    path = os.path.join(REPLAY_DIRECTORY, time.strftime("%Y%m%d-%H%M%S", time.localtime(started))
+        + "-" + format(int(started * 1000) % 1000, '03d') + "-game" + str(game['id']) + REPLAY_EXTENSION)
+    details = {'left': game['left']['name'], 'right': game['right']['name'], 'started': started,
+        'tickRate': TICK_RATE, 'width': game['sim'].screenWidth, 'height': game['sim'].screenHeight}
+    if game['sim'].seed is not None:
+        details['seed'] = game['sim'].seed
+    try:
+        os.makedirs(REPLAY_DIRECTORY, exist_ok=True)
+        # Room for this one, a long-running server would otherwise fill the disk
+        pruneReplays(REPLAY_DIRECTORY, REPLAY_MAX_FILES - 1 if REPLAY_MAX_FILES is not None else None, REPLAY_MAX_BYTES)
+        return ReplayWriter(path, details)
+    except OSError as error:
+        log.warning("Not recording game " + str(game['id']) + ": " + str(error))
+        return None
 
-        #Default to left side's ball being the correct one
-        if isLeft:
-            clientGameState.ball = Vec2D(jsonData['ball'][0], jsonData['ball'][1])
-        else:
-            clientGameState.ball = __gameList__[gameId][oppString].ball
 
-        # Construct paddle positions from recieve Json
-        if isLeft:
-            clientGameState.leftPaddle = Vec2D(jsonData['paddle'][0], jsonData['paddle'][1])
-            clientGameState.rightPaddle = __gameList__[gameId]['right'].rightPaddle
+# Purpose:  To send a player only what changed since the last snapshot they acknowledged, as often and as
+#   precisely as their link can take
+# Pre:  The current tick has already been packed into state
+# Post: The player will have been sent either a delta or, when due or needed, a full keyframe, or nothing if
+#   their level skips this tick or their socket still holds too much unsent
+# now is the time on the game's clock
+def sendUpdate(player: dict, state: GameState, now: float) -> None:
+    channel = player['channel']
+    link = player['link']
+    if not link.due():
+        snapshotsSkipped.inc()
+        return
+    if channel is player['connection'] and link.maxLevel > 0:   # Level 0 alone sends every tick however backed up
+        link.backlog = unsentBytes(channel.sock)
+        if link.backlog > BACKLOG_HIGH:     # A newer tick will replace this one before they could read it
+            snapshotsSkipped.inc()
+            return
+    packed = state.packed()
+    base = state.packed(player['ack'])
+    # Each player is told which of their own inputs this tick includes
+    if player['keyframe'] or base is None or state.sync - player['lastKeyframe'] >= KEYFRAME_INTERVAL:
+        player['keyframe'] = False
+        player['lastKeyframe'] = state.sync
+        msgType, payload = MSG_SNAPSHOT, channel.codec.encodePackedSnapshot(packed, player['applied'], player['events'])
+    else:
+        msgType, payload = MSG_DELTA, channel.codec.encodePackedDelta(packed, base, player['applied'], player['events'], link.quantum)
+    channel.send(msgType, payload)
+    player['events'] = 0
+    link.sent(state.sync, now)
+    messagesSent.inc()
+    bytesSent.inc(HEADER.size + len(payload) + (0 if channel is player['connection'] else DATAGRAM.size))
+
+
+# Purpose:  To measure a new player's link, only ever sending them every tick in full in a deterministic game
+def newLinkMonitor() -> LinkMonitor:
+    return LinkMonitor(maxLevel=MAX_SEND_LEVEL if deterministicSeed is None else 0)
+
+
+# Purpose:  To publish new results to the leaderboard page away from the game threads
+# Pre:  Finished game ids are put onto leaderboardQueue by the match scheduler, after their wins are stored
+# Post: The thread will persist and refresh the cached leaderboard responses once per batch of finished games
+def leaderboardWriter() -> None:
+    while(True):
+        gameId = leaderboardQueue.get()   # Block until a game finishes
+        finished = [gameId]
+        while not leaderboardQueue.empty():   # Games that finished together only need one export
+            finished.append(leaderboardQueue.get())
+        log.info("Publishing leaderboard for game(s) " + ", ".join(str(gameId) for gameId in finished))
+        leaderboardCache.publish()
+
+
+# Purpose:  To run up to a fixed number of games at once and queue any pairs that arrive past that cap
+class MatchScheduler():
+    # Default constructor
+    def __init__(self, maxConcurrentGames: int = MAX_CONCURRENT_GAMES) -> None:
+        self._maxConcurrentGames = maxConcurrentGames
+        self._waiting = deque()    # Ids of paired games waiting for a free slot
+        self._running = 0
+        self._lock = threading.Lock()
+
+    @property # Running games getter
+    def running(self) -> int:
+        return self._running
+
+    @property # Waiting games getter
+    def waiting(self) -> int:
+        return len(self._waiting)
+
+    # Start the pair's game now if there is room, otherwise queue it
+    def submit(self, gameId: int) -> None:
+        with self._lock:
+            if self._running >= self._maxConcurrentGames:
+                self._waiting.append(gameId)
+                log.info("Game " + str(gameId) + " queued, " + str(len(self._waiting)) + " waiting")
+                return
+            self._running += 1
+        self._launch(gameId)
+
+    # Start a game on its own thread so the accept loop never waits on it
+    def _launch(self, gameId: int) -> None:
+        __gameRegistry__.setStatus(gameId, GAME_RUNNING)
+        __gameRegistry__.get(gameId)['state'].start = True
+        log.info("Starting game " + str(gameId))
+        gamesStarted.inc()
+        matchThread = threading.Thread(target=self._runMatch, args=(gameId,), daemon=True)
+        matchThread.start()
+
+    # Play a game to completion, hand its results to the leaderboard writer and fill the freed slot
+    def _runMatch(self, gameId: int) -> None:
+        game = __gameRegistry__.get(gameId)
+        try:
+            for side in ('left', 'right'):
+                leaderboard.addPlayer(game[side]['name'])
+                game[side]['lastHeard'] = time.monotonic()
+                watchPlayer(game, side)     # Their input is read by the reactor, not a thread of their own
+
+            gameThread(gameId)
+        except Exception:   # A failed leaderboard write, say, ends this game but mustn't lose its slot
+            log.exception("Game " + str(gameId) + " failed")
+            game['state'].start = False
+            for side in ('left', 'right'):
+                sessions.pop(game[side]['token'], None)
+                playerSessions.pop(game[side]['session'], None)
+                reactor.close(game[side]['connection'])
+        finally:
+            __gameRegistry__.setStatus(gameId, GAME_FINISHED)
+            leaderboardQueue.put(gameId)
+
+            with self._lock:
+                nextGame = self._waiting.popleft() if self._waiting else None
+                if nextGame is None:
+                    self._running -= 1
+            if nextGame is not None:
+                self._launch(nextGame)
+
+
+# Purpose:  To hand a spectator to the spectator hub, or tell them why they can't watch
+# Pre:  The spectator's hello asked to watch gameId and their codec has been negotiated
+# Post: The connection belongs to the spectator hub, or has been closed
+def acceptSpectator(name: str, connection: Connection, gameId) -> None:
+    game = __gameRegistry__.get(gameId) if isinstance(gameId, int) else None
+    try:
+        if game is None or game['status'] not in (GAME_WAITING, GAME_RUNNING):
+            connection.sendJson(MSG_END, {'error': "No game " + str(gameId) + " to watch"})
+            connection.close()
+            return
+        connection.sendJson(MSG_WELCOME, {'side': 'spectator',
+            'height': SCREEN_HEIGHT,
+            'width': SCREEN_WIDTH,
+            'codec': connection.codec.name,
+            'transport': TRANSPORT_TCP,
+            'tickRate': TICK_RATE,
+            'game': gameId})
+    except OSError:
+        connection.close()
+        return
+    if not spectatorHub.add(connection.sock, connection.codec.name, gameId):  # It ended since we looked
+        try:
+            connection.sendJson(MSG_END, {'error': "Game " + str(gameId) + " has ended"})
+        except OSError:
+            pass
+        connection.close()
+        return
+    log.info(name + " is watching game " + str(gameId))
+
+
+# Purpose:  To pair players into games in the order they arrive
+# Pre:  Players have finished the handshake
+# Post: Every second player starts a game through the scheduler
+class Lobby():
+    # Default constructor
+    # udpSocket     Datagram socket for per-tick data, None to keep everything on TCP
+    def __init__(self, scheduler: MatchScheduler, udpSocket: Optional[socket.socket] = None) -> None:
+        self._scheduler = scheduler
+        self._udpSocket = udpSocket
+        self._waitingGame = None  # Id of the game whose left player is waiting for an opponent
+
+    # Seat a player on the right of the waiting game, or open a new game with them on the left
+    def seat(self, name: str, connection: Connection, clientAddress: tuple) -> None:
+        player = {'name': name, 'connection': connection, 'address': clientAddress,
+            'ack': 0, 'keyframe': True, 'lastKeyframe': 0, 'inputSeq': 0, 'applied': 0,
+            'channel': connection, 'token': None, 'udpPort': None,
+            'session': secrets.token_hex(16), 'connected': True, 'droppedAt': None, 'lastHeard': time.monotonic(),
+            'link': newLinkMonitor(), 'events': 0}
+        if self._udpSocket is not None:
+            player['token'] = secrets.randbits(64)
+            player['udpPort'] = self._udpSocket.getsockname()[1]
+            player['channel'] = DatagramChannel(self._udpSocket, player['token'], codec=connection.codec.name)
+
+        # Someone who gave up waiting (or pressed Cancel) mustn't be paired, the reaper frees their game later
+        waiting = __gameRegistry__.get(self._waitingGame) if self._waitingGame is not None else None
+        if waiting is not None and waiting['right'] is None and hasHungUp(waiting['left']['connection']):
+            log.info(waiting['left']['name'] + " left before an opponent arrived")
+            self._waitingGame = None
+
+        if self._waitingGame is not None and __gameRegistry__.join(self._waitingGame, player):
+            gameId, side = self._waitingGame, 'right'
+            self._waitingGame = None
         else:
-            clientGameState.leftPaddle = __gameList__[gameId]['left'].leftPaddle
-            clientGameState.rightPaddle = Vec2D(jsonData['paddle'][0], jsonData['paddle'][1])
-
-        __gameList__[gameId][sideString] = clientGameState # Update the global game state
-
-        # Sync game if out of sync
-        if clientGameState.sync < __gameList__[gameId][oppString].sync:
-            clientGameState = __gameList__[gameId][oppString]
-            print("Syncing " + sideString + " to " + oppString)
-
-        print(clientGameState.sync)
-
-        # Send back the data
-        data = {'sync': clientGameState.sync,   # Assemble the Json dictionary
-            'left': [clientGameState.leftPaddle.x, clientGameState.leftPaddle.y],
-            'right': [clientGameState.rightPaddle.x, clientGameState.rightPaddle.y],
-            'ball': [clientGameState.ball.x, clientGameState.ball.y],
-            'score': [clientGameState.score.x, clientGameState.score.y]}
-        
-        jsonData = json.dumps(data) # Dump (package) the data
-        clientSocket.send(jsonData.encode()) # Send the data
-
-        if clientGameState.score.x >= 5 or clientGameState.score.y >= 5:
-            __gameList__[gameId]['left'].start = False
-            __gameList__[gameId]['right'].start = False
-            print("Game " + str(gameId) + " over")
-            if isLeft:
-                if clientGameState.score.x >= 5:
-                    leaderboard[name] += 1
-            else:
-                if clientGameState.score.y >= 5:
-                    leaderboard[name] += 1
-            break
+            gameId, side = __gameRegistry__.create(player), 'left'
+            if gameId is None:
+                log.warning("Turning " + name + " away, all " + str(__gameRegistry__.capacity) + " game slots are taken")
+                connection.close()
+                return
+            self._waitingGame = gameId
 
-    clientSocket.close()    # Close the connection after client goes silent
+        if player['token'] is not None:
+            sessions[player['token']] = (gameId, side)
+        playerSessions[player['session']] = (gameId, side)
+        if side == 'right':
+            self._scheduler.submit(gameId) # Hand the pair off and go back to accepting
 
+    # Put a player whose connection dropped back into their running game
+    # resume is the hello's {'session': token, 'game': id, 'sync': newest tick the client has}
+    # They are sent a new MSG_WELCOME and the current tick in full, then play on from it
+    def resume(self, name: str, connection: Connection, resume) -> None:
+        session = resume.get('session') if isinstance(resume, dict) else None
+        seat = playerSessions.get(session) if isinstance(session, str) else None    # Tokens are hex strings, anything else is garbage
+        game = __gameRegistry__.get(seat[0]) if seat is not None else None
+        if game is None or game['status'] != GAME_RUNNING or not game['state'].start:
+            log.info(name + (" tried to resume a game that is over" if seat is not None else " tried to resume an unknown session"))
+            try:
+                connection.sendJson(MSG_END, {'error': "No game to resume"})
+            except OSError:
+                pass
+            connection.close()
+            return
 
-# Author(s): Ty Gordon, Caleb Fields, Abdallah Sher
-# Purpose: To establish the server's connection on a specific port, and to perpetually listen for and
-#   instanciate client-server interactions through instanced threads
-# Pre: It is expected that a server has not already been established
-# Post: A server will have been created and will 
-def establishServer() -> None:
-    port = 7777
+        gameId, side = seat
+        player = game[side]
+        state = game['state']
+        token = secrets.randbits(64) if self._udpSocket is not None else None   # A new channel's sequence numbers start again
+        welcome = welcomeData(game, side, token)
+        welcome.update({'codec': connection.codec.name, 'resumed': True})
+        try:
+            connection.sendJson(MSG_WELCOME, welcome)
+            packed = state.packed()
+            if packed is not None:
+                connection.send(MSG_SNAPSHOT, connection.codec.encodePackedSnapshot(packed, player['applied']))
+        except OSError:
+            connection.close()
+            return
+
+        with game['lock']:
+            previous = player['connection']
+            player['connection'] = connection
+            player['channel'] = connection
+            if token is not None:
+                sessions.pop(player['token'], None)
+                player['token'] = token
+                player['channel'] = DatagramChannel(self._udpSocket, token, codec=connection.codec.name)
+                sessions[token] = (gameId, side)
+            player['ack'] = state.sync  # Just sent in full
+            player['lastKeyframe'] = state.sync
+            player['keyframe'] = False
+            player['link'] = newLinkMonitor()  # A new connection may be on a different network
+            player['lastHeard'] = time.monotonic()
+            player['connected'] = True
+        reactor.close(previous)     # If the reactor hadn't noticed it drop yet, it never will now
+        watchPlayer(game, side)
+        playersResumed.inc()
+        sync = resume.get('sync', 0)
+        log.info(name + " resumed game " + str(gameId) + " on the " + side + " at tick " + str(state.sync)
+            + (", " + str(state.sync - sync) + " ticks after their last" if isinstance(sync, int) and sync > 0 else ""))
+
+
+# Purpose:  To read a new client's hello from the first message they sent
+# Post: Returns the hello, or None if it isn't one or the name isn't alphanumeric
+def parseHello(message: Tuple[int, bytes]) -> Optional[dict]:
+    if message[0] != MSG_HELLO:
+        return None
+    try:
+        hello = decodeJson(message[1]) # Name and codecs offered by the client
+    except ProtocolError:
+        return None
+    if not isinstance(hello, dict) or not str(hello.get('name', '')).isalnum():
+        return None
+    return hello
 
-    htmlThread = threading.Thread(target=startLeaderboardServer)
+
+# Purpose:  To send a client whose hello has been read to the lobby or the spectator hub
+def admit(lobby: Lobby, connection: Connection, clientAddress: tuple, hello: dict) -> None:
+    name = str(hello['name'])
+    connection.codec = negotiateCodec(hello.get('codecs'))
+    if 'spectate' in hello:
+        acceptSpectator(name, connection, hello['spectate'])
+        return
+    if 'resume' in hello:
+        lobby.resume(name, connection, hello['resume'])
+        return
+    log.info(name + " Connected. | Address: " + clientAddress[0] + " Port: " + str(clientAddress[1]) + " Codec: " + connection.codec.name)   # Log connection details
+    playersAccepted.inc()
+    lobby.seat(name, connection, clientAddress)
+
+
+# Purpose:  To open the leaderboard and start serving it over HTTP
+# Post: leaderboard and leaderboardCache are set, returns the web server's thread
+def openLeaderboard() -> threading.Thread:
+    global leaderboard, leaderboardCache
+    leaderboard = LeaderboardStore(LEADERBOARD_DB)
+    imported = leaderboard.importJson(LEADERBOARD_JSON)
+    if imported:
+        log.info("Imported " + str(imported) + " players from " + LEADERBOARD_JSON)
+
+    leaderboardCache = LeaderboardCache(leaderboard)
+
+    htmlThread = threading.Thread(target=startLeaderboardServer, args=(leaderboardCache, SERVER_IP, LEADERBOARD_PORT, metrics), daemon=True)
     htmlThread.start()
+    return htmlThread
+
+
+# Purpose:  To start the threads every process that runs games needs, apart from the reactor, which the caller runs
+def startGameThreads() -> None:
+    writerThread = threading.Thread(target=leaderboardWriter, daemon=True)
+    writerThread.start()
+
+    reaper = threading.Thread(target=reaperThread, daemon=True)
+    reaper.start()
 
+    spectatorThread = threading.Thread(target=spectatorHub.run, daemon=True)
+    spectatorThread.start()
+
+
+# Purpose:  To open the datagram socket for per-tick data and start receiving on it
+def bindUdp(port: int) -> socket.socket:
+    udpSocket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    udpSocket.bind((SERVER_IP, port))
+    receiverThread = threading.Thread(target=udpThread, args=(udpSocket,), daemon=True)
+    receiverThread.start()
+    return udpSocket
+
+
+# Purpose:  To open the TCP socket clients connect to
+# backlog is how many connections the operating system holds for the server to accept
+def listen(port: int, backlog: int = ACCEPT_BACKLOG) -> socket.socket:
     server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)  # Create the server
     server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)    # Work with localhost
 
     server.bind((SERVER_IP, port))    # Connect server to port and enter listening mode
-    server.listen(5)
+    server.listen(backlog)
+    return server
 
-    isLeft = True   # Designates the first client as the "left" player
-    threadList = [] # Stores all threads to be used and joined later
 
-    gameItr = 0
+# Purpose:  To run games in a worker process, on pairs handed over by the supervisor
+# Pre:  Forked by superviseWorkers before it opened the leaderboard or started any threads
+# Post: Returns, ending the process, once the supervisor has gone away
+def runWorker(index: int, channel: socket.socket, pipe, maxConcurrentGames: int, transport: str, port: int) -> None:
+    global leaderboard, leaderboardCache, __gameRegistry__, spectatorHub, reactor
+    leaderboard = leaderboardCache = RemoteLeaderboard(pipe)
+    __gameRegistry__ = GameRegistry(MAX_GAMES, index * MAX_GAMES)   # Game ids tell the supervisor which worker has a game
+    spectatorHub = SpectatorHub(metrics)    # Its own wake-up socket, the one made at import is shared with every other worker
+    reactor = Reactor(HANDSHAKE_TIMEOUT, IDLE_TIMEOUT)
+    startGameThreads()
+    threading.Thread(target=reportMetrics, args=(leaderboard, metrics), daemon=True).start()
+    reactor.start()     # This thread waits on the supervisor for new pairs
+    lobby = Lobby(MatchScheduler(maxConcurrentGames), bindUdp(port + 1 + index) if transport == TRANSPORT_UDP else None)
+    log.info("Worker " + str(index) + " running games " + str(index * MAX_GAMES) + " to " + str((index + 1) * MAX_GAMES - 1))
 
-    # PERPETUAL CONNECTION LOOP
     while(True):
+        try:
+            connections = receiveHandOff(channel)
+        except OSError:
+            connections = None
+        if connections is None:
+            return
+        for sock, clientAddress, hello in connections:
+            admit(lobby, Connection(sock), clientAddress, hello)
 
-        clientSocket, clientAddress = server.accept()   # Connect with a client
-        name = clientSocket.recv(1024).decode()
-        if not name.isalnum():
-            clientSocket.close()
-            continue
-        print(name, " Connected. | Address: ", clientAddress[0], " Port: ", clientAddress[1])   # Print connection details
 
-        newThread = threading.Thread(target=clientThread, args=(name, clientSocket, clientAddress, gameItr, isLeft))  # Start the thread at the function clientThread
+# Purpose:  To hand connections to a worker, closing this process's copies either way
+def dispatch(channel: socket.socket, connections: list) -> None:
+    try:
+        handOff(channel, [(connection.sock, clientAddress, hello) for connection, clientAddress, hello in connections])
+    except OSError as error:
+        log.error("Couldn't hand " + str(len(connections)) + " connection(s) to a worker: " + str(error))
+        for connection, _, _ in connections:
+            connection.close()
+        return
+    for connection, _, _ in connections:
+        connection.sock.close()    # Not shutdown, the worker's copy of the socket stays open
 
-        # Decide if player is left or right and pass this decision
-        if isLeft:
-            __gameList__.insert(gameItr, {'left': GameState(), 'right': GameState()})
-            isLeft = False
-        else:
-            __gameList__[gameItr]['right'].start = True
-            __gameList__[gameItr]['left'].start = True
-            gameItr += 1
-            isLeft = True
-
-        threadList.append(newThread) # Add the thread to the list and start it
-        if(__gameList__[gameItr - 1]['left'].start and __gameList__[gameItr - 1]['right'].start) and isLeft:
-            print("Starting game " + str(gameItr - 1))
-            threadList[-1].start()
-            threadList[-2].start()
-            threadList[-1].join()
-            threadList[-2].join()
-
-            #Load in old leaderboard
-            with open('leaderboard.json', 'r') as leaderboardFile:
-                tempLeaderboard = json.load(leaderboardFile)
-                leaderboardFile.close()
-            #Sort in descending order
-            #Update leaderboard
-            del(tempLeaderboard[0])
-            for item in tempLeaderboard:
-                if item['name'] not in leaderboard:
-                    leaderboard[item['name']] = 0
-                leaderboard[item['name']] += item['score']
-            sortedLeaderboard = sorted(leaderboard.items(), key=lambda x:x[1], reverse=True)
-            sortedLeaderboard = dict(sortedLeaderboard)
-            with open('leaderboard.json', 'w') as leaderboardFile:
-                leaderboardFile.write("[{}")
-                for key in sortedLeaderboard.keys():
-                    leaderboardFile.write(",{\"name\":\""+key+"\",\"score\":"+str(leaderboard[key])+"}\n")
-                leaderboardFile.write("]")
-                leaderboardFile.close()
-            #leaderboard = {}
-
-    htmlThread.join()
-
-    for t in threadList:    # Iterate and join all threads
-        t.join()
-
-    server.close()  # Close the server after connection termination
-
-def startLeaderboardServer():
-    PORT = 80
-    Handler = http.server.SimpleHTTPRequestHandler
-
-    # Host leaderboard.html on port 80
-    with socketserver.TCPServer((SERVER_IP, PORT), Handler) as httpd:
-        print("serving at port", PORT)
-        httpd.serve_forever()
+
+# Purpose:  To spread games over several processes, so they aren't all sharing one GIL
+# Pre:  Called before this process has started any threads, since it forks
+# Post: Accepts forever, pairing players here and handing each pair to the next worker, which runs the
+#   game and sends its results back to the leaderboard held by this process
+def superviseWorkers(workers: int, maxConcurrentGames: int, transport: str, port: int) -> None:
+    context = multiprocessing.get_context("fork")
+    channels = []
+    perWorker = max(1, -(-maxConcurrentGames // workers))
+    pipes = []
+    for index in range(workers):
+        channel, workerChannel = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        pipe, workerPipe = context.Pipe()
+        worker = context.Process(target=runWorker, args=(index, workerChannel, workerPipe, perWorker, transport, port),
+            name="pong-worker-" + str(index), daemon=True)
+        worker.start()
+        workerChannel.close()
+        workerPipe.close()
+        channels.append(channel)
+        pipes.append(pipe)
+
+    openLeaderboard()
+    for index, pipe in enumerate(pipes):
+        threading.Thread(target=serveLeaderboard, args=(pipe, leaderboard, leaderboardCache, metrics, index), daemon=True).start()
+
+    waiting = None  # (connection, address, hello) of the player waiting for an opponent
+    nextWorker = 0
+
+    # Called by the reactor with each new connection's first message
+    def onHello(connection: Connection, clientAddress: tuple, message: Tuple[int, bytes]) -> None:
+        nonlocal waiting, nextWorker
+        hello = parseHello(message)
+        if hello is None:
+            connection.close()
+            return
+
+        # Spectators and resuming players go to the worker whose range of ids has their game, unknown ids are turned away by worker 0
+        if 'spectate' in hello or 'resume' in hello:
+            gameId = hello['spectate'] if 'spectate' in hello else hello['resume'].get('game') if isinstance(hello['resume'], dict) else None
+            worker = gameId // MAX_GAMES if isinstance(gameId, int) and 0 <= gameId < workers * MAX_GAMES else 0
+            dispatch(channels[worker], [(connection, clientAddress, hello)])
+            return
+
+        # Both players of a pair go to the same worker, so pairs are made here
+        if waiting is not None and hasHungUp(waiting[0]):
+            waiting[0].close()
+            waiting = None
+        if waiting is None:
+            waiting = (connection, clientAddress, hello)
+            return
+        dispatch(channels[nextWorker], [waiting, (connection, clientAddress, hello)])
+        waiting = None
+        nextWorker = (nextWorker + 1) % workers
+
+    reactor.listen(listen(port), onHello)
+    reactor.run()   # Accepts and reads hellos forever
+
+
+# Author(s): Ty Gordon, Caleb Fields, Abdallah Sher
+# Purpose: To establish the server's connection on a specific port, and to perpetually listen for and
+#   instanciate client-server interactions, every connection being read by the one reactor thread
+# Pre: It is expected that a server has not already been established
+# Post: A server will have been created and will pair every two clients into a game run by the scheduler,
+#   or with more than one worker will hand pairs to worker processes
+# seed plays every game deterministically on virtual time, as fast as its players answer, see DETERMINISTIC_SEED
+def establishServer(maxConcurrentGames: int = MAX_CONCURRENT_GAMES, transport: str = TRANSPORT, workers: int = WORKERS,
+        seed: Optional[int] = DETERMINISTIC_SEED) -> None:
+    global deterministicSeed
+    port = 7777
+    setupLogging()
+    deterministicSeed = seed
+    if seed is not None:
+        log.info("Deterministic mode, seed " + str(seed) + ", per-tick data stays on TCP")
+        transport = TRANSPORT_TCP   # A lost datagram would hold a lockstep game up until the player timed out
+    if workers > 1:
+        superviseWorkers(workers, maxConcurrentGames, transport, port)
+        return
+
+    openLeaderboard()
+    startGameThreads()
+
+    scheduler = MatchScheduler(maxConcurrentGames)
+    server = listen(port)
+    # Per-tick data also gets a datagram socket on the same port
+    lobby = Lobby(scheduler, bindUdp(port) if transport == TRANSPORT_UDP else None)
+
+    # Called by the reactor with each new connection's first message
+    def onHello(connection: Connection, clientAddress: tuple, message: Tuple[int, bytes]) -> None:
+        hello = parseHello(message)
+        if hello is None:
+            connection.close()
+            return
+        admit(lobby, connection, clientAddress, hello)
+
+    # The reactor accepts, reads hellos and reads every player's input from here on
+    reactor.listen(server, onHello)
+    reactor.run()
 
 # Author(s):   Ty Gordon
 # Purpose:  To start the server program
@@ -0,0 +1,49 @@
+# =================================================================================================
+# Purpose:                  Headless viewer for the match recordings pongServer.py writes to replays/
+# Misc:                     Usage: python replayTool.py info replays/FILE.pongreplay
+#                                  python replayTool.py dump replays/FILE.pongreplay --from 600 --to 660
+# =================================================================================================
+
+import argparse
+import json
+
+from assets.code.replay import ReplayReader
+
+
+# Purpose:  To describe a recorded match without decoding its ticks
+def info(reader: ReplayReader) -> dict:
+    return {'details': reader.details,
+        'result': reader.result,
+        'firstTick': reader.firstTick,
+        'keyframes': reader.keyframes,
+        'finished': reader.result is not None}
+
+
+# Purpose:  To print a stretch of a recorded match, one JSON line per tick
+# Post: Only the frames from the keyframe before start up to end are read from the file
+def dump(reader: ReplayReader, start: int = None, end: int = None) -> None:
+    for snapshot in reader.frames(start, end):
+        print(json.dumps({'sync': snapshot['sync'],
+            'left': snapshot['left'],
+            'right': snapshot['right'],
+            'ball': snapshot['ball'],
+            'score': snapshot['score'],
+            'events': snapshot['events']}))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect a recorded pong match")
+    parser.add_argument("command", choices=("info", "dump"))
+    parser.add_argument("path", help="A .pongreplay file")
+    parser.add_argument("--from", dest="start", type=int, help="First tick to dump (default the first recorded)")
+    parser.add_argument("--to", dest="end", type=int, help="Last tick to dump (default the last recorded)")
+    args = parser.parse_args()
+
+    reader = ReplayReader(args.path)
+    try:
+        if args.command == "info":
+            print(json.dumps(info(reader), indent=2))
+        else:
+            dump(reader, args.start, args.end)
+    finally:
+        reader.close()